@@ -1,3 +1,4 @@
+import logging
 import os
 import subprocess
 import sys
@@ -116,3 +117,46 @@ def cmd_enso_theme(ensoapi, color = None):
     ensoapi.display_message("Enso theme changed to “%s”" % color, "enso")
 
 cmd_enso_theme.valid_args = list(layout.COLOR_THEMES.keys())
+
+
+def cmd_enso_event_stats(ensoapi, action = None):
+    """ Show how long event responders take
+    <b>Actions:</b><br>
+    &nbsp;&nbsp- start - start recording responder latencies<br>
+    &nbsp;&nbsp- stop - stop recording<br>
+    &nbsp;&nbsp- reset - discard what was recorded<br>
+    Without an action, shows the slowest responders.
+    """
+    eventManager = EventManager.get()
+    if action == 'start':
+        eventManager.setStatsEnabled(True)
+        ensoapi.display_message("Recording event responder latencies", "enso")
+    elif action == 'stop':
+        eventManager.setStatsEnabled(False)
+        ensoapi.display_message("Stopped recording event responder latencies",
+                                "enso")
+    else:
+        stats = eventManager.getStats()
+        if stats is None:
+            ensoapi.display_message("Event responder latencies are not being "
+                                    "recorded; use “enso event stats start”",
+                                    "enso")
+        elif action == 'reset':
+            stats.reset()
+            ensoapi.display_message("Event responder latencies reset", "enso")
+        else:
+            # The full report goes to the log; the Web UI API serves
+            # the histograms as well.
+            logging.info(stats.getReport())
+            slowest = stats.getStats()[:1]
+            if slowest:
+                ensoapi.display_message("Slowest: %(eventType)s responder "
+                                        "%(responder)s, %(meanMs).2f ms mean, "
+                                        "%(maxMs).2f ms max, %(overBudget)d "
+                                        "calls over budget" % slowest[0],
+                                        "enso")
+            else:
+                ensoapi.display_message("No event responder calls recorded yet",
+                                        "enso")
+
+cmd_enso_event_stats.valid_args = ['start', 'stop', 'reset']
@@ -34,29 +34,36 @@
 
 import os, threading, logging
 from . import config
+from .utils import startupprofile
 
 def run():
     """
     Initializes and runs Enso.
     """
 
-    from . import messages, plugins
-    from .events import EventManager
-    from .quasimode import layout, Quasimode
-
-    try:
-        from . import webui
-    except ImportError:
-        webui = None
-        # Don't claim a cause we haven't checked: any failed import anywhere
-        # in webui's chain lands here, and blaming flask sends people looking
-        # in the wrong place. Log the real traceback instead.
-        logging.warning( "Web UI is unavailable; enso.webui failed to import.",
-                         exc_info = True )
-
-    eventManager = EventManager.get()
-    Quasimode.install( eventManager )
-    plugins.install( eventManager )
+    with startupprofile.span( "phase", "core" ):
+        from . import messages, plugins
+        from .events import EventManager
+        from .quasimode import layout, Quasimode
+
+    webui = None
+    # Flask and werkzeug are only worth importing if the web UI runs.
+    if config.ENABLE_WEB_UI:
+        with startupprofile.span( "phase", "webui" ):
+            try:
+                from . import webui
+            except ImportError:
+                # Don't claim a cause we haven't checked: any failed
+                # import anywhere in webui's chain lands here, and
+                # blaming flask sends people looking in the wrong place.
+                # Log the real traceback instead.
+                logging.warning( "Web UI is unavailable; enso.webui failed "
+                                 "to import.", exc_info = True )
+
+    with startupprofile.span( "phase", "quasimode" ):
+        eventManager = EventManager.get()
+        Quasimode.install( eventManager )
+        plugins.install( eventManager )
 
     def initEnso():
         msgXml = config.OPENING_MSG_XML
@@ -65,8 +72,13 @@ def run():
 
         runTasks()
 
+        # Plugins, and with them the command scripts, load on the
+        # init event before this responder; startup is over.
+        startupprofile.finish()
+
     if config.ENABLE_WEB_UI and webui:
-        webui.start()
+        with startupprofile.span( "phase", "webui start" ):
+            webui.start()
 
     eventManager.registerResponder( initEnso, "init" )
 
@@ -50,66 +50,20 @@
 # ----------------------------------------------------------------------------
 
 import re
-
-from enso import config
+from collections import Counter
 
 from enso.commands.suggestions import AutoCompletion, Suggestion
+from enso.commands.searchindex import PostfixIndex
+from enso.commands.searchindex import MATCH_START, MATCH_WORD_START
+from enso.commands.searchindex import MATCH_ANYWHERE
+from enso.commands.searchindex import equivalizeChars as _equivalizeChars
+from enso.commands.postfixlist import PostfixList
+from enso.commands.postfixlist import CHANGE_ADD
 from enso.commands.interfaces import AbstractCommandFactory, CommandObject
+from enso.commands.state import CommandStateStore
 from enso.messages import displayMessage
 
 
-# ----------------------------------------------------------------------------
-# Private Utility Functions
-# ----------------------------------------------------------------------------
-
-def _equivalizeChars( userText ):
-    """
-    Returns a regular expression in which certain characters are
-    replaced with equivalent character sets, e.g., "2" by "[2@]".
-    """
-    
-    # TODO: These appear to only be equivalent characters for US
-    # keyboard layouts.
-
-    EQUIVALENT_CHARS = {
-        "1" : "1!",
-        "2" : "2@",
-        "3" : "3#",
-        "4" : "4$",
-        "5" : "5%",
-        "6" : "6^",
-        "7" : "7&",
-        "8" : "8*",
-        "9" : "9(",
-        "0" : "0)",
-        "-" : "-_",
-        "=" : "=+",
-        ";" : ":;",
-        "-" : "-_",
-        "'" : "'\"",
-        }
-    
-    searchText = re.escape( userText )
-    for char in list(EQUIVALENT_CHARS.keys()):
-        expr = EQUIVALENT_CHARS[char]
-        expr = re.escape( expr )
-        expr = "[%s]" % expr
-        char = re.escape(char)
-        searchText = searchText.replace( char, expr )
-
-    # {{{searchText}}} is a pattern that may contain spaces.  To
-    # determine whether a string matches searchText, we want any
-    # number of spaces in the string to match a single space in
-    # searchText.  Therefore, we replace each space in searchText with
-    # a "multispace" match RE, i.e., a regular expression that will
-    # match one or more spaces.
-    space = re.escape( " " )
-    multiSpace = "[%s]+" % space
-    searchText = searchText.replace( space, multiSpace )
-
-    return searchText
-
-
 # ----------------------------------------------------------------------------
 # Prefix Command Factory
 # ----------------------------------------------------------------------------
@@ -156,30 +110,64 @@ class GenericPrefixFactory( AbstractCommandFactory ):
         self.__postfixes = []
         self.__postfixesChanged = False
 
-        self.__searchString = ""
+        # The searchable postfixes, i.e., those that are not filtered
+        # out, in the order they were indexed, and the search index
+        # built over them.
+        self.__indexedPostfixes = []
+        self.__index = PostfixIndex()
+
+        # Incremented whenever the search index changes; see
+        # getVersion().
+        self.__indexVersion = 0
+
+        # If the postfixes are a PostfixList, its generation when it
+        # was last indexed.
+        self.__indexedGeneration = None
+
+        # The command state version the index was filtered with; see
+        # __isSearchable().
+        self.__stateVersion = None
 
     def getPostfixes( self ):
         return self.__postfixes 
 
     def setPostfixes( self, postfixes ):
+        # Re-assigning the same PostfixList is not a change; changes
+        # to its contents are tracked by its generation.
+        if postfixes is self.__postfixes \
+               and isinstance( postfixes, PostfixList ):
+            return
         self.__postfixesChanged = True
         self.__postfixes = postfixes
 
     #A protected property; subclasses should maintain this and update
-    #it in the .update() method.
+    #it in the .update() method.  If it is a PostfixList, re-assigning
+    #it is cheap, and the search index is updated incrementally.
     _postfixes = property( fget = getPostfixes, fset = setPostfixes, )
 
     # Subclasses should use _addPostfix and _removePostfix instead of
     # modifying the postfix list themselves, because modifying the list
     # in place will not invoke the property set method, which means
     # postfixesChanged won't get updated, which is bad.
+    #
+    # Unlike assigning a new list to _postfixes, these update the
+    # search index in place rather than having it rebuilt.
     def _addPostfix( self, cmdName ):
-        self._postfixes = self._postfixes[:] + [cmdName]
+        self.__postfixes = self.__postfixes[:] + [cmdName]
+        if not self.__postfixesChanged and self.__isSearchable( cmdName ):
+            self.__indexedPostfixes.append( cmdName )
+            self.__index.add( cmdName )
+            self.__indexVersion += 1
 
     def _removePostfix( self, cmdExpr ):
-        newPostfixes = self._postfixes[:]
+        newPostfixes = self.__postfixes[:]
         newPostfixes.remove( cmdExpr )
-        self._postfixes = newPostfixes
+        self.__postfixes = newPostfixes
+        if not self.__postfixesChanged \
+               and cmdExpr in self.__indexedPostfixes:
+            self.__indexedPostfixes.remove( cmdExpr )
+            self.__index.remove( cmdExpr )
+            self.__indexVersion += 1
 
     def getCommandList( self ):
         """
@@ -191,27 +179,116 @@ class GenericPrefixFactory( AbstractCommandFactory ):
         return [ self.PREFIX + post for post in self._postfixes ]
         
 
+    def __isSearchable( self, postfix ):
+        """
+        Returns whether postfix should be found by searches, i.e.,
+        whether it is not a disabled or voice-only command of the
+        command object registry.
+        """
+
+        # sneaky hack to instantly disable commands from Web UI
+        if hasattr(self, "NAME") and str(self.NAME) == "__commandObjectRegistry":
+            return not CommandStateStore.get().isHidden( postfix )
+        return True
+
+    def _isHidden( self ):
+        """
+        Returns whether this factory's commands are kept out of the
+        quasimode, i.e., whether its command is disabled or
+        voice-only.
+        """
+
+        return hasattr(self, "NAME") and \
+               CommandStateStore.get().isHidden( str(self.NAME) )
+
     def __update( self ):
         """
-        Private method for maintaining a search-string structure.
+        Private method for maintaining the search index.
         """
 
         self.update()
 
-        # sneaky hack to instantly disable commands from Web UI
         if hasattr(self, "NAME") and str(self.NAME) == "__commandObjectRegistry":
-            if config.COMMAND_STATE_CHANGED:
-                config.COMMAND_STATE_CHANGED = False
+            stateVersion = CommandStateStore.get().getVersion()
+            if stateVersion != self.__stateVersion:
+                self.__stateVersion = stateVersion
                 self.__postfixesChanged = True
-            filtered_postfixes = [p for p in self.__postfixes
-                                  if p not in config.DISABLED_COMMANDS
-                                  and p not in config.VOICE_ONLY_COMMANDS]
-        else:
-            filtered_postfixes = self.__postfixes
 
         if self.__postfixesChanged:
             self.__postfixesChanged = False
-            self.__searchString = "\n".join( filtered_postfixes )
+            self.__reindex()
+        elif isinstance( self.__postfixes, PostfixList ) \
+                 and self.__postfixes.getGeneration() \
+                     != self.__indexedGeneration:
+            changes = self.__postfixes.getChangesSince(
+                self.__indexedGeneration
+                )
+            if changes is None:
+                self.__reindex()
+            else:
+                self.__indexedGeneration = self.__postfixes.getGeneration()
+                added = [ p for kind, p in changes if kind == CHANGE_ADD ]
+                removed = [ p for kind, p in changes if kind != CHANGE_ADD ]
+                self.__applyChanges( added, removed )
+
+    def __reindex( self ):
+        """
+        Brings the search index up to date with the postfixes, which
+        may have changed arbitrarily.
+        """
+
+        if isinstance( self.__postfixes, PostfixList ):
+            self.__indexedGeneration = self.__postfixes.getGeneration()
+        else:
+            self.__indexedGeneration = None
+
+        filtered_postfixes = [p for p in self.__postfixes
+                              if self.__isSearchable( p )]
+
+        # Subclasses often re-assign an unchanged postfix list in
+        # update(); comparing lists is far cheaper than re-indexing.
+        if filtered_postfixes == self.__indexedPostfixes:
+            return
+
+        # If only a few postfixes were added or removed, apply just
+        # those to the index.
+        oldCounts = Counter( self.__indexedPostfixes )
+        newCounts = Counter( filtered_postfixes )
+        added = list( ( newCounts - oldCounts ).elements() )
+        removed = list( ( oldCounts - newCounts ).elements() )
+        if len( added ) + len( removed ) <= len( filtered_postfixes ) // 4:
+            self.__indexedPostfixes = filtered_postfixes
+            self.__applyChanges( added, removed, isListUpdated = True )
+        else:
+            self.__indexedPostfixes = filtered_postfixes
+            self.__index = PostfixIndex( filtered_postfixes )
+            self.__indexVersion += 1
+
+    def __applyChanges( self, added, removed, isListUpdated = False ):
+        """
+        Updates the search index in place for the given added and
+        removed postfixes; unless isListUpdated is set, the list of
+        indexed postfixes is updated as well.
+        """
+
+        changed = False
+        for postfix in removed:
+            if not isListUpdated:
+                try:
+                    self.__indexedPostfixes.remove( postfix )
+                except ValueError:
+                    # It was filtered out when it was added.
+                    continue
+            self.__index.remove( postfix )
+            changed = True
+        for postfix in added:
+            if self.__isSearchable( postfix ):
+                if not isListUpdated:
+                    self.__indexedPostfixes.append( postfix )
+                self.__index.add( postfix )
+                changed = True
+        if changed:
+            self.__indexVersion += 1
             
 
     # LONGTERM TODO: This is not the greatest design.  Perhaps in
@@ -242,32 +319,93 @@ class GenericPrefixFactory( AbstractCommandFactory ):
         This returns a list of Suggestion objects.
         """
 
-        if hasattr(self, "NAME"):
-            if (str(self.NAME) in config.DISABLED_COMMANDS
-                    or str(self.NAME) in config.VOICE_ONLY_COMMANDS):
-                return []
+        return [ Suggestion( userText, text, helpText )
+                 for text, helpText in self.__retrieveCandidates( userText ) ]
 
-        pattern = userText[len(self.PREFIX):]
-        pattern = _equivalizeChars( pattern )
+
+    def retrieveCandidates( self, userText ):
+        """
+        Retrieves the same matches as retrieveSuggestions(), as
+        ( suggested text, help text ) tuples.
+        """
+
+        if self.__overridesSuggestions():
+            return AbstractCommandFactory.retrieveCandidates( self, userText )
+
+        return self.__retrieveCandidates( userText )
+
+
+    def __retrieveCandidates( self, userText ):
+        if self._isHidden():
+            return []
+
+        postfix = userText[len(self.PREFIX):]
 
         # Match any command that contains the user postfix (i.e.,
         # any characters followed by the user postfix).
-        pattern = ".*" + pattern
-        
-        matches = self.__findMatches( pattern )
+        matches = self.__findMatches( postfix, MATCH_ANYWHERE )
 
-        suggestions = [ Suggestion( userText, self.PREFIX + m )
-                        for m in matches ]
+        candidates = [ ( self.PREFIX + m, None ) for m in matches ]
 
         if self.PREFIX.startswith( userText ):
             # If seed text is all or part of the prefix, then
             # autocomplete with help text.
-            suggestions.insert(
-                0,
-                Suggestion( userText, self.PREFIX, self.HELP_TEXT )
-                )
+            candidates.insert( 0, ( self.PREFIX, self.HELP_TEXT ) )
+
+        return candidates
+
 
-        return suggestions
+    def __overridesSuggestions( self ):
+        """
+        Returns whether a subclass overrides retrieveSuggestions(), in
+        which case our own matching cannot stand in for it.
+        """
+
+        return type( self ).retrieveSuggestions \
+               is not GenericPrefixFactory.retrieveSuggestions
+
+
+    def getVersion( self ):
+        """
+        Returns a number that changes whenever the searchable
+        postfixes change.
+
+        NOTE: This method calls self.update(), like
+        retrieveSuggestions() does.
+        """
+
+        self.__update()
+        return self.__indexVersion
+
+
+    def refineCandidates( self, userText, candidates ):
+        """
+        Filters the candidates retrieved for a prefix of userText
+        down to those that match userText; see
+        AbstractCommandFactory.refineCandidates().
+        """
+
+        if self.__overridesSuggestions():
+            return None
+
+        if self._isHidden():
+            return []
+
+        if self.PREFIX.startswith( userText ):
+            # The seed text is still all or part of the prefix, so
+            # every postfix (and the help text) still matches.
+            return candidates
+
+        prefixLength = len( self.PREFIX )
+        pattern = _equivalizeChars( userText[prefixLength:] )
+        search = re.compile( pattern, re.I ).search
+
+        # The candidate whose text is the bare prefix carries the
+        # help text, and only matches while the seed text is part of
+        # the prefix.
+        return [ candidate for candidate in candidates
+                 if len( candidate[0] ) > prefixLength
+                 and search( candidate[0], prefixLength ) ]
 
 
     def autoComplete( self, userText ):
@@ -276,10 +414,24 @@ class GenericPrefixFactory( AbstractCommandFactory ):
         remainder of userText begins a word of one of this factory's
         postfixes, then returns an Autocompletion object for the
         match.  Otherwise, returns None.
+
+        "_" begins words like any other word character, and is not
+        equivalent to "-":
+
+          >>> class OpenFactory( GenericPrefixFactory ):
+          ...     PREFIX = "open "
+          ...     def update( self ):
+          ...         self._postfixes = [ "x-foo", "my_file", "my-file" ]
+          >>> factory = OpenFactory()
+          >>> factory.autoComplete( "open my_" ).toText()
+          'open my_file'
+          >>> factory.autoComplete( "open _foo" ) is None
+          True
+          >>> factory.autoComplete( "open _" ) is None
+          True
         """
 
-        if hasattr(self, "NAME") and (str(self.NAME) in config.DISABLED_COMMANDS
-                                       or str(self.NAME) in config.VOICE_ONLY_COMMANDS):
+        if self._isHidden():
             return None
 
         if self.PREFIX.startswith( userText ):
@@ -290,12 +442,12 @@ class GenericPrefixFactory( AbstractCommandFactory ):
         elif not userText.startswith( self.PREFIX ):
             return None
 
-        pattern = userText[len(self.PREFIX):]
-        pattern = _equivalizeChars( pattern )
-        matches = self.__findMatches( pattern )
+        postfix = userText[len(self.PREFIX):]
+        pattern = _equivalizeChars( postfix )
+        matches = self.__findMatches( postfix, MATCH_START )
         if len( self.PREFIX ) > 0 and len( matches ) == 0:
             # We have a real prefix; look for beginings of words.
-            matches = self.__findMatches( ".*\\b" + pattern )
+            matches = self.__findMatches( postfix, MATCH_WORD_START )
         if len(matches) < 1:
             return None
         match = matches[0]
@@ -309,35 +461,21 @@ class GenericPrefixFactory( AbstractCommandFactory ):
         return completion
 
 
-    def __findMatches( self, pattern ):
+    def __findMatches( self, postfix, anchor ):
         """
         Finds all command names that:
           (1) start with the correct prefix, and
-          (2) match pattern.
+          (2) match postfix at the position given by anchor.
         """
         
         self.__update()
 
-        # This part works by using regular expressions to quickly grab
-        # all the new-line delimited substrings that contain
-        # the pattern.  NOTE: This will allow us to modify the pattern
-        # into a more advanced regexp, allowing ( for example ) the
-        # user text "open boo 9temp0" to match to the command named
-        # "open boo (temp)".  
-
-        # ^ matches begining of line or begining of string
-        # $ matches end of line or end of string
-        # .* matches any number of any character, except newlines
-
-        # re.M means that "multiline mode" is used, so "." does not
-        # match newlines.
-        # re.I matches case-insensitively
-        matches = re.findall( pattern = "^" + pattern +".*$",
-                              string = self.__searchString,
-                              flags = re.M | re.I )
-        matches = [ m for m in matches if len(m) > 0 ]
-        matches.sort()
-        return matches
+        # The index matches case-insensitively, treats the characters
+        # that _equivalizeChars() considers equivalent as the same,
+        # and lets a space match any number of spaces, so that (for
+        # example) the user text "open boo 9temp0" matches the
+        # command named "open boo (temp)".
+        return self.__index.find( postfix, anchor )
 
     def getCommandObj( self, commandName ):
         """
@@ -384,8 +522,7 @@ class ArbitraryPostfixFactory( GenericPrefixFactory ):
         Returns None otherwise.
         """
 
-        if hasattr(self, "NAME") and (str(self.NAME) in config.DISABLED_COMMANDS
-                                       or str(self.NAME) in config.VOICE_ONLY_COMMANDS):
+        if self._isHidden():
             return None
 
         if self.PREFIX.startswith( seedText ):
@@ -408,8 +545,7 @@ class ArbitraryPostfixFactory( GenericPrefixFactory ):
         prefix.
         """
 
-        if hasattr(self, "NAME") and (str(self.NAME) in config.DISABLED_COMMANDS
-                                       or str(self.NAME) in config.VOICE_ONLY_COMMANDS):
+        if self._isHidden():
             return []
 
         if userText in self.PREFIX:
@@ -219,6 +219,46 @@ class AbstractCommandFactory( _CommandImpl ):
         raise NotImplementedError()
 
 
+    def retrieveCandidates( self, userText ):
+        """
+        Like retrieveSuggestions(), but returns a list of
+        ( suggested text, help text ) tuples rather than Suggestion
+        objects, so that callers can rank many matches without
+        creating an object for each of them.
+        """
+
+        return [ ( s.toText(), s.getHelpText() )
+                 for s in self.retrieveSuggestions( userText ) ]
+
+
+    def getVersion( self ):
+        """
+        Returns a value that changes whenever the set of command names
+        this factory can produce changes, or None if the factory
+        cannot tell.  Like retrieveSuggestions(), this may update the
+        factory's internal data structures first.
+        """
+
+        return None
+
+
+    def refineCandidates( self, userText, candidates ):
+        """
+        Given the candidates (as returned by retrieveCandidates())
+        this factory retrieved for some prefix of userText, while
+        getVersion() returned the same value it returns now, returns
+        the candidates for userText.
+
+        Since extending the user text can only narrow the matches,
+        factories can implement this by filtering candidates rather
+        than searching all of their command names.  Returns None if
+        the factory cannot do so, in which case retrieveCandidates()
+        is used instead.
+        """
+
+        return None
+
+
     def getCommandObj( self, commandName ):
         """
         Should return a CommandObject matching commandName, or else
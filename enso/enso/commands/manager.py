@@ -40,7 +40,10 @@
 # Imports
 # ----------------------------------------------------------------------------
 
+import bisect
+import contextlib
 import logging
+import types
 
 from enso.commands.interfaces import CommandExpression, CommandObject
 from enso.commands.interfaces import AbstractCommandFactory
@@ -79,6 +82,23 @@ class CommandManager:
             self.CMD_KEY : self.__cmdObjReg,
             }
 
+        # Finds the keys of __cmdFactoryDict that match some user
+        # text without testing each of them.
+        self.__exprIndex = _ExpressionIndex()
+        self.__exprIndex.add( self.CMD_KEY )
+
+        # Incremented whenever a command is registered or
+        # unregistered, so that suggestion results computed before
+        # the change are not refined afterwards.
+        self.__generation = 0
+
+        # Every registered command expression string and its command
+        # object or factory.  Only ever touched on the thread that
+        # registers commands; other threads read published snapshots.
+        self.__commands = {}
+        self.__batchDepth = 0
+        self.__snapshot = CommandSnapshot( self.__generation, {} )
+
 
     def registerCommand( self, cmdName, cmdObj ):
         """
@@ -101,6 +121,7 @@ class CommandManager:
             assert cmdExpr not in self.__cmdFactoryDict,\
                 "Command is already registered: %s" % cmdExpr
             self.__cmdFactoryDict[ cmdExpr ] = cmdObj
+            self.__exprIndex.add( cmdExpr )
         else:
             # The command expression has no argument; it is a
             # simple command with an exact name.
@@ -108,11 +129,17 @@ class CommandManager:
                    "Could not register %s. Object has not type CommandObject." % cmdName
             self.__cmdObjReg.addCommandObj( cmdObj, cmdExpr )
 
+        self.__commands[ str(cmdExpr) ] = cmdObj
+        self.__generation += 1
+        self.__publish()
+
     def unregisterCommand( self, cmdName ):
         cmdFound = False
-        for cmdExpr in list(self.__cmdFactoryDict.keys()):
+        for cmdExpr in self.__exprIndex.getWithPrefix(
+                _getExpressionPrefix( cmdName ) ):
             if str(cmdExpr) == cmdName:
                 del self.__cmdFactoryDict[cmdExpr]
+                self.__exprIndex.remove( cmdExpr )
                 cmdFound = True
                 break
 
@@ -122,6 +149,39 @@ class CommandManager:
         if not cmdFound:
             raise RuntimeError( "Command '%s' does not exist." % cmdName )
 
+        self.__commands.pop( cmdName, None )
+        self.__generation += 1
+        self.__publish()
+
+    def __publish( self ):
+        """
+        Replaces the current snapshot with one of the registry as it
+        is now, unless a batch update is in progress.
+        """
+
+        if self.__batchDepth == 0 \
+               and self.__snapshot.generation != self.__generation:
+            # A single reference assignment, so readers see either the
+            # old snapshot or the new one, never a mix.
+            self.__snapshot = CommandSnapshot( self.__generation,
+                                               self.__commands )
+
+    @contextlib.contextmanager
+    def batchUpdate( self ):
+        """
+        Context manager deferring the publication of a new snapshot
+        until the outermost batch ends, so that readers never see a
+        registry that is half-way through being rebuilt (e.g. a reload
+        of every command file).  Batches may nest.
+        """
+
+        self.__batchDepth += 1
+        try:
+            yield
+        finally:
+            self.__batchDepth -= 1
+            self.__publish()
+
     def getCommandExpression( self, commandName ):
         """
         Returns the unique command expression that is associated with
@@ -132,18 +192,17 @@ class CommandManager:
 
         commands = []
 
-        for expr in self.__cmdFactoryDict.keys():
-            if expr.matches( commandName ):
-                # This expression matches commandName; try to fetch a
-                # command object from the corresponding factory.
-                cmd = self.__cmdFactoryDict[expr].getCommandObj( commandName )
-                if expr == self.CMD_KEY and cmd != None:
-                    commands.append( ( commandName, commandName ) )
-                elif cmd != None:
-                    # The factory returned a non-nil command object.
-                    # Make sure that nothing else has matched this
-                    # commandName.
-                    commands.append( (expr.getPrefix(), expr) )
+        for expr in self.__exprIndex.getMatching( commandName ):
+            # This expression matches commandName; try to fetch a
+            # command object from the corresponding factory.
+            cmd = self.__cmdFactoryDict[expr].getCommandObj( commandName )
+            if expr == self.CMD_KEY and cmd != None:
+                commands.append( ( commandName, commandName ) )
+            elif cmd != None:
+                # The factory returned a non-nil command object.
+                # Make sure that nothing else has matched this
+                # commandName.
+                commands.append( (expr.getPrefix(), expr) )
 
         if len(commands) == 0:
             return None
@@ -164,14 +223,13 @@ class CommandManager:
 
         commands = []
 
-        for expr in self.__cmdFactoryDict.keys():
-            if expr.matches( commandName ):
-                # This expression matches commandName; try to fetch a
-                # command object from the corresponding factory.
-                cmd = self.__cmdFactoryDict[expr].getCommandObj( commandName )
-                if cmd is not None:
-                    # The factory returned a non-nil command object.
-                    commands.append( ( expr, cmd ) )
+        for expr in self.__exprIndex.getMatching( commandName ):
+            # This expression matches commandName; try to fetch a
+            # command object from the corresponding factory.
+            cmd = self.__cmdFactoryDict[expr].getCommandObj( commandName )
+            if cmd is not None:
+                # The factory returned a non-nil command object.
+                commands.append( ( expr, cmd ) )
 
         if len( commands ) == 0:
             # There is no match
@@ -214,13 +272,12 @@ class CommandManager:
 
         completions = []
 
-        # Check each of the command factories for a match.
-        for expr in self.__cmdFactoryDict.keys():
-            if expr.matches( userText ):
-                cmdFact = self.__cmdFactoryDict[expr]
-                completion = cmdFact.autoComplete( userText )
-                if completion != None:
-                    completions.append( completion )
+        # Check each of the matching command factories for a match.
+        for expr in self.__exprIndex.getMatching( userText ):
+            cmdFact = self.__cmdFactoryDict[expr]
+            completion = cmdFact.autoComplete( userText )
+            if completion != None:
+                completions.append( completion )
 
         if len( completions ) == 0:
             return None
@@ -235,36 +292,270 @@ class CommandManager:
         """
 
         suggestions = []
-        # Extend the suggestions using each of the command factories
-        for expr in self.__cmdFactoryDict.keys():
-            if expr.matches( userText ):
-                factory = self.__cmdFactoryDict[expr]
-                suggestions += factory.retrieveSuggestions( userText )
+        # Extend the suggestions using each of the matching command
+        # factories
+        for expr in self.__exprIndex.getMatching( userText ):
+            factory = self.__cmdFactoryDict[expr]
+            suggestions += factory.retrieveSuggestions( userText )
 
         return suggestions
 
 
+    def retrieveCandidates( self, userText, previous = None ):
+        """
+        Returns a CandidateResults object holding the same matches as
+        retrieveSuggestions(), as ( suggested text, help text )
+        tuples.
+
+        If previous is the CandidateResults for a prefix of userText,
+        and no command has been registered or unregistered since it
+        was computed, then only the factories that contributed to
+        previous are consulted, and each is asked to filter its own
+        earlier candidates instead of searching all of its command
+        names.
+        """
+
+        if previous is None \
+               or previous.getGeneration() != self.__generation \
+               or not userText.startswith( previous.getUserText() ):
+            groups = [ ( expr, self.__cmdFactoryDict[expr], None, None )
+                       for expr in self.__exprIndex.getMatching( userText ) ]
+        else:
+            # Extending the user text can only narrow down the
+            # command expressions that match it.
+            groups = previous.getGroups()
+
+        results = CandidateResults( userText, self.__generation )
+        for expr, factory, version, candidates in groups:
+            if not expr.matches( userText ):
+                continue
+            newVersion = factory.getVersion()
+            refined = None
+            if candidates is not None and version is not None \
+                   and version == newVersion:
+                refined = factory.refineCandidates( userText, candidates )
+            if refined is None:
+                refined = factory.retrieveCandidates( userText )
+            results.addGroup( expr, factory, newVersion, refined )
+
+        return results
+
+
+    def getGeneration( self ):
+        """
+        Returns a number that changes whenever a command is
+        registered or unregistered.
+        """
+
+        return self.__generation
+
+
+    def getSnapshot( self ):
+        """
+        Returns the current CommandSnapshot.  It never changes, so
+        it can be read from any thread without locking; a later
+        (un)registration publishes a new snapshot instead.
+        """
+
+        return self.__snapshot
+
+
     def getCommands( self ):
         """
         Returns a dictionary of command expression strings and their
         associated implementations (command objects or factories).
         """
 
-        # Get a dictionary form of the command object registry:
-        cmdDict = self.__cmdObjReg.getDict()
+        return dict( self.__snapshot.commands )
+        
+
+# ----------------------------------------------------------------------------
+# Command Snapshots
+# ----------------------------------------------------------------------------
+
+class CommandSnapshot:
+    """
+    An immutable view of the registered commands at one generation.
+
+      >>> snapshot = CommandSnapshot( 3, { "help" : None } )
+      >>> snapshot.generation, list( snapshot.commands )
+      (3, ['help'])
+      >>> snapshot.commands[ "quit" ] = None
+      Traceback (most recent call last):
+      ...
+      TypeError: 'mappingproxy' object does not support item assignment
+    """
+
+    __slots__ = ( "generation", "commands" )
+
+    def __init__( self, generation, commands ):
+        self.generation = generation
+        # A read-only view of a private copy.
+        self.commands = types.MappingProxyType( dict( commands ) )
 
-        # Extend the dictionary to cover the command factories.
-        for expr in list(self.__cmdFactoryDict.keys()):
-            if expr == self.CMD_KEY:
-                # This is the command object registry; pass.
-                pass
-            else:
-                # Cast the expression as a string.
-                cmdDict[ str(expr) ] = self.__cmdFactoryDict[expr]
 
-        return cmdDict
-        
         
+# ----------------------------------------------------------------------------
+# Command Expression Index
+# ----------------------------------------------------------------------------
+
+def _getExpressionPrefix( stringExpression ):
+    """
+    Returns the prefix of the command expression stringExpression,
+    i.e., what CommandExpression( stringExpression ).getPrefix()
+    would return, without asserting that it is well-formed.
+
+      >>> _getExpressionPrefix( "open {file}" )
+      'open '
+      >>> _getExpressionPrefix( "minimize" )
+      'minimize'
+    """
+
+    bracket = stringExpression.find( "{" )
+    if bracket > -1:
+        return stringExpression[:bracket]
+    else:
+        return stringExpression
+
+
+class _ExpressionIndex:
+    """
+    Indexes command expressions by their prefix, so that the
+    expressions matching some user text (in the sense of
+    CommandExpression.matches()) can be found without testing each
+    expression.
+
+    An expression matches user text if its prefix starts with the
+    text, which a binary search over the sorted prefixes finds, or if
+    the text starts with its prefix, which a lookup of each of the
+    text's initial substrings (of the lengths some prefix has) finds.
+
+      >>> index = _ExpressionIndex()
+      >>> exprs = [ CommandExpression( "open {file}" ),
+      ...           CommandExpression( "go {window}" ),
+      ...           CommandExpression( "open with {app}" ) ]
+      >>> for expr in exprs:
+      ...     index.add( expr )
+      >>> [ str(expr) for expr in index.getMatching( "op" ) ]
+      ['open {file}', 'open with {app}']
+      >>> [ str(expr) for expr in index.getMatching( "open emacs" ) ]
+      ['open {file}']
+      >>> index.remove( exprs[0] )
+      >>> [ str(expr) for expr in index.getMatching( "open " ) ]
+      ['open with {app}']
+    """
+
+    def __init__( self ):
+        # Maps each prefix to a list of ( sequence number, expression )
+        # pairs for the expressions having it.
+        self.__byPrefix = {}
+
+        # The distinct prefixes, sorted.
+        self.__prefixes = []
+
+        # Maps each prefix length to the number of distinct prefixes
+        # of that length.
+        self.__lengths = {}
+
+        # Expressions are returned in the order they were added.
+        self.__sequence = 0
+
+    def add( self, expr ):
+        prefix = expr.getPrefix()
+        if prefix not in self.__byPrefix:
+            self.__byPrefix[prefix] = []
+            bisect.insort( self.__prefixes, prefix )
+            self.__lengths[len(prefix)] = \
+                self.__lengths.get( len(prefix), 0 ) + 1
+        self.__byPrefix[prefix].append( ( self.__sequence, expr ) )
+        self.__sequence += 1
+
+    def remove( self, expr ):
+        prefix = expr.getPrefix()
+        entries = [ entry for entry in self.__byPrefix[prefix]
+                    if entry[1] is not expr ]
+        if len( entries ) > 0:
+            self.__byPrefix[prefix] = entries
+            return
+
+        del self.__byPrefix[prefix]
+        del self.__prefixes[ bisect.bisect_left( self.__prefixes, prefix ) ]
+        self.__lengths[len(prefix)] -= 1
+        if self.__lengths[len(prefix)] == 0:
+            del self.__lengths[len(prefix)]
+
+    def getWithPrefix( self, prefix ):
+        """
+        Returns the expressions whose prefix is exactly prefix, in
+        the order they were added.
+        """
+
+        return [ expr for _, expr in self.__byPrefix.get( prefix, [] ) ]
+
+    def getMatching( self, userText ):
+        """
+        Returns the expressions that match userText, in the order
+        they were added.
+        """
+
+        entries = []
+
+        # Prefixes that start with userText.
+        prefixes = self.__prefixes
+        index = bisect.bisect_left( prefixes, userText )
+        while index < len( prefixes ) \
+                  and prefixes[index].startswith( userText ):
+            entries.extend( self.__byPrefix[ prefixes[index] ] )
+            index += 1
+
+        # Shorter prefixes that userText starts with.
+        for length in self.__lengths:
+            if length < len( userText ):
+                entries.extend( self.__byPrefix.get( userText[:length], [] ) )
+
+        entries.sort( key = lambda entry: entry[0] )
+        return [ expr for _, expr in entries ]
+
+
+# ----------------------------------------------------------------------------
+# Candidate Results
+# ----------------------------------------------------------------------------
+
+class CandidateResults:
+    """
+    The ( suggested text, help text ) candidates retrieved for some
+    user text, grouped by the command factory that produced them, so
+    that they can be refined when the user text is extended; see
+    CommandManager.retrieveCandidates().
+    """
+
+    def __init__( self, userText, generation ):
+        self.__userText = userText
+        self.__generation = generation
+        self.__groups = []
+        self.__candidates = []
+
+    def addGroup( self, expr, factory, version, candidates ):
+        self.__groups.append( ( expr, factory, version, candidates ) )
+        self.__candidates += candidates
+
+    def getUserText( self ):
+        return self.__userText
+
+    def getGeneration( self ):
+        return self.__generation
+
+    def getGroups( self ):
+        return self.__groups
+
+    def getCandidates( self ):
+        """
+        Returns an unsorted list of all of the candidates.
+        """
+
+        return self.__candidates[:]
+
+
 # ----------------------------------------------------------------------------
 # A CommandObject Registry
 # ----------------------------------------------------------------------------
@@ -0,0 +1,204 @@
+# Copyright (c) 2008, Humanized, Inc.
+# All rights reserved.
+# 
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are met:
+#
+#    1. Redistributions of source code must retain the above copyright
+#       notice, this list of conditions and the following disclaimer.
+#
+#    2. Redistributions in binary form must reproduce the above copyright
+#       notice, this list of conditions and the following disclaimer in the
+#       documentation and/or other materials provided with the distribution.
+#
+#    3. Neither the name of Enso nor the names of its contributors may
+#       be used to endorse or promote products derived from this
+#       software without specific prior written permission.
+# 
+# THIS SOFTWARE IS PROVIDED BY Humanized, Inc. ``AS IS'' AND ANY
+# EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE IMPLIED
+# WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE ARE
+# DISCLAIMED. IN NO EVENT SHALL Humanized, Inc. BE LIABLE FOR ANY
+# DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES
+# (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES;
+# LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND
+# ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT
+# (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE OF THIS
+# SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+# ----------------------------------------------------------------------------
+#
+#   enso.commands.postfixlist
+#
+# ----------------------------------------------------------------------------
+
+"""
+    An observable list of command postfixes.
+
+    Command factories are asked to update their postfixes on every
+    keystroke, and usually do so by re-assigning a whole list, which
+    leaves the factory no cheaper way of telling what changed than
+    comparing the old and new lists.  A PostfixList is a list that
+    counts the changes made to its contents and remembers the most
+    recent ones, so that a factory can tell in constant time that
+    nothing changed, and otherwise apply just the added and removed
+    postfixes to its search index.
+"""
+
+# ----------------------------------------------------------------------------
+# Constants
+# ----------------------------------------------------------------------------
+
+# The number of most recent changes a PostfixList remembers; older
+# changes can't be retrieved with getChangesSince().
+MAX_REMEMBERED_CHANGES = 1024
+
+# The kinds of changes reported by PostfixList.getChangesSince().
+CHANGE_ADD = "add"
+CHANGE_REMOVE = "remove"
+
+
+# ----------------------------------------------------------------------------
+# Postfix List
+# ----------------------------------------------------------------------------
+
+class PostfixList( list ):
+    """
+    A list whose generation changes whenever items are added to or
+    removed from it.  Reordering the list is not a change, since
+    postfixes are searched as a collection.
+
+      >>> postfixes = PostfixList( ["notepad", "calc"] )
+      >>> start = postfixes.getGeneration()
+      >>> postfixes.getChangesSince( start )
+      []
+      >>> postfixes.append( "paint" )
+      >>> postfixes.remove( "calc" )
+      >>> postfixes.getChangesSince( start )
+      [('add', 'paint'), ('remove', 'calc')]
+      >>> postfixes[0] = "wordpad"
+      >>> postfixes.getChangesSince( start + 2 )
+      [('remove', 'notepad'), ('add', 'wordpad')]
+      >>> postfixes
+      ['wordpad', 'paint']
+
+    Changes that are no longer remembered are reported as None:
+
+      >>> postfixes.getChangesSince( start - 1 ) is None
+      True
+    """
+
+    def __init__( self, items = () ):
+        list.__init__( self, items )
+
+        # The generation of the first remembered change, and the
+        # remembered changes themselves; the current generation is
+        # the generation following the last remembered change.
+        self.__baseGeneration = 0
+        self.__changes = []
+
+    def getGeneration( self ):
+        """
+        Returns the current generation of the list, a number that
+        changes whenever the list's items change.
+        """
+
+        return self.__baseGeneration + len( self.__changes )
+
+    def getChangesSince( self, generation ):
+        """
+        Returns a list of the ( CHANGE_ADD or CHANGE_REMOVE, item )
+        changes made since the given generation of the list, in
+        order, or None if they are not remembered.
+        """
+
+        index = generation - self.__baseGeneration
+        if index < 0 or index > len( self.__changes ):
+            return None
+        return self.__changes[index:]
+
+    def __record( self, kind, items ):
+        """
+        Remembers that the given items were added or removed.
+        """
+
+        self.__changes.extend( ( kind, item ) for item in items )
+        excess = len( self.__changes ) - MAX_REMEMBERED_CHANGES
+        if excess > 0:
+            del self.__changes[:excess]
+            self.__baseGeneration += excess
+
+    # Mutating methods of list that change the list's items.
+
+    def append( self, item ):
+        list.append( self, item )
+        self.__record( CHANGE_ADD, [item] )
+
+    def extend( self, items ):
+        items = list( items )
+        list.extend( self, items )
+        self.__record( CHANGE_ADD, items )
+
+    def __iadd__( self, items ):
+        self.extend( items )
+        return self
+
+    def __imul__( self, count ):
+        items = list( self )
+        list.__imul__( self, count )
+        if count <= 0:
+            self.__record( CHANGE_REMOVE, items )
+        else:
+            self.__record( CHANGE_ADD, items * ( count - 1 ) )
+        return self
+
+    def insert( self, index, item ):
+        list.insert( self, index, item )
+        self.__record( CHANGE_ADD, [item] )
+
+    def remove( self, item ):
+        list.remove( self, item )
+        self.__record( CHANGE_REMOVE, [item] )
+
+    def pop( self, index = -1 ):
+        item = list.pop( self, index )
+        self.__record( CHANGE_REMOVE, [item] )
+        return item
+
+    def clear( self ):
+        items = list( self )
+        list.clear( self )
+        self.__record( CHANGE_REMOVE, items )
+
+    def __setitem__( self, index, value ):
+        if isinstance( index, slice ):
+            removed = list.__getitem__( self, index )
+            value = list( value )
+        else:
+            removed = [ list.__getitem__( self, index ) ]
+        list.__setitem__( self, index, value )
+        self.__record( CHANGE_REMOVE, removed )
+        if isinstance( index, slice ):
+            self.__record( CHANGE_ADD, value )
+        else:
+            self.__record( CHANGE_ADD, [value] )
+
+    def __delitem__( self, index ):
+        if isinstance( index, slice ):
+            removed = list.__getitem__( self, index )
+        else:
+            removed = [ list.__getitem__( self, index ) ]
+        list.__delitem__( self, index )
+        self.__record( CHANGE_REMOVE, removed )
+
+
+# ----------------------------------------------------------------------------
+# Doctests
+# ----------------------------------------------------------------------------
+
+if __name__ == "__main__":
+    import doctest
+
+    doctest.testmod()
+
+
+# vim:set tabstop=4 shiftwidth=4 expandtab:
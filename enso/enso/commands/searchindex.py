@@ -0,0 +1,380 @@
+# Copyright (c) 2008, Humanized, Inc.
+# All rights reserved.
+# 
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are met:
+#
+#    1. Redistributions of source code must retain the above copyright
+#       notice, this list of conditions and the following disclaimer.
+#
+#    2. Redistributions in binary form must reproduce the above copyright
+#       notice, this list of conditions and the following disclaimer in the
+#       documentation and/or other materials provided with the distribution.
+#
+#    3. Neither the name of Enso nor the names of its contributors may
+#       be used to endorse or promote products derived from this
+#       software without specific prior written permission.
+# 
+# THIS SOFTWARE IS PROVIDED BY Humanized, Inc. ``AS IS'' AND ANY
+# EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE IMPLIED
+# WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE ARE
+# DISCLAIMED. IN NO EVENT SHALL Humanized, Inc. BE LIABLE FOR ANY
+# DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES
+# (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES;
+# LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND
+# ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT
+# (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE OF THIS
+# SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+# ----------------------------------------------------------------------------
+#
+#   enso.commands.searchindex
+#
+# ----------------------------------------------------------------------------
+
+"""
+    An incrementally maintained search index over command postfixes.
+
+    GenericPrefixFactory used to answer every query by joining all of
+    its postfixes into one newline-delimited string and running a
+    regular expression over it, which made each keystroke cost time
+    proportional to the total length of all command names.
+
+    The PostfixIndex defined here keeps three structures over a
+    "folded" form of each postfix (case-folded, with the equivalent
+    characters of _equivalizeChars() mapped onto one representative
+    and runs of spaces collapsed):
+
+      * a sorted list of folded postfixes, answering prefix queries
+        with a binary search (a flattened prefix trie);
+      * a sorted list of folded word-start suffixes, answering
+        queries anchored at the beginning of a word;
+      * a character n-gram index (n = 1..3), answering substring
+        queries by intersecting n-gram posting sets.
+
+    Folding only ever merges characters, so the structures return a
+    superset of the real matches; each candidate is then verified
+    against the same regular expression the old implementation used,
+    which keeps the results identical.
+"""
+
+# ----------------------------------------------------------------------------
+# Imports
+# ----------------------------------------------------------------------------
+
+import bisect
+import re
+
+
+# ----------------------------------------------------------------------------
+# Constants
+# ----------------------------------------------------------------------------
+
+# Anchors for PostfixIndex.find().
+MATCH_START = "start"
+MATCH_WORD_START = "word start"
+MATCH_ANYWHERE = "anywhere"
+
+# TODO: These appear to only be equivalent characters for US
+# keyboard layouts.
+EQUIVALENT_CHARS = {
+    "1" : "1!",
+    "2" : "2@",
+    "3" : "3#",
+    "4" : "4$",
+    "5" : "5%",
+    "6" : "6^",
+    "7" : "7&",
+    "8" : "8*",
+    "9" : "9(",
+    "0" : "0)",
+    "-" : "-_",
+    "=" : "=+",
+    ";" : ":;",
+    "'" : "'\"",
+    }
+
+# The longest n-gram kept in the n-gram index.
+_MAX_GRAM = 3
+
+_FOLD_TABLE = str.maketrans( dict(
+    ( equivalent, char )
+    for char, equivalents in EQUIVALENT_CHARS.items()
+    for equivalent in equivalents
+    ) )
+
+_MULTI_SPACE = re.compile( " +" )
+
+
+# ----------------------------------------------------------------------------
+# Utility Functions
+# ----------------------------------------------------------------------------
+
+def equivalizeChars( userText ):
+    """
+    Returns a regular expression in which certain characters are
+    replaced with equivalent character sets, e.g., "2" by "[2@]".
+
+      >>> equivalizeChars( "2 a" )
+      '[2@][\\\\ ]+a'
+    """
+
+    searchText = re.escape( userText )
+    for char in list(EQUIVALENT_CHARS.keys()):
+        expr = EQUIVALENT_CHARS[char]
+        expr = re.escape( expr )
+        expr = "[%s]" % expr
+        char = re.escape(char)
+        searchText = searchText.replace( char, expr )
+
+    # {{{searchText}}} is a pattern that may contain spaces.  To
+    # determine whether a string matches searchText, we want any
+    # number of spaces in the string to match a single space in
+    # searchText.  Therefore, we replace each space in searchText with
+    # a "multispace" match RE, i.e., a regular expression that will
+    # match one or more spaces.
+    space = re.escape( " " )
+    multiSpace = "[%s]+" % space
+    searchText = searchText.replace( space, multiSpace )
+
+    return searchText
+
+
+def foldText( text ):
+    """
+    Returns the "folded" form of text under which the index stores
+    and looks up postfixes: case is folded, equivalent characters are
+    mapped onto a single representative, and runs of spaces are
+    collapsed.
+
+      >>> foldText( "Open  Foo@Bar" )
+      'open foo2bar'
+    """
+
+    return _MULTI_SPACE.sub( " ", text.casefold().translate( _FOLD_TABLE ) )
+
+
+def _isWordChar( char ):
+    """
+    Returns whether char is a word character in the sense of the \\w
+    regular expression class.
+    """
+
+    return char.isalnum() or char == "_"
+
+
+def _wordStarts( text ):
+    """
+    Returns the indices of text at which a word begins.
+
+      >>> _wordStarts( "open my-file" )
+      [0, 5, 8]
+    """
+
+    return [ i for i, char in enumerate( text )
+             if _isWordChar( char )
+             and ( i == 0 or not _isWordChar( text[i-1] ) ) ]
+
+
+def _grams( foldedText ):
+    """
+    Returns the set of all n-grams of foldedText, for n from 1 to
+    _MAX_GRAM.
+    """
+
+    return set( foldedText[i:i+n]
+                for n in range( 1, _MAX_GRAM + 1 )
+                for i in range( len(foldedText) - n + 1 ) )
+
+
+# ----------------------------------------------------------------------------
+# The Postfix Index
+# ----------------------------------------------------------------------------
+
+class PostfixIndex:
+    """
+    A multiset of postfixes that can be searched for postfixes that
+    match some user text at their start, at the start of one of
+    their words, or anywhere.
+
+      >>> index = PostfixIndex( ["notepad", "my notes", "calc"] )
+      >>> index.find( "not", MATCH_START )
+      ['notepad']
+      >>> index.find( "not", MATCH_WORD_START )
+      ['my notes', 'notepad']
+      >>> index.find( "te", MATCH_ANYWHERE )
+      ['my notes', 'notepad']
+      >>> index.remove( "notepad" )
+      >>> index.find( "not", MATCH_ANYWHERE )
+      ['my notes']
+
+    Empty postfixes are never returned.
+    """
+
+    def __init__( self, postfixes = () ):
+        """
+        Initializes the index, adding each of postfixes to it.
+        """
+
+        # Maps each distinct postfix to the number of times it has
+        # been added.
+        self.__counts = {}
+
+        # Sorted lists of ( folded text, postfix ) pairs.
+        self.__prefixes = []
+        self.__wordPrefixes = []
+
+        # Maps each n-gram to the set of postfixes containing it.
+        self.__grams = {}
+
+        for postfix in postfixes:
+            self.add( postfix )
+
+    def __len__( self ):
+        return sum( self.__counts.values() )
+
+    def __contains__( self, postfix ):
+        return postfix in self.__counts
+
+    def add( self, postfix ):
+        """
+        Adds one occurrence of postfix to the index.
+        """
+
+        if len( postfix ) == 0:
+            return
+
+        count = self.__counts.get( postfix, 0 )
+        self.__counts[postfix] = count + 1
+        if count > 0:
+            return
+
+        folded = foldText( postfix )
+        bisect.insort( self.__prefixes, ( folded, postfix ) )
+        for start in _wordStarts( postfix ):
+            bisect.insort( self.__wordPrefixes,
+                           ( foldText( postfix[start:] ), postfix ) )
+        for gram in _grams( folded ):
+            self.__grams.setdefault( gram, set() ).add( postfix )
+
+    def remove( self, postfix ):
+        """
+        Removes one occurrence of postfix from the index; does nothing
+        if postfix is not in the index.
+        """
+
+        count = self.__counts.get( postfix, 0 )
+        if count > 1:
+            self.__counts[postfix] = count - 1
+            return
+        elif count == 0:
+            return
+
+        del self.__counts[postfix]
+
+        folded = foldText( postfix )
+        self.__removeEntry( self.__prefixes, ( folded, postfix ) )
+        for start in _wordStarts( postfix ):
+            self.__removeEntry( self.__wordPrefixes,
+                                ( foldText( postfix[start:] ), postfix ) )
+        for gram in _grams( folded ):
+            postings = self.__grams[gram]
+            postings.discard( postfix )
+            if len( postings ) == 0:
+                del self.__grams[gram]
+
+    @staticmethod
+    def __removeEntry( entries, entry ):
+        index = bisect.bisect_left( entries, entry )
+        assert entries[index] == entry
+        del entries[index]
+
+    def find( self, text, anchor ):
+        """
+        Returns a sorted list of the postfixes matching text at the
+        position given by anchor (one of MATCH_START, MATCH_WORD_START
+        or MATCH_ANYWHERE), with each postfix repeated as many times
+        as it was added.
+
+        Matching is case-insensitive, honors the character
+        equivalences of equivalizeChars(), and lets a space in text
+        match any number of spaces in a postfix.
+        """
+
+        pattern = equivalizeChars( text )
+        if anchor == MATCH_START:
+            candidates = self.__findPrefixed( self.__prefixes, text )
+        elif anchor == MATCH_WORD_START:
+            pattern = ".*\\b" + pattern
+            if len( text ) > 0 and _isWordChar( text[0] ) \
+                   and text[0] not in EQUIVALENT_CHARS:
+                candidates = self.__findPrefixed( self.__wordPrefixes,
+                                                  text )
+            else:
+                # A match of a non-word character may sit right
+                # after a word character, which is not a word start
+                # as far as the index is concerned.
+                candidates = self.__findContaining( text )
+        elif anchor == MATCH_ANYWHERE:
+            pattern = ".*" + pattern
+            candidates = self.__findContaining( text )
+        else:
+            raise ValueError( "Unknown anchor: %s" % anchor )
+
+        matcher = re.compile( pattern, re.I ).match
+        matches = []
+        for postfix in candidates:
+            if matcher( postfix ):
+                matches.extend( [postfix] * self.__counts[postfix] )
+        matches.sort()
+        return matches
+
+    def __findPrefixed( self, entries, text ):
+        """
+        Returns the set of postfixes of those entries whose folded text
+        starts with the folded form of text.
+        """
+
+        folded = foldText( text )
+        candidates = set()
+        index = bisect.bisect_left( entries, ( folded, ) )
+        while index < len( entries ) \
+                  and entries[index][0].startswith( folded ):
+            candidates.add( entries[index][1] )
+            index += 1
+        return candidates
+
+    def __findContaining( self, text ):
+        """
+        Returns a set of postfixes that contains every postfix whose
+        folded text contains the folded form of text.
+        """
+
+        folded = foldText( text )
+        if len( folded ) == 0:
+            return set( self.__counts )
+        elif len( folded ) <= _MAX_GRAM:
+            return self.__grams.get( folded, set() )
+
+        postings = []
+        for i in range( len(folded) - _MAX_GRAM + 1 ):
+            gram = folded[i:i+_MAX_GRAM]
+            if gram not in self.__grams:
+                return set()
+            postings.append( self.__grams[gram] )
+
+        postings.sort( key = len )
+        candidates = set( postings[0] )
+        for posting in postings[1:]:
+            candidates &= posting
+            if len( candidates ) == 0:
+                break
+        return candidates
+
+
+if __name__ == "__main__":
+    import doctest
+
+    doctest.testmod()
+
+
+# vim:set tabstop=4 shiftwidth=4 expandtab:
@@ -0,0 +1,222 @@
+# Copyright (c) 2008, Humanized, Inc.
+# All rights reserved.
+# 
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are met:
+#
+#    1. Redistributions of source code must retain the above copyright
+#       notice, this list of conditions and the following disclaimer.
+#
+#    2. Redistributions in binary form must reproduce the above copyright
+#       notice, this list of conditions and the following disclaimer in the
+#       documentation and/or other materials provided with the distribution.
+#
+#    3. Neither the name of Enso nor the names of its contributors may
+#       be used to endorse or promote products derived from this
+#       software without specific prior written permission.
+# 
+# THIS SOFTWARE IS PROVIDED BY Humanized, Inc. ``AS IS'' AND ANY
+# EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE IMPLIED
+# WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE ARE
+# DISCLAIMED. IN NO EVENT SHALL Humanized, Inc. BE LIABLE FOR ANY
+# DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES
+# (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES;
+# LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND
+# ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT
+# (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE OF THIS
+# SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+
+# ----------------------------------------------------------------------------
+#
+#   enso.commands.state
+#
+# ----------------------------------------------------------------------------
+
+"""
+    The per-command state set from the Web UI: which commands are
+    disabled, enabled for voice, voice-only, or need a spoken
+    confirmation.
+
+    The state is configured as lists of command names in enso.config
+    (see usercfg.LIST_CONFIG_KEYS), but command factories consult it
+    for every postfix on every keystroke.  The CommandStateStore keeps
+    a frozenset for each list, so queries are set lookups, and a
+    version number that changes whenever any of the sets does, so
+    factories can cache views filtered by the state and refilter them
+    only when the version moves.
+"""
+
+# ----------------------------------------------------------------------------
+# Imports
+# ----------------------------------------------------------------------------
+
+import logging
+import threading
+
+from enso import config
+
+
+# ----------------------------------------------------------------------------
+# Constants
+# ----------------------------------------------------------------------------
+
+# The kinds of command state, named by the config lists holding them.
+DISABLED = "DISABLED_COMMANDS"
+VOICE = "VOICE_COMMANDS"
+VOICE_ONLY = "VOICE_ONLY_COMMANDS"
+VOICE_CONFIRM = "VOICE_CONFIRM_COMMANDS"
+
+STATE_KEYS = ( DISABLED, VOICE, VOICE_ONLY, VOICE_CONFIRM )
+
+# The states that the voice plugin bakes into its grammar (Verb.confirm
+# included), so changing them means rebuilding the engine's grammar;
+# voice-only is just a quasimode display concern.
+_VOICE_GRAMMAR_KEYS = ( VOICE, VOICE_CONFIRM )
+
+
+# ----------------------------------------------------------------------------
+# Command State Store
+# ----------------------------------------------------------------------------
+
+class CommandStateStore:
+    """
+    Indexes the command state lists of enso.config as sets.
+
+    Changes should be made with add() and remove(), which update the
+    config list, persist it and notify listeners.  Code that assigns a
+    new list to the config variable is noticed on the next query; code
+    that changes a config list in place must set
+    config.COMMAND_STATE_CHANGED, as before.
+    """
+
+    __instance = None
+
+    @classmethod
+    def get( cls ):
+        if not cls.__instance:
+            cls.__instance = cls()
+        return cls.__instance
+
+    def __init__( self ):
+        self.__lock = threading.Lock()
+        self.__lists = {}
+        self.__sets = {}
+        self.__hidden = frozenset()
+        self.__version = 0
+        self.__listeners = []
+        self.__rebuild()
+
+    def __rebuild( self ):
+        """
+        Re-indexes every state list from enso.config.
+        """
+
+        for key in STATE_KEYS:
+            names = getattr( config, key )
+            self.__lists[key] = names
+            self.__sets[key] = frozenset( names )
+        self.__hidden = self.__sets[DISABLED] | self.__sets[VOICE_ONLY]
+        self.__version += 1
+
+    def __sync( self ):
+        """
+        Re-indexes the state lists if enso.config's lists were
+        replaced or flagged as changed since they were indexed.
+        """
+
+        if config.COMMAND_STATE_CHANGED:
+            config.COMMAND_STATE_CHANGED = False
+        else:
+            lists = self.__lists
+            for key in STATE_KEYS:
+                if getattr( config, key ) is not lists[key]:
+                    break
+            else:
+                return
+        with self.__lock:
+            self.__rebuild()
+
+    def getVersion( self ):
+        """
+        Returns a number that changes whenever any command's state
+        changes.
+        """
+
+        self.__sync()
+        return self.__version
+
+    def has( self, key, name ):
+        """
+        Returns whether the named command is in the given state.
+        """
+
+        self.__sync()
+        return name in self.__sets[key]
+
+    def getNames( self, key ):
+        """
+        Returns the frozenset of commands in the given state.
+        """
+
+        self.__sync()
+        return self.__sets[key]
+
+    def isHidden( self, name ):
+        """
+        Returns whether the named command is kept out of the
+        quasimode, i.e. is disabled or voice-only.
+        """
+
+        self.__sync()
+        return name in self.__hidden
+
+    def add( self, key, name ):
+        """
+        Puts the named command into the given state.
+        """
+
+        self.__change( key, name, True )
+
+    def remove( self, key, name ):
+        """
+        Takes the named command out of the given state.
+        """
+
+        self.__change( key, name, False )
+
+    def __change( self, key, name, isAdded ):
+        self.__sync()
+        with self.__lock:
+            names = self.__lists[key]
+            if ( name in names ) == isAdded:
+                return
+            # A new list rather than an in-place change, so that
+            # readers iterating over the old one aren't disturbed.
+            if isAdded:
+                names = names + [name]
+            else:
+                names = [ n for n in names if n != name ]
+            setattr( config, key, names )
+            self.__rebuild()
+
+        if key in _VOICE_GRAMMAR_KEYS:
+            config.VOICE_COMMANDS_CHANGED = True
+        config.storeValue( key, names )
+
+        for listener in self.__listeners[:]:
+            try:
+                listener( key, name, isAdded )
+            except Exception:
+                logging.exception( "Command state listener failed." )
+
+    def addListener( self, listener ):
+        """
+        Registers listener( key, name, isAdded ) to be called after a
+        command's state is changed with add() or remove().  Listeners
+        are called on the thread that made the change.
+        """
+
+        self.__listeners.append( listener )
+
+    def removeListener( self, listener ):
+        self.__listeners.remove( listener )
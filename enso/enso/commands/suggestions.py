@@ -40,11 +40,126 @@
 # Imports
 # ----------------------------------------------------------------------------
 
+import functools
+import heapq
+import operator
+
 import enso.utils.strings
 import enso.utils.xml_tools
 from functools import total_ordering
 
 
+# ----------------------------------------------------------------------------
+# Constants
+# ----------------------------------------------------------------------------
+
+# The number of ( source, suggestion ) pairs whose markup is cached.
+# The same suggestions are displayed again and again while the user
+# types, so the cache is shared by all Suggestion objects.
+MARKUP_CACHE_SIZE = 512
+
+
+# ----------------------------------------------------------------------------
+# Suggestion Markup
+# ----------------------------------------------------------------------------
+
+@functools.lru_cache( maxsize = MARKUP_CACHE_SIZE )
+def _markUp( source, suggestion ):
+    """
+    Returns an ( xml, completion ) tuple, where xml marks up the
+    suggestion to show how it differs from the source as described in
+    Suggestion.toXml() (without the help text), and completion is the
+    completion of the source to the next word of the suggestion.
+
+      >>> _markUp( 'foobar', 'foo the bar' )
+      ('foo<ins> the </ins>bar', 'foobar')
+    """
+
+    escape = enso.utils.xml_tools.escape_xml
+
+    xmlParts = []
+    completionParts = []
+
+    # We are going to "use up" both the source string and the
+    # suggestion; these are the positions of their unused parts.
+    sourcePos = 0
+    suggestionPos = 0
+
+    # If we cannot match an initial substring of the unused source,
+    # then we are going to skip characters one-by-one.  These
+    # characters have been lost in the suggestion, and will cause
+    # "insertions" to instead be "alterations".
+    skippedChars = False
+
+    while sourcePos < len( source ):
+        # Find the longest initial substring of the unused source that
+        # occurs in the unused suggestion.  Every initial substring of
+        # an occurring string also occurs, so its length can be found
+        # with a binary search instead of trying every length.
+        length = 0
+        longest = len( source ) - sourcePos
+        while length < longest:
+            middle = ( length + longest + 1 ) // 2
+            if suggestion.find( source[sourcePos:sourcePos + middle],
+                                suggestionPos ) > -1:
+                length = middle
+            else:
+                longest = middle - 1
+        index = suggestion.find( source[sourcePos:sourcePos + length],
+                                 suggestionPos )
+
+        if length == 0:
+            # There was no match of a beginning substring, so we skip
+            # the first character; it will become part of an "altered
+            # substring", if there is a match to a later substring.
+            skippedChars = True
+            sourcePos += 1
+            continue
+
+        if index > suggestionPos:
+            if skippedChars:
+                # There were unused characters in the source, and
+                # there were characters in the unused suggestion
+                # before the target, so the next "inserted" portion of
+                # the suggestion becomes an "alteration" instead.
+                xmlFormat = "<alt>%s</alt>"
+            else:
+                xmlFormat = "<ins>%s</ins>"
+            xmlParts.append(
+                xmlFormat % escape( suggestion[suggestionPos:index] )
+                )
+            # NOTE: Do not add inserted characters to the 'next word'
+            # completion.
+
+        # Whether or not there were characters between the start of
+        # the unused suggestion and "here", any skipped chars are now
+        # defunct.
+        skippedChars = False
+        target = source[sourcePos:sourcePos + length]
+        xmlParts.append( escape( target ) )
+        completionParts.append( target )
+        suggestionPos = index + length
+        sourcePos += length
+
+    # The loop above only guarantees to use up the source string;
+    # there may be an unused portion of the suggestion left.  We
+    # append it to the xml string as an insertion (or alteration, if
+    # appropriate).
+    unusedSuggestion = suggestion[suggestionPos:]
+    if len( unusedSuggestion ) > 0:
+        if skippedChars:
+            xmlFormat = "<alt>%s</alt>"
+        else:
+            xmlFormat = "<ins>%s</ins>"
+        xmlParts.append( xmlFormat % escape( unusedSuggestion ) )
+
+        completionParts.append( unusedSuggestion.split( " " )[0] )
+        if unusedSuggestion.find( " " ) > -1:
+            completionParts.append( " " )
+
+    return "".join( xmlParts ), "".join( completionParts )
+
+
 # ----------------------------------------------------------------------------
 # Suggestion Objects
 # ----------------------------------------------------------------------------
@@ -93,7 +208,7 @@ class Suggestion:
         
         # For performance reasons, compute the "nearness" value
         # and cache it.
-        self._nearness = self.__getNearness()
+        self._nearness = self.computeNearness( originalText, suggestedText )
 
     def getHelpText( self ):
         return self.__helpText
@@ -144,19 +259,22 @@ class Suggestion:
         
         return self.__source
 
-    def __getNearness( self ):
+    @classmethod
+    def computeNearness( cls, originalText, suggestedText ):
         """
         Returns a number between 0 and 1 indicating how near the
-        original string this suggestion is; 0 means totally different,
-        and 1 means exactly the same.
+        original string suggestedText is; 0 means totally different,
+        and 1 means exactly the same.  Used for the nearness of
+        Suggestion objects, and to rank candidates before they are
+        made into Suggestion objects; see findNearestSuggestions().
         
         NOTE: As long as the return value remains as described,
         this method may be overridden to implement custom notions of
         "nearness".
         """
         
-        result = enso.utils.strings.stringRatio( self.__source,
-                                                 self.__suggestion )
+        result = enso.utils.strings.stringRatio( originalText,
+                                                 suggestedText )
         assert (result >= 0) and (result <= 1)
         return result
 
@@ -276,105 +394,8 @@ class Suggestion:
 
 
     def __transform( self ):
-        
-        # We are going to "use up" both the source string and the
-        # suggestion
-        unusedSource = self.__source[:]
-        unusedSuggestion = self.__suggestion[:]
-        
-        # The xml representation
-        xmlText = ""
-
-        # The "to the next word" completion.
-        completion = ""
-        
+        xmlText, completion = _markUp( self.__source, self.__suggestion )
 
-        # If we cannot match an initial substring of unusedSource,
-        # then we are going to peel off characters one-by-one into
-        # this variable.  These characters have been lost in the
-        # suggestion, and will cause "insertions" to instead be
-        # "alterations".
-        unmatchedChars = ""
-        
-        # BEGIN SOURCE-STRING LOOP
-
-        # Each iteration of this loop should reduce the length of
-        # unusedSource, and this loop ends when unusedSource is empty.
-        while len(unusedSource)>0:
-            # Save a copy of unusedSource, so we know if it changes.
-            oldUnusedSource = unusedSource[:]
-
-            # Loop from the full length of unusedSource down to one
-            # character
-            for i in range( len(unusedSource), 0, -1 ):
-                # The initial substring we are trying to locate.
-                target = unusedSource[:i]
-                
-                # BEGIN TARGET-FOUND CONDITION
-                if target in unusedSuggestion:
-                    index = unusedSuggestion.find( target )
-                    if index > 0:
-                        if len(unmatchedChars) > 0:
-                            # There were unused characters in the
-                            # source, and there were characters in the
-                            # unused suggestion before the target, so
-                            # the next "inserted" portion of the
-                            # suggestion becomes an "alteration"
-                            # instead.
-                            xmlFormat = "<alt>%s</alt>"
-                        else:
-                            xmlFormat = "<ins>%s</ins>"
-                        xmlText += xmlFormat % enso.utils.xml_tools.escape_xml(
-                            unusedSuggestion[:index]
-                            )
-                        # NOTE: Do not add inserted characters to the
-                        # 'next word' completion.
-                    # Whether or not there were characters between
-                    # the start of the unused suggestion and "here",
-                    # any unmatched chars are now defunct.
-                    unmatchedChars = ""
-                    xmlText += enso.utils.xml_tools.escape_xml( target )
-                    completion += target
-                    unusedSuggestion = unusedSuggestion[index+len(target):]
-                    unusedSource = unusedSource[i:]
-                    # The target was found and unusedSource was
-                    # modified; we exit the for-loop (to be entered
-                    # again if unusedSource is still nonempty).
-                    break
-                # END TARGET-FOUND CONDITION
-                    
-            # Either unusedSource is smaller, or it is the same as
-            # oldUnusedSource.  If it is the same as old unusedSource,
-            # then there was no match of a begining substring, so we
-            # remove the first character and store it as an "unused
-            # character", which will become part of an "altered
-            # substring", if there is a match to a later substring.
-            if unusedSource == oldUnusedSource:
-                unmatchedChars += unusedSource[0]
-                unusedSource = unusedSource[1:]
-
-            assert len( unusedSource ) < len( oldUnusedSource ), \
-                   "Potential infinite loop condition; failed to reduce"\
-                   " the length of the unused portion of the source string"\
-                   " in toXml()"
-        # END SOURCE-STRING LOOP
-        
-        # The source-string loop above only guarantees to use up the
-        # source string; there may be an unused portion of the
-        # suggestion left.  We append it to the xml string as an
-        # insertion (or alteration, if appropriate).
-        if len( unusedSuggestion ) > 0:
-            if len( unmatchedChars ) > 0:
-                format = "<alt>%s</alt>" 
-            else:
-                format = "<ins>%s</ins>"
-            unusedXml = enso.utils.xml_tools.escape_xml( unusedSuggestion )
-            xmlText += format % unusedXml
-
-            completion += unusedSuggestion.split(" ")[0]
-            if unusedSuggestion.find( " " ) > -1:
-                completion += " "
-                
         # Finally, add the help text, if it exists.
         if self.__helpText != None:
             xmlText += "<help>%s</help>" % self.__helpText
@@ -416,3 +437,66 @@ class AutoCompletion( Suggestion ):
         # so initialize self as a Suggestion.
         
         Suggestion.__init__( self, originalText, suggestedText, helpText )
+
+
+# ----------------------------------------------------------------------------
+# Ranking
+# ----------------------------------------------------------------------------
+
+# The amount by which findNearestSuggestions() raises the nearness
+# threshold in each step.
+NEARNESS_THRESHOLD_STEP = 0.05
+
+def findNearestSuggestions( userText, candidates, count,
+                            suggestionClass = Suggestion ):
+    """
+    Returns suggestionClass objects for the (at most) count candidates
+    that the suggestion list shows for userText, in Suggestion order;
+    candidates is an iterable of ( suggested text, help text ) tuples,
+    ranked by suggestionClass.computeNearness().
+
+    The selection is exactly the one the suggestion list used to make
+    by creating a Suggestion for every candidate: the nearness
+    threshold is raised in steps of NEARNESS_THRESHOLD_STEP while more
+    than count candidates are above it, and the first count of the
+    candidates above the last threshold but one are taken, sorted
+    stably by nearness.  Here the candidates are only ranked with
+    bounded heaps, and only the selected ones are made into
+    Suggestion objects:
+
+      >>> candidates = [ ( 'foo bar', None ), ( 'fo', None ),
+      ...                ( 'foo', 'fooObject' ) ]
+      >>> [ s.toText() for s in findNearestSuggestions( 'fo', candidates, 2 ) ]
+      ['foo bar', 'foo']
+    """
+
+    nearness = suggestionClass.computeNearness
+    scored = [ ( nearness( userText, candidate[0] ), candidate )
+               for candidate in candidates ]
+    score = operator.itemgetter( 0 )
+
+    # The threshold of the last pass but one; None stands for the
+    # unfiltered candidates the passes started from.
+    previous = None
+    if len( scored ) > count:
+        # At most count candidates are above a threshold once it
+        # reaches the ( count + 1 )th highest nearness.  The threshold
+        # is accumulated exactly as it was, so that it rounds the same
+        # way.
+        cutoff = heapq.nlargest( count + 1, scored, key = score )[-1][0]
+        threshold = 0.0
+        current = None
+        while current is None or current < cutoff:
+            previous = current
+            threshold += NEARNESS_THRESHOLD_STEP
+            current = threshold
+
+    if previous is None:
+        restricted = scored
+    else:
+        restricted = [ item for item in scored if item[0] > previous ]
+
+    # nsmallest() is stable, like the sort it replaces.
+    selected = heapq.nsmallest( count, restricted, key = score )
+    return [ suggestionClass( userText, text, helpText )
+             for value, ( text, helpText ) in selected ]
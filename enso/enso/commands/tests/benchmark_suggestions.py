@@ -0,0 +1,91 @@
+#!/usr/bin/env python3
+
+# Standalone benchmark for quasimode suggestion ranking (no GUI needed).
+#
+# Compares the old ranking, which made a Suggestion object for every
+# match and then repeatedly raised a nearness threshold before sorting,
+# with findNearestSuggestions(), which ranks plain ( text, help text )
+# candidates and only makes Suggestion objects for the ones it selects.
+# Both must select the same suggestions in the same order; the exit
+# status is 1 if they don't.  Run with a list of command counts to
+# override the default sizes, e.g. "benchmark_suggestions.py 500 5000".
+
+import os
+import random
+import sys
+import timeit
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__),
+                                                os.path.pardir,
+                                                os.path.pardir,
+                                                os.path.pardir)))
+
+from enso.commands.suggestions import Suggestion, findNearestSuggestions
+
+MAX_SUGGESTIONS = 10
+SIZES = [1000, 10000, 100000]
+USER_TEXT = "open"
+WORDS = ["open", "document", "music", "project", "report", "notes",
+         "mail", "calendar", "terminal", "browser", "video", "photos"]
+
+
+def make_candidates(count):
+    rng = random.Random(count)
+    return [(" ".join(rng.choice(WORDS) for _ in range(rng.randint(1, 4)))
+             + " %d" % i, None)
+            for i in range(count)]
+
+
+def threshold_ranking(userText, candidates):
+    """The ranking TheSuggestionList used before the bounded heap."""
+    suggestions = [Suggestion(userText, text, helpText)
+                   for text, helpText in candidates]
+    threshold = 0.0
+    restricted = suggestions[:]
+    oldRestricted = restricted
+    while len(restricted) > MAX_SUGGESTIONS:
+        threshold += 0.05
+        oldRestricted = restricted
+        restricted = [s for s in oldRestricted if s._nearness > threshold]
+    suggestions = oldRestricted
+    suggestions.sort()
+    return suggestions[:MAX_SUGGESTIONS]
+
+
+def heap_ranking(userText, candidates):
+    suggestions = findNearestSuggestions(userText, candidates,
+                                         MAX_SUGGESTIONS)
+    suggestions.sort()
+    return suggestions
+
+
+def as_texts(suggestions):
+    return [(s.toText(), s.getHelpText()) for s in suggestions]
+
+
+def best_time(function, candidates, repeat):
+    return min(timeit.repeat(lambda: function(USER_TEXT, candidates),
+                             number=1, repeat=repeat))
+
+
+def main():
+    sizes = [int(arg) for arg in sys.argv[1:]] or SIZES
+    print("%10s %14s %14s %9s" % ("commands", "threshold ms", "heap ms",
+                                  "speedup"))
+    mismatches = 0
+    for size in sizes:
+        candidates = make_candidates(size)
+        if as_texts(threshold_ranking(USER_TEXT, candidates)) \
+                != as_texts(heap_ranking(USER_TEXT, candidates)):
+            print("FAIL: the rankings of %d commands differ" % size)
+            mismatches += 1
+        repeat = max(3, 100000 // size)
+        old = best_time(threshold_ranking, candidates, repeat)
+        new = best_time(heap_ranking, candidates, repeat)
+        print("%10d %14.2f %14.2f %8.1fx"
+              % (size, old * 1000, new * 1000, old / new))
+    return 1 if mismatches else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
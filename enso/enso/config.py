@@ -15,6 +15,16 @@ LOCALIZED_INPUT = True
 # Only changes in commands entered through WebUI are tracked by default
 TRACK_COMMAND_CHANGES = False
 
+# Command files that take longer than this many seconds to load are
+# reported with a warning in the log.
+SLOW_COMMAND_FILE_SECONDS = 0.25
+
+# Record how long each event responder takes (see "enso event stats"
+# and enso.utils.responderstats).  Responder calls that take longer
+# than EVENT_RESPONDER_BUDGET_MS milliseconds are reported in the log.
+EVENT_STATS_ENABLED = False
+EVENT_RESPONDER_BUDGET_MS = 5.0
+
 # Web UI can be disabled as a security option
 ENABLE_WEB_UI = True
 # Require the auth token on API requests. On by default: without it, any page
@@ -84,6 +94,19 @@ PLUGINS = ["enso.contrib.scriptotron",
            "enso.contrib.voice"
            ]
 
+# Manifests of plugins that are imported on first use rather than at
+# startup; see enso.plugins.  A plugin without a manifest is loaded
+# at startup.
+PLUGIN_MANIFESTS = {
+    # The commands of these are read from their COMMANDS constants.
+    "enso.contrib.help": {},
+    "enso.contrib.google": {},
+    "enso.contrib.evaluate": {},
+    "enso.contrib.voice": {
+        "enabledBy": "VOICE_ENABLED",
+        },
+    }
+
 # Detect default system locale and use it for google search.
 # If set to False, no locale is forced.dddasdfasdf
 PLUGIN_GOOGLE_USE_DEFAULT_LOCALE = True
@@ -169,7 +192,7 @@ from . import usercfg
 
 usercfg.init(globals())
 
-from .usercfg import storeValue
+from .usercfg import storeValue, storeValues
 
 from .strings import *
 
@@ -44,6 +44,17 @@ from enso.commands import CommandManager, CommandObject
 from enso.utils import xml_tools
 
 
+# ----------------------------------------------------------------------------
+# Constants
+# ----------------------------------------------------------------------------
+
+# The commands this plugin provides, mapped to their descriptions;
+# see enso.plugins.
+COMMANDS = {
+    "evaluate" : "Evaluates the current selection as Python code.",
+    }
+
+
 # ----------------------------------------------------------------------------
 # The Evaluate command
 # ---------------------------------------------------------------------------
@@ -54,7 +65,7 @@ class EvalCommand( CommandObject ):
     """
 
     NAME = "evaluate"
-    DESCRIPTION = "Evaluates the current selection as Python code."
+    DESCRIPTION = COMMANDS[NAME]
 
     def __init__( self, displayMessage=None, selection=None ):
         super( EvalCommand, self ).__init__()
@@ -52,6 +52,18 @@ from enso.messages import displayMessage
 from enso.contrib.scriptotron.tracebacks import safetyNetted
 
 
+# ----------------------------------------------------------------------------
+# Constants
+# ----------------------------------------------------------------------------
+
+# The commands this plugin provides, mapped to their descriptions;
+# see enso.plugins.
+COMMANDS = {
+    "google {search terms}" :
+        "Performs a Google web search on the selected or typed text.",
+    }
+
+
 # ----------------------------------------------------------------------------
 # The Google command
 # ---------------------------------------------------------------------------
@@ -143,6 +155,7 @@ class GoogleCommandFactory( ArbitraryPostfixFactory ):
     HELP_TEXT = "search terms"
     PREFIX = "google "
     NAME = "google {search terms}"
+    DESCRIPTION = COMMANDS[NAME]
 
     # added to unify command name retrieval
     cmdName = "google"
@@ -154,9 +167,7 @@ class GoogleCommandFactory( ArbitraryPostfixFactory ):
             cmd = GoogleCommand( postfix )
         else:
             cmd = GoogleCommand()
-            cmd.setDescription(
-                "Performs a Google web search on the selected or typed text."
-            )
+            cmd.setDescription( self.DESCRIPTION )
         return cmd
 
 
@@ -166,9 +177,7 @@ class GoogleCommandFactory( ArbitraryPostfixFactory ):
 
 def load():
     cmd = GoogleCommandFactory()
-    cmd.setDescription(
-        "Performs a Google web search on the selected or typed text."
-    )
+    cmd.setDescription( GoogleCommandFactory.DESCRIPTION )
     CommandManager.get().registerCommand(
         GoogleCommandFactory.NAME,
         cmd
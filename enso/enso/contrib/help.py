@@ -64,6 +64,17 @@ from enso.commands import CommandManager, CommandObject
 from enso.contrib.scriptotron.tracebacks import safetyNetted
 
 
+# ----------------------------------------------------------------------------
+# Constants
+# ----------------------------------------------------------------------------
+
+# The commands this plugin provides, mapped to their descriptions;
+# see enso.plugins.
+COMMANDS = {
+    "help" : "Provides you with help on how to use Enso.",
+    }
+
+
 # ----------------------------------------------------------------------------
 # The HTML help system
 # ---------------------------------------------------------------------------
@@ -171,7 +182,7 @@ class HelpCommand( CommandObject ):
     """
 
     NAME = "help"
-    DESCRIPTION = "Provides you with help on how to use Enso."
+    DESCRIPTION = COMMANDS[NAME]
 
     def __init__( self, htmlHelp ):
         super( HelpCommand, self ).__init__()
@@ -99,6 +99,11 @@ class BoundedArgFuncCommand( GenericPrefixFactory, ArgFuncMixin ):
 
     @safetyNetted
     def update( self ):
+        # valid_args is handed over as the command assigned it.  If
+        # it is a PostfixList (see enso.commands.postfixlist), this
+        # costs nothing while the list is left alone, and in-place
+        # changes are applied to the search index incrementally;
+        # any other list is compared with the indexed postfixes.
         self._postfixes = self.func.valid_args
 
     _generateCommandObj = ArgFuncMixin._generateCommandObj
@@ -0,0 +1,100 @@
+"""
+    An on-disk cache of compiled command script code objects.
+
+    Like __pycache__, each command file gets one cache file holding its
+    marshalled code object, stamped with the mtime and size of the
+    source it was compiled from.  The cache file name includes the
+    interpreter's cache tag and the platform, so a portable ~/.enso
+    shared between Python versions or operating systems never loads
+    foreign bytecode.
+"""
+
+import hashlib
+import importlib.util
+import logging
+import marshal
+import os
+import struct
+import sys
+
+
+# Magic number, source mtime in nanoseconds, source size.
+_HEADER = struct.Struct( "<4sqq" )
+
+
+class CodeCache:
+    """
+    Loads and stores the compiled code of source files, keyed by
+    (path, mtime, size, python version).
+    """
+
+    def __init__( self, cacheDir, platform ):
+        self.__cacheDir = cacheDir
+        self.__suffix = ".%s-%s.pyc" % ( sys.implementation.cache_tag,
+                                         platform )
+
+    def __getCachePath( self, path ):
+        digest = hashlib.sha1(
+            os.path.abspath( path ).encode( "utf-8", "surrogateescape" )
+            ).hexdigest()
+        name = os.path.splitext( os.path.basename( path ) )[0]
+        return os.path.join( self.__cacheDir,
+                             "%s-%s%s" % ( name, digest[:16], self.__suffix ) )
+
+    def load( self, path, stat ):
+        """
+        Returns the cached code object for the given source file if
+        it was compiled from a file with the given os.stat() result,
+        otherwise None.
+        """
+
+        try:
+            with open( self.__getCachePath( path ), "rb" ) as cacheFile:
+                data = cacheFile.read()
+        except OSError:
+            return None
+
+        if len( data ) < _HEADER.size:
+            return None
+        magic, mtime, size = _HEADER.unpack_from( data )
+        if ( magic != importlib.util.MAGIC_NUMBER or
+             mtime != stat.st_mtime_ns or size != stat.st_size ):
+            return None
+
+        try:
+            return marshal.loads( data[_HEADER.size:] )
+        except ( EOFError, ValueError, TypeError ):
+            return None
+
+    def store( self, path, stat, code ):
+        """
+        Caches the given code object, compiled from a source file with
+        the given os.stat() result.  Failures are logged and ignored.
+        """
+
+        cachePath = self.__getCachePath( path )
+        tempPath = "%s.%d.tmp" % ( cachePath, os.getpid() )
+        try:
+            os.makedirs( self.__cacheDir, exist_ok=True )
+            with open( tempPath, "wb" ) as cacheFile:
+                cacheFile.write( _HEADER.pack( importlib.util.MAGIC_NUMBER,
+                                               stat.st_mtime_ns,
+                                               stat.st_size ) )
+                cacheFile.write( marshal.dumps( code ) )
+            os.replace( tempPath, cachePath )
+        except OSError as e:
+            logging.debug( "Could not cache code for '%s': %s" % ( path, e ) )
+            try:
+                os.remove( tempPath )
+            except OSError:
+                pass
+
+    def remove( self, path ):
+        """
+        Drops the cached code of a source file that no longer exists.
+        """
+
+        try:
+            os.remove( self.__getCachePath( path ) )
+        except OSError:
+            pass
@@ -2,11 +2,13 @@ import logging
 import os
 import re
 import sys
+import time
 import types
 
 import traceback
 
 from enso import config
+from enso.utils import startupprofile
 from enso.commands.manager import CommandAlreadyRegisteredError
 from enso.contrib.scriptotron.tracebacks import TracebackCommand
 from enso.contrib.scriptotron.tracebacks import safetyNetted
@@ -15,6 +17,8 @@ from enso.contrib.scriptotron import adapters
 from enso.contrib.scriptotron import cmdretriever
 from enso.contrib.scriptotron import ensoapi
 from enso.contrib.scriptotron import concurrency
+from enso.contrib.scriptotron.watcher import ScriptWatcher
+from enso.contrib.scriptotron.codecache import CodeCache
 
 # A command file may declare which platforms it supports with a header
 # comment like "# platforms: windows, linux, darwin"; files without the
@@ -37,9 +41,16 @@ def _platformsSupported(sourceText):
     return _CURRENT_PLATFORM in platforms
 
 
+# Compiled command scripts are cached here, see codecache.py.
+CODE_CACHE_DIR = os.path.join(config.ENSO_USER_DIR, "cache", "commands")
+
+
 class ScriptCommandTracker:
     def __init__( self, commandManager, eventManager ):
-        self._cmdExprs = []
+        # Command expressions and quasimode-start handlers, keyed by
+        # the command file that registered them (None if unknown).
+        self._cmdExprs = {}
+        self._qmStartHandlers = {}
         self._cmdMgr = commandManager
         self._genMgr = concurrency.GeneratorManager( eventManager )
         self._qmStartEvents = EventResponderList(
@@ -58,40 +69,69 @@ class ScriptCommandTracker:
         for handler in self._qmStartEvents:
             self._callHandler( handler )
 
-    def clearCommands( self ):
-        for cmdExpr in self._cmdExprs:
-            self._cmdMgr.unregisterCommand( cmdExpr )
-        self._cmdExprs = []
-        self._qmStartEvents[:] = []
-        self._genMgr.reset()
+    def clearCommands( self, fileName=None ):
+        """
+        Unregisters the commands of the given command file, or of all
+        files if fileName is None.
+        """
+
+        if fileName is None:
+            fileNames = list( self._cmdExprs )
+        else:
+            fileNames = [ fileName ]
+
+        for name in fileNames:
+            for cmdExpr in self._cmdExprs.pop( name, [] ):
+                self._cmdMgr.unregisterCommand( cmdExpr )
+            self._qmStartHandlers.pop( name, None )
+
+        if fileName is None:
+            self._qmStartHandlers = {}
+            self._qmStartEvents[:] = []
+            # Generators started by the other files' handlers can't be
+            # told apart, so they are only dropped on a full clear.
+            self._genMgr.reset()
+        else:
+            self._qmStartEvents[:] = [
+                handler
+                for handlers in self._qmStartHandlers.values()
+                for handler in handlers
+                ]
 
-    def _registerCommand( self, cmdObj, cmdExpr ):
+    def _registerCommand( self, cmdObj, cmdExpr, fileName=None ):
         try:
             self._cmdMgr.registerCommand( cmdExpr, cmdObj )
-            self._cmdExprs.append( cmdExpr )
+            self._cmdExprs.setdefault( fileName, [] ).append( cmdExpr )
         except CommandAlreadyRegisteredError:
             logging.warn( "Command already registered: %s" % cmdExpr )
 
-    def registerNewCommands( self, commandInfoList ):
+    def registerNewCommands( self, commandInfoList, fileName=None ):
         for info in commandInfoList:
             if hasattr( info["func"], "on_quasimode_start" ):
-                self._qmStartEvents.append( info["func"].on_quasimode_start )
+                handler = info["func"].on_quasimode_start
+                self._qmStartHandlers.setdefault( fileName, [] ).append(
+                    handler
+                    )
+                self._qmStartEvents.append( handler )
             cmd = adapters.makeCommandFromInfo(
                 info,
                 ensoapi.EnsoApi(),
                 self._genMgr
                 )
-            self._registerCommand( cmd, info["cmdExpr"] )
+            self._registerCommand( cmd, info["cmdExpr"], fileName )
 
 class ScriptTracker:
     def __init__( self, eventManager, commandManager ):
         self._scriptCmdTracker = ScriptCommandTracker( commandManager,
                                                        eventManager )
+        self._cmdMgr = commandManager
         from enso.providers import getInterface
         self._scriptFolder = getInterface("scripts_folder")()
-        self._lastMods = {}
-        self._registerDependencies()
-        self._pendingChanges = False
+        # Extra files each command file depends on, keyed by the
+        # command file.
+        self._fileDependencies = {}
+        self._watcher = ScriptWatcher( self._getCommandFolders() )
+        self._codeCache = CodeCache( CODE_CACHE_DIR, _CURRENT_PLATFORM )
 
         eventManager.registerResponder(
             self._updateScripts,
@@ -102,6 +142,9 @@ class ScriptTracker:
                                         TracebackCommand() )
         self._updateScripts(True)
 
+        if config.TRACK_COMMAND_CHANGES:
+            self._watcher.start()
+
     @classmethod
     def install( cls, eventManager, commandManager ):
         cls._instance = cls( eventManager, commandManager )
@@ -111,12 +154,46 @@ class ScriptTracker:
         return cls._instance
 
     def setPendingChanges( self ):
-        self._pendingChanges = True
+        # Called from the web UI's thread after it writes a command
+        # file; the scan happens there so the next quasimode start
+        # only has to pick up the queued paths.
+        self._watcher.scan()
+
+    def _compileScript( self, f ):
+        """
+        Returns the code object of the given command file, from the
+        code cache if the file is unchanged, or None if the file can't
+        be read or isn't meant for this platform.
+        """
 
-    @safetyNetted
-    def _getGlobalsFromSourceCode( self, text, filename ):
+        try:
+            stat = os.stat( f )
+        except OSError as e:
+            logging.error("Could not read command file '%s': %s" % (f, e))
+            return None
+
+        code = self._codeCache.load( f, stat )
+        if code is not None:
+            # Only files for this platform are ever cached.
+            return code
+
+        try:
+            text = open( f, "r", encoding="utf-8" ).read()
+        except Exception as e:
+            logging.error("Could not read command file '%s': %s" % (f, e))
+            return None
+
+        if not _platformsSupported(text):
+            logging.info("Skipping command file '%s': not for this "
+                         "platform." % f)
+            return None
+
+        code = compile( text, f, "exec" )
+        self._codeCache.store( f, stat, code )
+        return code
+
+    def _getGlobalsFromCode( self, code ):
         allGlobals = {}
-        code = compile( text, filename, "exec" )
         try:
             exec(code, allGlobals)
         except Exception as e:
@@ -124,103 +201,157 @@ class ScriptTracker:
             raise e
 
         return allGlobals
-    
+
+    def _getCommandFolders( self ):
+        # Absolute, so that paths reported by the watcher match the
+        # file names commands are registered under.
+        return [ os.path.abspath(self._scriptFolder),
+                 os.path.abspath(os.path.join(config.ENSO_USER_DIR,
+                                              "commands")) ]
+
     def _getCommandFiles( self ):
         commandFiles = []
-        try:
-            commandFiles = [
-              os.path.join(self._scriptFolder, x)
-              for x in os.listdir(self._scriptFolder)
-              if x.endswith(".py")
-            ]
-        except:
-            pass
-
-        try:
-            userScriptFolder = os.path.join(config.ENSO_USER_DIR, "commands")
-            commandFiles = commandFiles + [
-                os.path.join(userScriptFolder, x)
-                for x in os.listdir(userScriptFolder)
-                if x.endswith(".py")
-            ]
-        except:
-            pass
+        for folder in self._getCommandFolders():
+            try:
+                commandFiles = commandFiles + [
+                    os.path.join(folder, x)
+                    for x in os.listdir(folder)
+                    if x.endswith(".py")
+                ]
+            except:
+                pass
 
         return commandFiles
 
     def _reloadPyScripts( self ):
         self._scriptCmdTracker.clearCommands()
+        self._fileDependencies = {}
+        # Refresh the snapshot before reading, so that an edit made
+        # while the files load is still reported afterwards.
+        self._watcher.popChanges()
+        self._watcher.scan( queue=False )
         commandFiles = self._getCommandFiles()
 
         print(commandFiles)
 
-        for f in commandFiles:
-            try:
-                text = open( f, "r", encoding="utf-8" ).read()
-            except Exception as e:
-                logging.error("Could not read command file '%s': %s" % (f, e))
-                continue
-
-            if not _platformsSupported(text):
-                logging.info("Skipping command file '%s': not for this "
-                             "platform." % f)
-                continue
-
-            allGlobals = self._getGlobalsFromSourceCode(text, f)
-
-            if allGlobals is not None:
-                category = os.path.splitext(os.path.basename(f))[0].replace("_", " ")
-
-                if "CATEGORY" in allGlobals:
-                    category = allGlobals["CATEGORY"]
-
-                for fn in allGlobals:
-                    if callable(allGlobals[fn]) \
-                            and fn.startswith(cmdretriever.SCRIPT_PREFIX):
-                        allGlobals[fn].category = category
-                        allGlobals[fn].cmdFile = f
-
-                infos = cmdretriever.getCommandsFromObjects( allGlobals )
-                self._scriptCmdTracker.registerNewCommands( infos )
-                self._registerDependencies( allGlobals )
-
-    def _registerDependencies( self, allGlobals = None ):
-        baseDeps = self._getCommandFiles()
-
-        if allGlobals:
-            # Find any other files that the script may have executed
-            # via execfile().
-            extraDeps = [
-                obj.__code__.co_filename
-                for obj in list(allGlobals.values())
-                if ( (hasattr(obj, "__module__")) and
-                     (obj.__module__ is None) and 
-                     (hasattr(obj, "func_code")) )
-                ]
-        else:
-            extraDeps = []
+        self._loadScripts( commandFiles )
 
-        self._fileDependencies = list( set(baseDeps + extraDeps) )
+        self._watchDependencies()
 
-    def _updateScripts( self, init=False):
-        shouldReload = init
+    def _loadScripts( self, commandFiles ):
+        """
+        Compiles and executes the given command files, and registers
+        their commands, in file order.
+        """
 
-        if config.TRACK_COMMAND_CHANGES or self._pendingChanges:
-            for fileName in self._fileDependencies:
-                if os.path.exists( fileName ):
-                    lastMod = os.stat( fileName ).st_mtime
-                    if lastMod != self._lastMods.get(fileName):
-                        self._lastMods[fileName] = lastMod
-                        shouldReload = True
+        started = time.perf_counter()
+        for f in commandFiles:
+            self._loadScript( f )
 
-            for fileName in self._getCommandFiles():
-                if fileName not in self._fileDependencies:
-                    self._fileDependencies.append(fileName)
-                    self._lastMods[fileName] = os.stat( fileName ).st_mtime
-                    shouldReload = True
+        logging.info( "Loaded %d command files in %.1f ms." % (
+            len( commandFiles ),
+            ( time.perf_counter() - started ) * 1000
+            ) )
 
-            self._pendingChanges = False
+    @safetyNetted
+    def _loadScript( self, f ):
+        # Everything happens on the main thread: scripts may import
+        # modules, touch the GUI or rely on the files before them
+        # having run.
+        started = time.perf_counter()
+        code = self._compileScript( f )
+        compiled = time.perf_counter()
+        allGlobals = None
+        if code is not None:
+            allGlobals = self._getGlobalsFromCode( code )
+        compileTime = compiled - started
+        execTime = time.perf_counter() - compiled
+
+        message = "Command file '%s': compiled in %.1f ms, " \
+                  "executed in %.1f ms." % ( f, compileTime * 1000,
+                                              execTime * 1000 )
+        if compileTime + execTime > config.SLOW_COMMAND_FILE_SECONDS:
+            logging.warning( "Slow command file. " + message )
+        else:
+            logging.info( message )
+        startupprofile.addSpan( "command", f, compileTime + execTime,
+                                compileMs=round( compileTime * 1000, 3 ),
+                                execMs=round( execTime * 1000, 3 ) )
+
+        if allGlobals is None:
+            return
+
+        category = os.path.splitext(os.path.basename(f))[0].replace("_", " ")
+
+        if "CATEGORY" in allGlobals:
+            category = allGlobals["CATEGORY"]
+
+        for fn in allGlobals:
+            if callable(allGlobals[fn]) \
+                    and fn.startswith(cmdretriever.SCRIPT_PREFIX):
+                allGlobals[fn].category = category
+                allGlobals[fn].cmdFile = f
+
+        infos = cmdretriever.getCommandsFromObjects( allGlobals )
+        self._scriptCmdTracker.registerNewCommands( infos, f )
+        self._registerDependencies( f, allGlobals )
+
+    def _reloadChangedScripts( self, changedFiles ):
+        """
+        Reloads only the command files among (or depending on) the
+        given changed paths.
+        """
+
+        folders = self._getCommandFolders()
+        commandFiles = set()
+        for fileName in changedFiles:
+            if os.path.dirname( fileName ) in folders:
+                commandFiles.add( fileName )
+            for cmdFile, deps in self._fileDependencies.items():
+                if fileName in deps:
+                    commandFiles.add( cmdFile )
+
+        for f in sorted( commandFiles ):
+            logging.info( "Reloading command file '%s'." % f )
+            self._scriptCmdTracker.clearCommands( f )
+            self._fileDependencies.pop( f, None )
+            if os.path.exists( f ):
+                self._loadScript( f )
+            else:
+                self._codeCache.remove( f )
+
+        self._watchDependencies()
+
+    def _registerDependencies( self, fileName, allGlobals ):
+        # Find any other files that the script may have executed
+        # via execfile().
+        extraDeps = [
+            os.path.abspath( obj.__code__.co_filename )
+            for obj in list(allGlobals.values())
+            if ( (hasattr(obj, "__module__")) and
+                 (obj.__module__ is None) and
+                 (hasattr(obj, "func_code")) )
+            ]
 
-        if shouldReload:
-            self._reloadPyScripts()
+        self._fileDependencies[fileName] = set( extraDeps )
 
+    def _watchDependencies( self ):
+        extraDeps = set()
+        for deps in self._fileDependencies.values():
+            extraDeps.update( deps )
+        self._watcher.setExtraFiles( extraDeps )
+
+    def _updateScripts( self, init=False):
+        # Other threads (the web UI, voice) keep seeing the commands
+        # as they were until the whole reload is done.
+        if init:
+            with self._cmdMgr.batchUpdate():
+                self._reloadPyScripts()
+            return
+
+        # The watcher thread (or setPendingChanges) has already done
+        # the filesystem I/O; this only drains its queue.
+        changedFiles = self._watcher.popChanges()
+        if changedFiles:
+            with self._cmdMgr.batchUpdate():
+                self._reloadChangedScripts( changedFiles )
@@ -0,0 +1,324 @@
+"""
+    Background change detection for command script files.
+
+    A ScriptWatcher keeps a snapshot of the (mtime, size) of every
+    watched file and queues the paths whose snapshot changed.  On Linux
+    the watcher thread sleeps on inotify and only stats the files the
+    kernel reports; elsewhere (or when inotify is unavailable) it polls
+    the snapshot every POLL_INTERVAL seconds.  Folders that inotify
+    can't watch (e.g. ones that don't exist yet) are polled the same
+    way until a watch can be added for them.  Either way, the main
+    thread only ever calls popChanges(), which does no filesystem I/O.
+"""
+
+import ctypes
+import ctypes.util
+import logging
+import os
+import select
+import struct
+import sys
+import threading
+import time
+
+
+# Seconds between polls when inotify is unavailable; also the longest
+# time stop() waits for the inotify thread to notice.
+POLL_INTERVAL = 1.0
+
+# inotify(7) constants.
+_IN_ATTRIB = 0x00000004
+_IN_CLOSE_WRITE = 0x00000008
+_IN_MOVED_FROM = 0x00000040
+_IN_MOVED_TO = 0x00000080
+_IN_CREATE = 0x00000100
+_IN_DELETE = 0x00000200
+_IN_DELETE_SELF = 0x00000400
+_IN_MOVE_SELF = 0x00000800
+_IN_IGNORED = 0x00008000
+_IN_CLOEXEC = 0o2000000
+
+_IN_WATCH_MASK = ( _IN_ATTRIB | _IN_CLOSE_WRITE | _IN_MOVED_FROM |
+                   _IN_MOVED_TO | _IN_CREATE | _IN_DELETE |
+                   _IN_DELETE_SELF | _IN_MOVE_SELF )
+
+# struct inotify_event { int wd; uint32_t mask, cookie, len; char name[]; }
+_IN_EVENT_HEADER = struct.Struct( "iIII" )
+
+
+def _loadInotify():
+    """
+    Returns the libc handle with the inotify functions prototyped, or
+    None if this platform has no inotify.
+    """
+
+    if not sys.platform.startswith( "linux" ):
+        return None
+    try:
+        libc = ctypes.CDLL( ctypes.util.find_library( "c" ) or "libc.so.6",
+                            use_errno=True )
+        libc.inotify_init1.argtypes = ( ctypes.c_int, )
+        libc.inotify_init1.restype = ctypes.c_int
+        libc.inotify_add_watch.argtypes = ( ctypes.c_int, ctypes.c_char_p,
+                                            ctypes.c_uint32 )
+        libc.inotify_add_watch.restype = ctypes.c_int
+        return libc
+    except ( OSError, AttributeError ):
+        return None
+
+
+def _statKey( path ):
+    try:
+        st = os.stat( path )
+    except OSError:
+        return None
+    return ( st.st_mtime, st.st_size )
+
+
+class ScriptWatcher:
+    """
+    Watches the *.py files of a set of folders, plus any extra
+    dependency files, and queues the paths that change.
+    """
+
+    def __init__( self, folders ):
+        self.__folders = [ os.path.abspath( f ) for f in folders ]
+        self.__extraFiles = set()
+        self.__snapshot = {}
+        self.__changed = set()
+        self.__lock = threading.Lock()
+        self.__stopped = threading.Event()
+        self.__thread = None
+        self.__libc = None
+        # Guards the inotify fd and the watches, which setExtraFiles()
+        # adds to from the main thread.
+        self.__inotifyLock = threading.Lock()
+        self.__inotifyFd = -1
+        self.__watchDirs = {}
+        # Folders that should be watched but can't be yet.
+        self.__unwatchedDirs = set()
+
+    def setExtraFiles( self, paths ):
+        """
+        Sets the files outside the watched folders (e.g. files a
+        script executed) whose changes should also be reported.
+        """
+
+        paths = set( os.path.abspath( p ) for p in paths )
+        with self.__lock:
+            for path in paths - self.__extraFiles:
+                if path not in self.__snapshot:
+                    self.__snapshot[path] = _statKey( path )
+            self.__extraFiles = paths
+        with self.__inotifyLock:
+            if self.__inotifyFd >= 0:
+                for folder in set( os.path.dirname( p ) for p in paths ):
+                    self.__addWatch( folder )
+
+    def __listFiles( self, folders=None ):
+        """
+        Returns the watched files, or only those in the given folders.
+        """
+
+        files = set( p for p in self.__extraFiles
+                     if folders is None or os.path.dirname( p ) in folders )
+        for folder in self.__folders:
+            if folders is not None and folder not in folders:
+                continue
+            try:
+                names = os.listdir( folder )
+            except OSError:
+                continue
+            files.update( os.path.join( folder, name )
+                          for name in names if name.endswith( ".py" ) )
+        return files
+
+    def __isWatched( self, path ):
+        return ( path in self.__extraFiles or
+                 ( path.endswith( ".py" ) and
+                   os.path.dirname( path ) in self.__folders ) )
+
+    def __check( self, paths, queue=True ):
+        """
+        Stats the given paths and updates the snapshot, queueing any
+        whose (mtime, size) changed.
+        """
+
+        keys = [ ( path, _statKey( path ) ) for path in paths ]
+        with self.__lock:
+            for path, key in keys:
+                if self.__snapshot.get( path ) != key:
+                    if key is None:
+                        self.__snapshot.pop( path, None )
+                    else:
+                        self.__snapshot[path] = key
+                    if queue:
+                        self.__changed.add( path )
+
+    def scan( self, queue=True ):
+        """
+        Synchronously compares every watched file against the
+        snapshot.  With queue=False the snapshot is only refreshed,
+        which is what a caller about to (re)load everything wants.
+        """
+
+        with self.__lock:
+            known = set( self.__snapshot )
+        self.__check( self.__listFiles() | known, queue )
+
+    def popChanges( self ):
+        """
+        Returns the set of paths that changed since the last call.
+        Does no filesystem I/O.
+        """
+
+        with self.__lock:
+            changed = self.__changed
+            self.__changed = set()
+        return changed
+
+    def start( self ):
+        if self.__thread is not None:
+            return
+        self.__stopped.clear()
+        self.__thread = threading.Thread( target=self.__run,
+                                          name="ScriptWatcher" )
+        self.__thread.daemon = True
+        self.__thread.start()
+
+    def stop( self ):
+        if self.__thread is None:
+            return
+        self.__stopped.set()
+        self.__thread.join( POLL_INTERVAL * 2 )
+        self.__thread = None
+
+    # ----------------------------------------------------------------------
+    # Watcher thread
+    # ----------------------------------------------------------------------
+
+    def __run( self ):
+        try:
+            if self.__initInotify():
+                self.__runInotify()
+        except Exception:
+            logging.exception( "Script watcher failed; polling instead." )
+        finally:
+            self.__closeInotify()
+
+        while not self.__stopped.wait( POLL_INTERVAL ):
+            self.scan()
+
+    def __addWatch( self, folder ):
+        """
+        Watches the given folder, or remembers it for __pollUnwatched()
+        if it can't be watched yet.  Must be called with the inotify
+        lock held.
+        """
+
+        if folder in self.__watchDirs.values():
+            return True
+        wd = self.__libc.inotify_add_watch(
+            self.__inotifyFd, os.fsencode( folder ), _IN_WATCH_MASK
+            )
+        if wd < 0:
+            self.__unwatchedDirs.add( folder )
+            return False
+        self.__watchDirs[wd] = folder
+        self.__unwatchedDirs.discard( folder )
+        return True
+
+    def __initInotify( self ):
+        libc = _loadInotify()
+        if libc is None:
+            return False
+        with self.__inotifyLock:
+            self.__libc = libc
+            self.__inotifyFd = libc.inotify_init1( _IN_CLOEXEC )
+            if self.__inotifyFd < 0:
+                return False
+
+            # A folder that does not exist yet can't be watched; it is
+            # polled until it can.
+            folders = self.__folders + [ os.path.dirname( p )
+                                         for p in self.__extraFiles ]
+            for folder in folders:
+                if not self.__addWatch( folder ):
+                    logging.info( "Cannot watch '%s' yet; polling it for "
+                                  "command script changes." % folder )
+        return True
+
+    def __closeInotify( self ):
+        with self.__inotifyLock:
+            if self.__inotifyFd >= 0:
+                os.close( self.__inotifyFd )
+            self.__inotifyFd = -1
+            self.__watchDirs = {}
+            self.__unwatchedDirs = set()
+
+    def __pollUnwatched( self, folders=() ):
+        """
+        Retries the watches of the folders that couldn't be watched,
+        and checks their files, along with those of the given folders,
+        since inotify can't have reported changes to them.
+        """
+
+        with self.__inotifyLock:
+            folders = set( folders ) | self.__unwatchedDirs
+            for folder in list( self.__unwatchedDirs ):
+                self.__addWatch( folder )
+        if not folders:
+            return
+        with self.__lock:
+            known = set( p for p in self.__snapshot
+                         if os.path.dirname( p ) in folders )
+        self.__check( self.__listFiles( folders ) | known )
+
+    def __runInotify( self ):
+        # Catch anything that changed between the caller's snapshot
+        # and the watches being added.
+        self.scan()
+
+        lastPoll = time.monotonic()
+        while not self.__stopped.is_set():
+            ready, _, _ = select.select( [self.__inotifyFd], [], [],
+                                         POLL_INTERVAL )
+            if time.monotonic() - lastPoll >= POLL_INTERVAL:
+                lastPoll = time.monotonic()
+                self.__pollUnwatched()
+            if not ready:
+                continue
+            data = os.read( self.__inotifyFd, 64 * 1024 )
+
+            paths = set()
+            lostFolders = set()
+            offset = 0
+            while offset < len( data ):
+                wd, mask, cookie, length = _IN_EVENT_HEADER.unpack_from(
+                    data, offset
+                    )
+                offset += _IN_EVENT_HEADER.size
+                name = data[offset:offset + length].rstrip( b"\0" )
+                offset += length
+
+                with self.__inotifyLock:
+                    if mask & ( _IN_DELETE_SELF | _IN_MOVE_SELF |
+                                _IN_IGNORED ):
+                        # A watched folder went away; it is polled
+                        # until it can be watched again.
+                        folder = self.__watchDirs.pop( wd, None )
+                        if folder is not None:
+                            self.__unwatchedDirs.add( folder )
+                            lostFolders.add( folder )
+                        continue
+                    folder = self.__watchDirs.get( wd )
+                if folder is None or not name:
+                    continue
+                path = os.path.join( folder, os.fsdecode( name ) )
+                if self.__isWatched( path ):
+                    paths.add( path )
+
+            if paths:
+                self.__check( paths )
+            if lostFolders:
+                self.__pollUnwatched( lostFolders )
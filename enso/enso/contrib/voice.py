@@ -26,6 +26,8 @@ from xml.sax.saxutils import escape
 from enso import config
 from enso.events import EventManager
 from enso.commands import CommandManager
+from enso.commands import state as commandstate
+from enso.commands.state import CommandStateStore
 from enso.messages import displayMessage
 
 try:
@@ -212,10 +214,13 @@ def _buildVerbs():
       {expression}") becomes a verb with a dictated tail, since there is
       nothing to enumerate.
     """
-    commands = CommandManager.get().getCommands()
+    commands = CommandManager.get().getSnapshot().commands
+    cmdState = CommandStateStore.get()
+    voice = cmdState.getNames(commandstate.VOICE)
+    voiceConfirm = cmdState.getNames(commandstate.VOICE_CONFIRM)
     verbs = []
     for name, command in commands.items():
-        if name not in config.VOICE_COMMANDS:
+        if name not in voice:
             continue
         prefix = name.split("{", 1)[0].strip()
         if not prefix:
@@ -236,7 +241,7 @@ def _buildVerbs():
             # Engine holds the command until the user says "yes" (or the
             # confirm timeout drops it). Honored regardless of the confidence
             # bands, so it works with trust_grammar_match too.
-            confirm=name in config.VOICE_CONFIRM_COMMANDS,
+            confirm=name in voiceConfirm,
             description=command.getDescription() or "",
             data=name,  # original command-expression, echoed back in events
         ))
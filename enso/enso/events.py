@@ -50,15 +50,27 @@
     calls the various on<event>() methods when events occur.  These
     methods in turn call any responder functions registered for the
     appropriate type of event.
+
+    Besides event responders, functions can be scheduled to be called
+    once after a delay (callLater()) or periodically (callEvery()).
+    Platforms whose InputManager provides setNextTickDelay() only tick
+    when a scheduled call is due, so an idle Enso doesn't wake up at
+    all; "timer" responders are themselves a periodic scheduled call,
+    which only exists while any are registered.  On other platforms,
+    due calls are run from the InputManager's regular tick.
 """
 
 # ----------------------------------------------------------------------------
 # Imports
 # ----------------------------------------------------------------------------
 
+import heapq
+import itertools
 import logging
+import time
 from enso import input
 from enso import config
+from enso.utils.responderstats import ResponderStats
 
 
 # ----------------------------------------------------------------------------
@@ -83,6 +95,30 @@ EVENT_TYPES = [
 # Enso will consider the system idle after the following number of seconds.
 IDLE_TIMEOUT = 60*5
 
+# Milliseconds between calls of "timer" responders, on platforms
+# that tick on demand.
+TIMER_TICK_MS = 10
+
+
+# ----------------------------------------------------------------------------
+# Scheduled Calls
+# ----------------------------------------------------------------------------
+
+class ScheduledCall:
+    """
+    A function scheduled with EventManager.callLater() or
+    EventManager.callEvery(); cancel() unschedules it.
+    """
+
+    def __init__( self, func, deadline, intervalMs ):
+        self.func = func
+        self.deadline = deadline
+        self.intervalMs = intervalMs
+        self.cancelled = False
+
+    def cancel( self ):
+        self.cancelled = True
+
 
 # ----------------------------------------------------------------------------
 # EventManager class
@@ -121,7 +157,201 @@ class EventManager( input.InputManager ):
             self.__responders[evt] = []
 
 
-        self.__currIdleTime = 0
+        # Scheduled calls, as a heap of ( deadline, sequence number,
+        # ScheduledCall ); cancelled calls are dropped lazily.
+        self.__scheduled = []
+        self.__sequence = itertools.count()
+
+        # Whether the InputManager ticks only when asked to; see
+        # setNextTickDelay().
+        self.__ticksOnDemand = hasattr( self, "setNextTickDelay" )
+
+        # The periodic call that runs the "timer" responders, and when
+        # it last ran.
+        self.__timerCall = None
+        self.__lastTimerTick = 0
+
+        # The last user activity, for idle detection.
+        self.__lastActivity = time.monotonic()
+        self.callLater( IDLE_TIMEOUT * 1000, self.__checkIdle )
+
+        # Responder latency statistics, or None when they are off.
+        self.__stats = None
+        if config.EVENT_STATS_ENABLED:
+            self.setStatsEnabled( True )
+
+    def setStatsEnabled( self, isEnabled ):
+        """
+        Turns the recording of responder latencies on or off; see
+        enso.utils.responderstats.
+        """
+
+        if not isEnabled:
+            self.__stats = None
+        elif self.__stats is None:
+            self.__stats = ResponderStats( config.EVENT_RESPONDER_BUDGET_MS )
+
+    def getStats( self ):
+        """
+        Returns the ResponderStats being recorded, or None if
+        recording is off.
+        """
+
+        return self.__stats
+
+    def __dispatch( self, eventType, *args, **kwargs ):
+        """
+        Calls every responder of the given type with the given
+        arguments, timing each call if statistics are enabled.
+        """
+
+        stats = self.__stats
+        if stats is None:
+            for func in self.__responders[ eventType ]:
+                func( *args, **kwargs )
+            return
+
+        clock = time.perf_counter
+        for func in self.__responders[ eventType ]:
+            start = clock()
+            try:
+                func( *args, **kwargs )
+            finally:
+                stats.record( eventType, func, clock() - start )
+
+    def callLater( self, delayMs, func ):
+        """
+        Calls func() once, delayMs milliseconds from now, and returns
+        the ScheduledCall.  Must be called on the main thread.
+        """
+
+        return self.__schedule( func, delayMs, None )
+
+    def callEvery( self, intervalMs, func ):
+        """
+        Calls func() every intervalMs milliseconds, starting
+        intervalMs from now, until the returned ScheduledCall is
+        cancelled.  Must be called on the main thread.
+        """
+
+        return self.__schedule( func, intervalMs, intervalMs )
+
+    def __schedule( self, func, delayMs, intervalMs ):
+        deadline = time.monotonic() + delayMs / 1000.0
+        call = ScheduledCall( func, deadline, intervalMs )
+        heapq.heappush( self.__scheduled,
+                        ( deadline, next( self.__sequence ), call ) )
+        if self.__scheduled[0][2] is call:
+            self.__armTimer()
+        return call
+
+    def __runDueCalls( self ):
+        """
+        Runs the scheduled calls whose deadline has passed, timing
+        each call as a "scheduled" event if statistics are enabled.
+        """
+
+        now = time.monotonic()
+        scheduled = self.__scheduled
+        stats = self.__stats
+        clock = time.perf_counter
+        try:
+            while scheduled and scheduled[0][0] <= now:
+                deadline, sequence, call = heapq.heappop( scheduled )
+                if call.cancelled:
+                    continue
+                if call.intervalMs is not None:
+                    # A periodic call that fell behind skips the missed
+                    # calls rather than running them in a burst.
+                    interval = call.intervalMs / 1000.0
+                    call.deadline = deadline + interval
+                    if call.deadline <= now:
+                        call.deadline = now + interval
+                    heapq.heappush( scheduled,
+                                    ( call.deadline, next( self.__sequence ),
+                                      call ) )
+                # The timer tick's responders are timed on their own.
+                isTimed = stats is not None and call is not self.__timerCall
+                if isTimed:
+                    start = clock()
+                try:
+                    call.func()
+                except Exception:
+                    # Exceptions propagate, like those of responders.
+                    # A broken call would most likely fail again, so
+                    # it is cancelled; the timer tick is kept, since
+                    # it serves all the "timer" responders.
+                    if call is not self.__timerCall:
+                        call.cancel()
+                    raise
+                finally:
+                    if isTimed:
+                        stats.record( "scheduled", call.func,
+                                      clock() - start )
+        finally:
+            # Calls that are still due run on the next tick.
+            self.__armTimer()
+
+    def __armTimer( self ):
+        """
+        Asks the InputManager to tick when the next scheduled call is
+        due, or not at all if there is none.
+        """
+
+        if not self.__ticksOnDemand:
+            return
+
+        scheduled = self.__scheduled
+        while scheduled and scheduled[0][2].cancelled:
+            heapq.heappop( scheduled )
+        if scheduled:
+            delayMs = max( 0.0, ( scheduled[0][0] - time.monotonic() ) * 1000 )
+            self.setNextTickDelay( delayMs )
+        else:
+            self.setNextTickDelay( None )
+
+    def __onTimerTick( self ):
+        """
+        Calls the "timer" responders with the time since they were
+        last called.
+        """
+
+        now = time.monotonic()
+        msPassed = int( round( ( now - self.__lastTimerTick ) * 1000 ) )
+        self.__lastTimerTick = now
+        self.__dispatch( "timer", msPassed )
+
+    def __startTimerTicks( self ):
+        if self.__ticksOnDemand:
+            if self.__timerCall is None:
+                self.__lastTimerTick = time.monotonic()
+                self.__timerCall = self.callEvery( TIMER_TICK_MS,
+                                                   self.__onTimerTick )
+        elif hasattr(self, 'setTickRate'):
+            # Switch to fast tick rate when any timer responder registers.
+            self.setTickRate(True)
+
+    def __stopTimerTicks( self ):
+        if self.__ticksOnDemand:
+            if self.__timerCall is not None:
+                self.__timerCall.cancel()
+                self.__timerCall = None
+                self.__armTimer()
+        elif hasattr(self, 'setTickRate'):
+            # Switch to slow tick rate when no timer responders remain.
+            self.setTickRate(False)
+
+    def __checkIdle( self ):
+        """
+        Fires the idle event if there was no user activity for
+        IDLE_TIMEOUT seconds, and schedules the next check.
+        """
+
+        idleTime = time.monotonic() - self.__lastActivity
+        if idleTime >= IDLE_TIMEOUT:
+            self._onIdle()
+            idleTime = 0
+        self.callLater( ( IDLE_TIMEOUT - idleTime ) * 1000, self.__checkIdle )
 
     def createEventType( self, typeName ):
         """
@@ -142,8 +372,7 @@ class EventManager( input.InputManager ):
         """
 
         assert eventType in self._dynamicEventTypes
-        for func in self.__responders[ eventType ]:
-            func( *args, **kwargs )
+        self.__dispatch( eventType, *args, **kwargs )
         
 
     def getResponders( self, eventType ):
@@ -172,9 +401,8 @@ class EventManager( input.InputManager ):
         if eventType in ["dismissal","mousemove"]:
             self.enableMouseEvents( True )
 
-        # Switch to fast tick rate when any timer responder registers.
-        if eventType == "timer" and hasattr(self, 'setTickRate'):
-            self.setTickRate(True)
+        if eventType == "timer":
+            self.__startTimerTicks()
 
         # def wrapper(*args, **kwargs ):
         #     print(eventType)
@@ -207,11 +435,9 @@ class EventManager( input.InputManager ):
             if (numMouseResponders + numDismissResponders) == 0:
                 self.enableMouseEvents( False )
 
-        # Switch to slow tick rate when no timer responders remain.
         if "timer" in removedTypes \
-                and len(self.__responders["timer"]) == 0 \
-                and hasattr(self, 'setTickRate'):
-            self.setTickRate(False)
+                and len(self.__responders["timer"]) == 0:
+            self.__stopTimerTicks()
 
 
     def run( self ):
@@ -233,9 +459,8 @@ class EventManager( input.InputManager ):
         any useful input events for IDLE_TIMEOUT seconds.
         """
         
-        self.__currIdleTime = 0
-        for func in self.__responders[ "idle" ]:
-            func()
+        self.__lastActivity = time.monotonic()
+        self.__dispatch( "idle" )
 
     def onInit( self ):
         """
@@ -243,8 +468,7 @@ class EventManager( input.InputManager ):
         starts running.
         """
         
-        for func in self.__responders[ "init" ]:
-            func()
+        self.__dispatch( "init" )
 
     def onExitRequested( self ):
         """
@@ -256,17 +480,16 @@ class EventManager( input.InputManager ):
 
     def onTick( self, msPassed ):
         """
-        Low-level event handler called at a regular interval.  The
-        number of milliseconds passed since the last onTick() call is
-        passed in, although this value may not be 100% accurate.
+        Low-level event handler called at a regular interval, or,
+        if the InputManager ticks on demand, when the delay last
+        passed to setNextTickDelay() has passed.  The number of
+        milliseconds passed since the last onTick() call is passed
+        in, although this value may not be 100% accurate.
         """
 
-        self.__currIdleTime += msPassed
-
-        if self.__currIdleTime >= 1000*IDLE_TIMEOUT:
-            self._onIdle()
-        for func in self.__responders[ "timer" ]:
-            func( msPassed )
+        if not self.__ticksOnDemand:
+            self.__dispatch( "timer", msPassed )
+        self.__runDueCalls()
 
     def onTrayMenuItem( self, menuId ):
         """
@@ -275,8 +498,7 @@ class EventManager( input.InputManager ):
         """
         
         self._onDismissalEvent()
-        for func in self.__responders[ "traymenu" ]:
-            func( menuId )
+        self.__dispatch( "traymenu", menuId )
 
     def _onDismissalEvent( self ):
         """
@@ -284,9 +506,8 @@ class EventManager( input.InputManager ):
         movement, or mouse button click is made.
         """
         
-        self.__currIdleTime = 0
-        for func in self.__responders[ "dismissal" ]:
-            func()
+        self.__lastActivity = time.monotonic()
+        self.__dispatch( "dismissal" )
 
     def onKeypress( self, eventType, keyCode ):
         """
@@ -294,10 +515,9 @@ class EventManager( input.InputManager ):
         is made.
         """
 
-        self.__currIdleTime = 0
+        self.__lastActivity = time.monotonic()
         self._onDismissalEvent()
-        for func in self.__responders[ "key" ]:
-            func( eventType, keyCode )
+        self.__dispatch( "key", eventType, keyCode )
 
 
 
@@ -309,8 +529,7 @@ class EventManager( input.InputManager ):
         """
         
         self._onDismissalEvent()
-        for func in self.__responders[ "mousemove" ]:
-            func( x, y )
+        self.__dispatch( "mousemove", x, y )
 
     def onSomeMouseButton( self ):
         """
@@ -326,6 +545,5 @@ class EventManager( input.InputManager ):
         keypress is made.
         """
 
-        for func in self.__responders[ "somekey" ]:
-            func()
+        self.__dispatch( "somekey" )
         self._onDismissalEvent()
@@ -49,6 +49,17 @@ from enso import cairo
 from enso.utils.memoize import memoized
 
 
+# ----------------------------------------------------------------------------
+# Constants
+# ----------------------------------------------------------------------------
+
+# The most Font objects (one per name, size and style) to keep pooled.
+FONT_CACHE_SIZE = 64
+
+# The most glyphs each Font object keeps cached.
+GLYPH_CACHE_SIZE = 512
+
+
 # ----------------------------------------------------------------------------
 # Fonts
 # ----------------------------------------------------------------------------
@@ -96,22 +107,26 @@ class Font:
         self.cairoContext.restore()
 
     @classmethod
-    @memoized
+    @memoized( maxSize = FONT_CACHE_SIZE )
     def get( cls, name, size, isItalic ):
         """
         Retrieves the Font object with the given properties.
 
         The fact that this class method is memoized effectively makes
-        this mechanism a flyweight pool of Font objects.
+        this mechanism a flyweight pool of Font objects; the least
+        recently used ones are dropped once the pool is full.
         """
 
         return cls( name, size, isItalic )
 
-    @memoized
+    @memoized( maxSize = GLYPH_CACHE_SIZE, perInstance = True )
     def getGlyph( self, char ):
         """
         Returns a glyph of the font corresponding to the given Unicode
         character.
+
+        Glyphs are cached on the Font itself, so a Font dropped from
+        the pool takes its glyphs with it.
         """
 
         return FontGlyph( char, self, self.cairoContext )
@@ -183,5 +198,19 @@ class FontGlyph:
         self.yMin = -yBearing + height
         self.yMax = -yBearing
         self.advance = xAdvance
-        
+
+        # The index of the glyph in the font face, used to draw runs
+        # of glyphs with a single show_glyphs() call.  Characters
+        # that don't map to exactly one glyph (or cairo bindings that
+        # can't tell us) get None, and are drawn with show_text().
+        self.index = None
+        try:
+            glyphs = cairoContext.get_scaled_font().text_to_glyphs(
+                0, 0, self.charAsUtf8, False
+                )
+            if len( glyphs ) == 1:
+                self.index = glyphs[0][0]
+        except ( AttributeError, cairo.Error ):
+            pass
+
         cairoContext.restore()
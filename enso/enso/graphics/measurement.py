@@ -43,7 +43,7 @@
 # Imports
 # ----------------------------------------------------------------------------
 
-from enso.utils.memoize import memoized
+from enso.utils.memoize import memoized, clearMemoized
 
 
 # ----------------------------------------------------------------------------
@@ -68,6 +68,9 @@ def setPixelsPerInch( ppi ):
     global _ppi
     _ppi = float(ppi)
 
+    # Conversions cached at the old PPI are now wrong.
+    clearMemoized( strToPoints )
+
 def getPixelsPerInch():
     """
     Returns the current PPI of the screen in the Measurement module.
@@ -0,0 +1,87 @@
+#!/usr/bin/env python3
+
+# Standalone benchmark for XML text layout markup parsing (needs cairo,
+# but no GUI).
+#
+# Compares the validating SAX parser with the fast-path tokenizer used
+# by xmlMarkupToDocument(), on lines like those drawn by the quasimode:
+# first parsing alone, then the full conversion into a laid-out
+# Document.  Run with a repeat count to override the default, e.g.
+# "benchmark_xmlmarkup.py 2000".
+
+import os
+import sys
+import timeit
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__),
+                                                os.path.pardir,
+                                                os.path.pardir,
+                                                os.path.pardir)))
+
+from enso.graphics import xmltextlayout
+
+REPEAT = 1000
+LINES = [
+    "<document><line>Welcome to Enso! Enter a command, or type "
+    "&quot;help&quot; for assistance.</line></document>",
+    "<document><line><ins>op</ins>en <alt>{name}</alt></line></document>",
+    "<document><line><ins>open</ins> with</line></document>",
+    "<document><line>calculat<ins>e</ins><help> &#8212; evaluates "
+    "the selected expression</help></line></document>",
+    "<document><line><ins>go</ins>ogle <alt>{search terms}</alt>"
+    "&nbsp;&lt;web&gt;</line></document>",
+]
+
+
+def make_styles():
+    styles = xmltextlayout.StyleRegistry()
+    styles.add("document", font_family="Sans", font_style="normal",
+               font_size="24pt", width="1000pt", max_lines="1",
+               margin_top="7pt", margin_bottom="5pt", line_height="24pt",
+               ellipsify="true")
+    styles.add("line", text_align="left", color="#ffffff",
+               margin_top="0pt", margin_bottom="0pt")
+    styles.add("help", font_style="italic", color="#999999")
+    styles.add("ins", color="#7f9845")
+    styles.add("alt", color="#ffffff")
+    return styles
+
+
+def make_aliases():
+    aliases = xmltextlayout.XmlMarkupTagAliases()
+    aliases.add("line", baseElement="block")
+    for name in ("ins", "alt", "help"):
+        aliases.add(name, baseElement="inline")
+    return aliases
+
+
+def best_time(function, validate, repeat):
+    xmltextlayout.VALIDATE_MARKUP = validate
+    try:
+        return min(timeit.repeat(lambda: [function(line) for line in LINES],
+                                 number=repeat, repeat=5)) / repeat
+    finally:
+        xmltextlayout.VALIDATE_MARKUP = False
+
+
+def main():
+    repeat = int(sys.argv[1]) if len(sys.argv) > 1 else REPEAT
+    styles = make_styles()
+    aliases = make_aliases()
+
+    def parse(line):
+        return xmltextlayout._parseMarkup(line)
+
+    def convert(line):
+        return xmltextlayout.xmlMarkupToDocument(line, styles, aliases)
+
+    print("%10s %10s %10s %9s" % ("", "sax us", "fast us", "speedup"))
+    for label, function in (("parse", parse), ("document", convert)):
+        old = best_time(function, True, repeat)
+        new = best_time(function, False, repeat)
+        print("%10s %10.1f %10.1f %8.1fx"
+              % (label, old * 1e6, new * 1e6, old / new))
+
+
+if __name__ == "__main__":
+    main()
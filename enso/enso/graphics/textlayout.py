@@ -53,6 +53,39 @@
       http://freetype.sourceforge.net/freetype2/docs/glyphs/index.html
 """
 
+# ----------------------------------------------------------------------------
+# Imports
+# ----------------------------------------------------------------------------
+
+import math
+
+from enso import cairo
+from enso.utils.lru import LruCache
+
+
+# ----------------------------------------------------------------------------
+# Constants
+# ----------------------------------------------------------------------------
+
+# Maximum number of rendered lines kept by the line surface cache.
+LINE_SURFACE_CACHE_SIZE = 64
+
+# Padding, in device pixels, around the ink bounding box of a cached
+# line surface; this leaves room for antialiased glyph edges.
+LINE_SURFACE_PADDING = 2
+
+# Rendered line surfaces, keyed by the line's cache key and its
+# position relative to the device pixel grid.
+_lineSurfaces = LruCache( LINE_SURFACE_CACHE_SIZE )
+
+def clearLineSurfaces():
+    """
+    Drops all rendered line surfaces, e.g. when the color theme
+    changes and none of them will be drawn again.
+    """
+
+    _lineSurfaces.clear()
+
 # ----------------------------------------------------------------------------
 # The Document Element
 # ----------------------------------------------------------------------------
@@ -82,6 +115,11 @@ class Document:
 
         # Total height of the block, in points.
         self.height = None
+
+        # Hashable key identifying the content and style of the
+        # document; if set, the document's lines are rendered through
+        # the line surface cache.
+        self.cacheKey = None
         
     def addBlock( self, block ):
         """
@@ -109,8 +147,12 @@ class Document:
         """
         
         y += self.marginTop
-        for block in self.blocks:
-            block.draw( x, y, cairoContext )
+        for index, block in enumerate( self.blocks ):
+            if self.cacheKey is None:
+                blockKey = None
+            else:
+                blockKey = ( self.cacheKey, index )
+            block.draw( x, y, cairoContext, blockKey )
             y += block.height
 
 
@@ -308,14 +350,21 @@ class Block:
                       self.lineHeight * len(self.lines) + \
                       self.marginBottom
 
-    def draw( self, x, y, cairoContext ):
+    def draw( self, x, y, cairoContext, cacheKey = None ):
         """
         Draws the block with its upper-left corner at the given
         coordinates (in points), using the given cairo context.
+
+        If 'cacheKey' is given, the block's lines are rendered
+        through the line surface cache.
         """
         
-        for line in self.lines:
-            line.draw( x, y, cairoContext )
+        for index, line in enumerate( self.lines ):
+            if cacheKey is None:
+                lineKey = None
+            else:
+                lineKey = ( cacheKey, index )
+            line.draw( x, y, cairoContext, lineKey )
             y += self.lineHeight
 
 
@@ -527,32 +576,111 @@ class Line:
         # Add the ellipsis to the end of this line.
         self.addGlyphs( [ellipsisGlyph] )
 
-    def draw( self, x, y, cairoContext ):
+    def draw( self, x, y, cairoContext, cacheKey = None ):
         """
         Draws the line to the given cairo context so that the top-left
         of the line's line box is at the given coordinates, in points.
+
+        If 'cacheKey' is given, it must uniquely identify the line's
+        content and style; the line is then rasterized once into an
+        offscreen surface, which is blitted on subsequent draws.
+        """
+
+        if cacheKey is None:
+            self.__drawGlyphs( x, y, cairoContext )
+        else:
+            self.__drawCached( x, y, cairoContext, cacheKey )
+
+    def __drawGlyphs( self, x, y, cairoContext ):
+        """
+        Draws the glyphs of the line, coalescing consecutive glyphs
+        of the same font and color into a single show_glyphs() call.
         """
         
         y += self.distanceToBaseline
         spaceOfs = 0.0
         glyphX = 0.0
         currFont = None
+        currColor = None
+        run = []
         for glyph in self.glyphs:
+            if glyph.isWhitespace:
+                spaceOfs += self.__ofsPerSpace
+                continue
+
             glyphX = spaceOfs + \
                      self.__alignOfs + \
                      x + \
                      glyph.pos
+            index = glyph.fontGlyph.index
 
-            if not glyph.isWhitespace:
+            if currFont != glyph.font or currColor != glyph.color:
+                if run:
+                    cairoContext.show_glyphs( run )
+                    run = []
                 if currFont != glyph.font:
                     currFont = glyph.font
                     currFont.loadInto( cairoContext )
-                cairoContext.set_source_rgba( *glyph.color )
+                if currColor != glyph.color:
+                    currColor = glyph.color
+                    cairoContext.set_source_rgba( *currColor )
+
+            if index is None:
+                # The character has no single glyph of its own, so
+                # let cairo shape it.
+                if run:
+                    cairoContext.show_glyphs( run )
+                    run = []
                 cairoContext.move_to( glyphX, y )
-
                 cairoContext.show_text( glyph.charAsUtf8 )
             else:
-                spaceOfs += self.__ofsPerSpace
+                run.append( ( index, glyphX, y ) )
+
+        if run:
+            cairoContext.show_glyphs( run )
+
+    def __drawCached( self, x, y, cairoContext, cacheKey ):
+        """
+        Draws the line by blitting its rendered surface from the line
+        surface cache, rendering it first if necessary.
+        """
+
+        # The surface is aligned to whole device pixels; the
+        # fractional part of the line's device position is baked into
+        # the rendering, and therefore into the key.
+        devX, devY = cairoContext.user_to_device( x + self.xMin,
+                                                  y + self.yMin )
+        scaleX, scaleY = cairoContext.user_to_device_distance( 1.0, 1.0 )
+        originX = math.floor( devX ) - LINE_SURFACE_PADDING
+        originY = math.floor( devY ) - LINE_SURFACE_PADDING
+        key = ( cacheKey,
+                round( devX - originX, 3 ),
+                round( devY - originY, 3 ),
+                scaleX,
+                scaleY )
+
+        surface = _lineSurfaces.get( key )
+        if surface is None:
+            width = int( math.ceil( (self.xMax - self.xMin) * scaleX ) ) + \
+                    2 * LINE_SURFACE_PADDING + 1
+            height = int( math.ceil( (self.yMax - self.yMin) * scaleY ) ) + \
+                     2 * LINE_SURFACE_PADDING + 1
+            surface = cairoContext.get_target().create_similar(
+                cairo.CONTENT_COLOR_ALPHA,
+                width,
+                height
+                )
+            lineContext = cairo.Context( surface )
+            lineContext.translate( devX - originX, devY - originY )
+            lineContext.scale( scaleX, scaleY )
+            self.__drawGlyphs( -self.xMin, -self.yMin, lineContext )
+            _lineSurfaces.put( key, surface )
+
+        cairoContext.save()
+        cairoContext.identity_matrix()
+        cairoContext.set_source_surface( surface, originX, originY )
+        cairoContext.paint()
+        cairoContext.restore()
 
 
 class InvalidAlignmentError( Exception ):
@@ -601,3 +729,4 @@ class Glyph:
 
         char = self.char.encode( "ascii", "replace" )
         return "<TextLayout Glyph '%s'>" % char
+
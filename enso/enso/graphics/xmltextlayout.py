@@ -44,6 +44,7 @@
 # Imports
 # ----------------------------------------------------------------------------
 
+import re
 import xml.sax
 import xml.sax.handler
 
@@ -281,6 +282,28 @@ class StyleRegistry:
 
         self.__validateKeys( properties )
         self._styleDict[ selector ].update( properties )
+
+    def getSignature( self ):
+        """
+        Returns a hashable snapshot of the registry's current styles,
+        suitable for use as part of a cache key.
+
+        Examples:
+
+        >>> styles = StyleRegistry()
+        >>> styles.add( 'document', width = '1000pt' )
+        >>> before = styles.getSignature()
+        >>> before == styles.getSignature()
+        True
+        >>> styles.update( 'document', width = '500pt' )
+        >>> before == styles.getSignature()
+        False
+        """
+
+        return tuple( sorted(
+            ( selector, tuple( sorted( properties.items() ) ) )
+            for selector, properties in self._styleDict.items()
+            ) )
         
         
 class InvalidPropertyError( Exception ):
@@ -684,15 +707,50 @@ class XmlMarkupUnexpectedCharactersError( Exception ):
 # XML Markup to Document Conversion
 # ----------------------------------------------------------------------------
 
-def xmlMarkupToDocument( text, styleRegistry, tagAliases=None ):
+# If true, all markup is parsed by the SAX parser, which validates it
+# fully, rather than by the fast-path tokenizer.
+VALIDATE_MARKUP = False
+
+# Tokens of the XML text layout markup dialect understood by the
+# fast-path tokenizer: a start, end or empty-element tag with quoted
+# attributes, a run of character data, or a character or predefined
+# entity reference.  Any other character is matched on its own, so
+# that the tokenizer can tell it has left the dialect.
+_MARKUP_TOKEN = re.compile(
+    r"""<(?P<close>/?)(?P<name>[A-Za-z_][A-Za-z0-9_.-]*)"""
+    r"""(?P<attrs>(?:\s+[A-Za-z_][A-Za-z0-9_.-]*\s*=\s*"""
+    r"""(?:"[^"<&]*"|'[^'<&]*'))*)\s*(?P<empty>/?)>"""
+    r"""|(?P<text>[^<&]+)"""
+    r"""|&(?P<ref>#x[0-9a-fA-F]+|#[0-9]+|lt|gt|amp|quot|apos);"""
+    r"""|(?P<other>.)""",
+    re.DOTALL
+    )
+
+_MARKUP_ATTRIBUTE = re.compile(
+    r"""([A-Za-z_][A-Za-z0-9_.-]*)\s*=\s*(?:"([^"]*)"|'([^']*)')"""
+    )
+
+# Characters that may not appear anywhere in an XML document, not even
+# in attribute values; the SAX parser rejects text containing them.
+_ILLEGAL_XML_CHARS = re.compile(
+    "[^\t\n\r\x20-\ud7ff\ue000-\ufffd\U00010000-\U0010ffff]"
+    )
+
+_PREDEFINED_ENTITIES = {
+    "lt" : "<",
+    "gt" : ">",
+    "amp" : "&",
+    "quot" : '"',
+    "apos" : "'",
+    }
+
+
+def _collapseMarkup( text ):
     """
-    Converts the given XML text into a textlayout.Document object that
-    has been fully laid out and is ready for rendering, using the
-    given style registry and tag alises.
+    Collapses the whitespace of the given XML text and replaces its
+    non-breaking space entity references.
     """
 
-    import re
-    
     # Convert all occurrences of multiple contiguous whitespace
     # characters to a single space character.
     text = re.sub( r"\s+", " ", text )
@@ -700,9 +758,200 @@ def xmlMarkupToDocument( text, styleRegistry, tagAliases=None ):
     # Convert all occurrences of the non-breaking space character
     # entity reference into its unicode equivalent (the SAX XML parser
     # doesn't recognize this one on its own, sadly).
-    text = text.replace( "&nbsp;", NON_BREAKING_SPACE )
+    return text.replace( "&nbsp;", NON_BREAKING_SPACE )
+
+
+def _referenceToChar( ref ):
+    """
+    Returns the character for the given entity reference name, or
+    None if it names a character that isn't allowed in XML.
+    """
+
+    if ref[0] != "#":
+        return _PREDEFINED_ENTITIES[ref]
+
+    if ref[1] == "x":
+        code = int( ref[2:], 16 )
+    else:
+        code = int( ref[1:] )
+
+    if code in ( 0x9, 0xA, 0xD ) or \
+       0x20 <= code <= 0xD7FF or \
+       0xE000 <= code <= 0xFFFD or \
+       0x10000 <= code <= 0x10FFFF:
+        return chr( code )
+    return None
+
+
+def _tokenizeMarkup( text ):
+    """
+    Fast-path tokenizer for XML text layout markup.  Returns the same
+    parse events that the SAX parser would report for the given
+    (collapsed) text, or None if the text uses anything beyond the
+    markup dialect--comments, processing instructions, CDATA
+    sections, custom entities--or isn't well-formed (including text
+    with characters that XML doesn't allow), in which case the text
+    must be left to the SAX parser.
+
+    >>> _tokenizeMarkup( "<document>a&amp;b</document>" )
+    [('startElement', ('document', {})), ('characters', ('a&b',)), ('endElement', ('document',))]
+    >>> _tokenizeMarkup( "<document>a\x01b</document>" ) is None
+    True
+    >>> _tokenizeMarkup( "<document a='\x01'/>" ) is None
+    True
+    """
+
+    if "]]>" in text or _ILLEGAL_XML_CHARS.search( text ):
+        return None
+
+    events = []
+    openElements = []
+    rootClosed = False
+    for close, name, attrText, empty, content, ref, other in \
+            _MARKUP_TOKEN.findall( text ):
+        if other:
+            return None
+
+        if name:
+            if close:
+                if attrText or empty:
+                    return None
+                if not openElements or openElements.pop() != name:
+                    return None
+                events.append( ( "endElement", ( name, ) ) )
+                rootClosed = not openElements
+                continue
+
+            if rootClosed:
+                return None
+            attrs = {}
+            if attrText:
+                for attr in _MARKUP_ATTRIBUTE.finditer( attrText ):
+                    attrName, value1, value2 = attr.groups()
+                    if attrName in attrs:
+                        return None
+                    if value1 == None:
+                        value1 = value2
+                    attrs[attrName] = value1
+            events.append( ( "startElement", ( name, attrs ) ) )
+            if empty:
+                events.append( ( "endElement", ( name, ) ) )
+                rootClosed = not openElements
+            else:
+                openElements.append( name )
+            continue
+
+        if not openElements:
+            # Only whitespace may appear outside the root element.
+            if ref or content.strip( " " ):
+                return None
+            continue
+
+        if ref:
+            content = _referenceToChar( ref )
+            if content == None:
+                return None
+
+        lastEvent = events[-1]
+        if lastEvent[0] == "characters":
+            events[-1] = ( "characters", ( lastEvent[1][0] + content, ) )
+        else:
+            events.append( ( "characters", ( content, ) ) )
+
+    if openElements or not rootClosed:
+        return None
+
+    return events
+
+
+class _XmlMarkupRecorder( xml.sax.handler.ContentHandler ):
+    """
+    XML content handler that records the parsing events of XML text
+    layout markup, so that they can be replayed later.
+    """
+
+    def startDocument( self ):
+        self.events = []
+
+    def startElement( self, name, attrs ):
+        self.events.append( ( "startElement", ( name, dict( attrs ) ) ) )
+
+    def endElement( self, name ):
+        self.events.append( ( "endElement", ( name, ) ) )
+
+    def characters( self, content ):
+        self.events.append( ( "characters", ( content, ) ) )
+
+
+def _parseMarkup( text ):
+    """
+    Parses the given XML text into a list of parse events, using the
+    fast-path tokenizer where possible and the SAX parser otherwise;
+    raises the SAX parser's exception if the text is not well-formed.
+    """
+
+    text = _collapseMarkup( text )
+
+    events = None
+    if not VALIDATE_MARKUP:
+        events = _tokenizeMarkup( text )
+
+    if events == None:
+        recorder = _XmlMarkupRecorder()
+        text = text.encode( "ascii", "xmlcharrefreplace" )
+        xml.sax.parseString( text, recorder )
+        events = recorder.events
+
+    return events
+
+
+def _markupEventsToDocument( events, styleRegistry, tagAliases ):
+    """
+    Replays the given parse events into a new textlayout.Document.
+    """
 
     xmlMarkupHandler = _XmlMarkupHandler( styleRegistry, tagAliases )
-    text = text.encode( "ascii", "xmlcharrefreplace" )
-    xml.sax.parseString( text, xmlMarkupHandler )
+    xmlMarkupHandler.startDocument()
+    for method, args in events:
+        getattr( xmlMarkupHandler, method )( *args )
+    xmlMarkupHandler.endDocument()
     return xmlMarkupHandler.document
+
+
+def xmlMarkupToDocument( text, styleRegistry, tagAliases=None ):
+    """
+    Converts the given XML text into a textlayout.Document object that
+    has been fully laid out and is ready for rendering, using the
+    given style registry and tag alises.
+    """
+
+    return _markupEventsToDocument( _parseMarkup( text ),
+                                    styleRegistry,
+                                    tagAliases )
+
+
+class ParsedXmlMarkup:
+    """
+    XML text layout markup that has been parsed once, and can be
+    converted into any number of documents, e.g. with the same markup
+    laid out using different font sizes.
+    """
+
+    def __init__( self, text ):
+        """
+        Parses the given XML text; raises the SAX parser's exception
+        if the text is not well-formed.
+        """
+
+        self.__events = _parseMarkup( text )
+
+    def toDocument( self, styleRegistry, tagAliases=None ):
+        """
+        Converts the parsed markup into a textlayout.Document object
+        that has been fully laid out and is ready for rendering,
+        exactly as xmlMarkupToDocument() would for the original text.
+        """
+
+        return _markupEventsToDocument( self.__events,
+                                        styleRegistry,
+                                        tagAliases )
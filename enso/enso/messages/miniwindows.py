@@ -44,6 +44,8 @@
 # Imports
 # ----------------------------------------------------------------------------
 
+import bisect
+
 from enso import config
 from enso import graphics
 from enso.graphics.measurement import pointsToPixels, pixelsToPoints
@@ -63,6 +65,10 @@ MINI_MARGIN = pixelsToPoints( 10 )
 MINI_SCALE = [ 10, 12, 14 ]
 MINI_BG_COLOR = [ .62, .75, .34, .85 ]
 
+# Interval, in milliseconds, at which visible mini messages are checked
+# for being finished while no animation is running.
+MINI_POLL_INTERVAL_MS = 100
+
 
 # ----------------------------------------------------------------------------
 # Mini Message Queue
@@ -88,6 +94,8 @@ class MiniMessageQueue:
         self.__visibleMessages = []
 
         self.__isPolling = False
+        self.__pollCall = None
+        self.__isAnimating = False
 
         self.__status = self.EMPTY
         self.__changingIndex = None
@@ -98,6 +106,10 @@ class MiniMessageQueue:
         self.__mousePos = None
         self.__mouseChanged = False
 
+        # Finds the visible window under the mouse; rebuilt whenever
+        # the windows move.
+        self.__hitIndex = None
+
     def hideAll( self ):
         if self.__hidingAll:
             return
@@ -121,6 +133,9 @@ class MiniMessageQueue:
         if self.__mousePos != (x,y):
             self.__mousePos = (x,y)
             self.__mouseChanged = True
+            # Mouse moves are events of their own, so there is no
+            # need to wait for the next poll.
+            self.__onMouseMove()
 
 
     def __onMouseMove( self ):
@@ -134,23 +149,11 @@ class MiniMessageQueue:
         self.__mouseChanged = False
         x, y = self.__mousePos
 
+        if self.__hitIndex is None:
+            self.__hitIndex = _WindowStackIndex( self.__visibleMessages )
+
         oldIndex = self.__mouseoverIndex
-        newIndex = None
-        for index in range( len(self.__visibleMessages) ):
-            miniWind = self.__visibleMessages[index]
-            size = miniWind.getSize()
-            pos = miniWind.getPos()
-            if ( x > pos[0] and x < (pos[0] + size[0]) ) \
-                   and ( y > pos[1] and y < (pos[1] + size[1]) ):
-                # The mouse is inside this miniWindow
-                if index == oldIndex:
-                    # Don't change the appearance; it's already
-                    # 'moused-over'.
-                    newIndex = oldIndex
-                    break
-                else:
-                    newIndex = index
-                    break
+        newIndex = self.__hitIndex.find( x, y )
 
         if newIndex != oldIndex and oldIndex != None:
             # The mouse has changed.
@@ -174,6 +177,25 @@ class MiniMessageQueue:
 
 
     def onTick( self, msPassed ):
+        if self.__status == self.POLLING:
+            self.__onPoll()
+        elif self.__status == self.APPEARING:
+            # Update the appearing animation.
+            self.__onAppearingTick( msPassed )
+        elif self.__status == self.VANISHING:
+            # Update the appearing animation.
+            self.__onVanishingTick( msPassed )
+        else:
+            # LONGTERM TODO: Decide whether this should raise an assertion
+            # error, or just set the status to polling.
+            raise Exception( "What's going on!?" )
+
+
+    def __onPoll( self ):
+        """
+        Starts the next animation, if any is due.
+        """
+
         if self.__status == self.POLLING:
             self.__onMouseMove()
             
@@ -190,16 +212,6 @@ class MiniMessageQueue:
                 for index in range( len(self.__visibleMessages) ):
                     if self.__visibleMessages[index].message.isFinished():
                         self.__startVanishing( index )
-        elif self.__status == self.APPEARING:
-            # Update the appearing animation.
-            self.__onAppearingTick( msPassed )
-        elif self.__status == self.VANISHING:
-            # Update the appearing animation.
-            self.__onVanishingTick( msPassed )
-        else:
-            # LONGTERM TODO: Decide whether this should raise an assertion
-            # error, or just set the status to polling.
-            raise Exception( "What's going on!?" )
 
 
     def __showHelpMessage( self, xPos, yPos, rounded ):
@@ -232,14 +244,28 @@ class MiniMessageQueue:
             topMsg.roundTopLeftCorner()
 
     def __startPolling( self ):
+        """
+        Enters the polling state.  Unlike the animations, which need
+        a "timer" responder, polling only checks the messages every
+        MINI_POLL_INTERVAL_MS, and mouse moves are handled as they
+        come, so that idle mini messages cost next to nothing.
+        """
+
         self.__status = self.POLLING
+        self.__stopAnimating()
+
+        # Check right away, instead of at the next poll.
+        self.__evtManager.callLater( 0, self.__onPoll )
 
         if self.__isPolling:
             return
         else:
             self.__isPolling = True
 
-            self.__evtManager.registerResponder( self.onTick, "timer" )
+            self.__pollCall = self.__evtManager.callEvery(
+                MINI_POLL_INTERVAL_MS,
+                self.__onPoll
+                )
             self.__evtManager.registerResponder( self.onMouseMove,
                                                  "mousemove" )
 
@@ -249,10 +275,23 @@ class MiniMessageQueue:
 
         self.__isPolling = False
         self.__hidingAll = False
-        self.__evtManager.removeResponder( self.onTick )
+        self.__pollCall.cancel()
+        self.__pollCall = None
         self.__evtManager.removeResponder( self.onMouseMove )
         self.__status = self.EMPTY
 
+    def __startAnimating( self ):
+        self.__hitIndex = None
+        if not self.__isAnimating:
+            self.__isAnimating = True
+            self.__evtManager.registerResponder( self.onTick, "timer" )
+
+    def __stopAnimating( self ):
+        self.__hitIndex = None
+        if self.__isAnimating:
+            self.__isAnimating = False
+            self.__evtManager.removeResponder( self.onTick )
+
     def __startAppearing( self, msg ):
         xPos = graphics.getDesktopSize()[0]
         xPos -= MINI_WIND_SIZE[0]
@@ -278,6 +317,7 @@ class MiniMessageQueue:
         self.__visibleMessages.append( newWindow )
         self.__changingIndex = len(self.__visibleMessages) - 1
         self.__status = self.APPEARING
+        self.__startAnimating()
         self.__roundTopWindow()
 
     def __stopAppearing( self ):
@@ -293,6 +333,7 @@ class MiniMessageQueue:
             self.__hideHelpMessage()
             
         self.__status = self.VANISHING
+        self.__startAnimating()
 
     def __stopVanishing( self ):
         self.__visibleMessages.pop( self.__changingIndex )
@@ -337,6 +378,47 @@ class MiniMessageQueue:
                     self.__visibleMessages[i].slideDown( distancePer )
 
 
+# ----------------------------------------------------------------------------
+# Mini Window Hit-Testing
+# ----------------------------------------------------------------------------
+
+class _WindowStackIndex:
+    """
+    Finds which of a stack of windows contains a point, by a binary
+    search over the vertical intervals the windows occupy, rather
+    than by testing each window.  The windows are assumed not to
+    overlap vertically, as the mini windows stacked in the corner of
+    the desktop don't.
+
+    As before, a point on a window's edge is not inside the window.
+    """
+
+    def __init__( self, windows ):
+        intervals = []
+        for index, wind in enumerate( windows ):
+            ( xPos, yPos ), ( width, height ) = wind.getPos(), wind.getSize()
+            intervals.append( ( yPos, yPos + height, xPos, xPos + width,
+                                index ) )
+        intervals.sort()
+        self.__tops = [ interval[0] for interval in intervals ]
+        self.__intervals = intervals
+
+    def find( self, x, y ):
+        """
+        Returns the index (in the list given to the constructor) of
+        the window containing x,y, or None.
+        """
+
+        # The last window whose top is above y is the only candidate.
+        position = bisect.bisect_left( self.__tops, y ) - 1
+        if position < 0:
+            return None
+        top, bottom, left, right, index = self.__intervals[position]
+        if y < bottom and left < x < right:
+            return index
+        return None
+
+
 # ----------------------------------------------------------------------------
 # Generic Message Window
 # ----------------------------------------------------------------------------
@@ -42,14 +42,17 @@
 
 import logging
 
+from enso import cairo
 from enso import config
 from enso import graphics
 from enso.graphics import xmltextlayout
-from enso.graphics.measurement import inchesToPoints
+from enso.graphics.measurement import inchesToPoints, pointsToPixels
+from enso.graphics.measurement import getPixelsPerInch
 from enso.graphics import rounded_rect
 from enso.utils.xml_tools import escape_xml
 from enso.messages.windows import MessageWindow, computeWidth
 from enso.quasimode import layout
+from enso.utils.lru import LruCache
 
 # ----------------------------------------------------------------------------
 # Constants
@@ -58,6 +61,12 @@ from enso.quasimode import layout
 # Total length of time from dismissal to full fade-out (in ms)
 ANIMATION_TIME = 250
 
+# The fade-out repaints the window at most this many times per second...
+ANIMATION_FPS = 60
+
+# ...and only when its opacity (0-255) changed by at least this much.
+MIN_OPACITY_STEP = 8
+
 # Amount of time (in ms) to wait after primary message creation before
 # allowing dismissal events to trigger the animation
 WAIT_TIME = 80
@@ -87,6 +96,10 @@ LINE_SPACING = 1
 # Distance between the main text block and the caption block.
 CAPTION_OFFSET = 0
 
+# Maximum number of rendered messages kept by the message surface
+# cache.
+MESSAGE_SURFACE_CACHE_SIZE = 16
+
 
 # ----------------------------------------------------------------------------
 # The Primary Message Window class
@@ -132,6 +145,10 @@ class PrimaryMsgWind( MessageWindow ):
         self.__waiting = False
         self.__animating = False
 
+        # Rendered messages, keyed by _getSurfaceKey(), as ( width,
+        # height, surface ) tuples.
+        self.__surfaces = LruCache( MESSAGE_SURFACE_CACHE_SIZE )
+
 
     def setMessage( self, message ):
         """
@@ -165,6 +182,8 @@ class PrimaryMsgWind( MessageWindow ):
         
         self.__evtManager.removeResponder( self.onDismissal )
         self.__timeSinceDismissal = 0
+        self.__timeSinceFrame = 0
+        self.__opacity = 255
         self.__evtManager.registerResponder( self.animationTick, "timer" )
         self.__animating = True
         
@@ -172,6 +191,10 @@ class PrimaryMsgWind( MessageWindow ):
     def animationTick( self, msPassed ):
         """
         Called on a timer event to animate the window's fadeout.
+
+        Only the window's opacity changes, and the window is repainted
+        at most ANIMATION_FPS times a second, and only once the
+        opacity changed by a visible step.
         """
         
         self.__timeSinceDismissal += msPassed
@@ -179,9 +202,18 @@ class PrimaryMsgWind( MessageWindow ):
             self.__onAnimationFinished()
             return
 
+        self.__timeSinceFrame += msPassed
+        if self.__timeSinceFrame < 1000.0 / ANIMATION_FPS:
+            return
+
         timeLeft  = ANIMATION_TIME - self.__timeSinceDismissal
         frac = timeLeft / float(ANIMATION_TIME)
         opacity = int( 255*frac )
+        if self.__opacity - opacity < MIN_OPACITY_STEP:
+            return
+
+        self.__timeSinceFrame = 0
+        self.__opacity = opacity
         self._wind.setOpacity( opacity )
         self._wind.update()
 
@@ -251,6 +283,36 @@ class PrimaryMsgWind( MessageWindow ):
         text = self.__msg.getPrimaryXml()
         self.clearWindow()
 
+        key = _getSurfaceKey( text )
+        rendered = self.__surfaces.get( key )
+        if rendered is None:
+            width, height = self.__renderMessage( text )
+            rendered = ( width, height, self.__copySurface( width, height ) )
+            self.__surfaces.put( key, rendered )
+        else:
+            # A message that was shown before: just blit it.
+            width, height, surface = rendered
+            self.setSize( width, height )
+            self.__position()
+            cr = self._context
+            cr.save()
+            cr.identity_matrix()
+            cr.set_source_surface( surface, 0, 0 )
+            cr.paint()
+            cr.restore()
+
+        # Set the window opacity (which can be left at 0 by the animation)
+        self._wind.setOpacity( 255 )
+        # Show and update the window.
+        self.show(foreground)
+
+
+    def __renderMessage( self, text ):
+        """
+        Lays out and draws the message XML text to the underlying
+        Cairo context.  Returns the resulting window size.
+        """
+
         msgText, capText = splitContent( text )
         width,height = self.getMaxSize()
         width -= 2*PRIM_MSG_MARGIN
@@ -263,16 +325,32 @@ class PrimaryMsgWind( MessageWindow ):
                self.__layoutBlocks( msgDoc, capDoc )
 
         # Set the window size and draw the outlining rectangle
-        self.__setupBackground( width, height )
+        width, height = self.__setupBackground( width, height )
         # Draw the text.
         msgDoc.draw( msgPos[0], msgPos[1], self._context )
         if capDoc != None:
             capDoc.draw( capPos[0], capPos[1], self._context )
 
-        # Set the window opacity (which can be left at 0 by the animation)
-        self._wind.setOpacity( 255 )
-        # Show and update the window.
-        self.show(foreground)
+        return width, height
+
+
+    def __copySurface( self, width, height ):
+        """
+        Returns a copy of the top left width by height points of the
+        underlying Cairo surface.
+        """
+
+        target = self._context.get_target()
+        surface = target.create_similar(
+            cairo.CONTENT_COLOR_ALPHA,
+            max( int( pointsToPixels( width ) ), 1 ),
+            max( int( pointsToPixels( height ) ), 1 )
+            )
+        cr = cairo.Context( surface )
+        cr.set_source_surface( target, 0, 0 )
+        cr.set_operator( cairo.OPERATOR_SOURCE )
+        cr.paint()
+        return surface
 
 
     def __isOneLineMsg( self, msgDoc, capDoc ):
@@ -348,7 +426,7 @@ class PrimaryMsgWind( MessageWindow ):
         """
         Given a text region of width and height, sets the size of the
         underlying window to be that plus margins, and draws a rounded
-        background rectangle.
+        background rectangle.  Returns the window size.
         """
 
         width += (2*PRIM_MSG_MARGIN)-2
@@ -369,6 +447,7 @@ class PrimaryMsgWind( MessageWindow ):
             )
         cr.set_source_rgba( *MSG_BGCOLOR )
         cr.fill_preserve()
+        return width, height
 
 
     def __layoutBlocks( self, messageDoc, captionDoc ):
@@ -509,6 +588,24 @@ def layoutMessageXml( xmlMarkup, width, size, height, ellipsify="false",
     return document
 
 
+def _getSurfaceKey( messageXml ):
+    """
+    Returns the key of the rendering of messageXml in the message
+    surface cache: the markup, everything about the theme that the
+    rendering depends on, and the desktop size.
+    """
+
+    # The document style is rewritten for each layout; only its font
+    # is part of the theme.
+    styles = tuple( style for style in _styles.getSignature()
+                    if style[0] != "document" )
+    theme = ( styles,
+              _styles.findMatch( "document" )[ "font_family" ],
+              tuple( MSG_BGCOLOR ),
+              getPixelsPerInch() )
+    return ( messageXml, theme, tuple( graphics.getDesktopSize() ) )
+
+
 def splitContent(  messageXml ):
     """
     Splits messageXml into two parts: main, and caption.
@@ -7,15 +7,22 @@ Contributions from Stuart "aquarius" Langridge.
 Rewritten for Python 3 / PyGObject / python-xlib.
 
 The InputManager owns Enso's main loop (Gtk.main) and pumps timer ticks
-into the core; a companion thread listens for the quasimode trigger key
+into the core, arming a single GLib timeout for whenever the core's
+scheduler next has work due (see setNextTickDelay()), and none while
+nothing is; a companion thread listens for the quasimode trigger key
 via a passive X key grab and captures the keyboard while the quasimode
-is active.  All events are marshalled onto the GTK main thread, since
-Enso core is not thread-safe.
+is active.  While the core wants mouse events, another thread listens
+for XInput2 raw pointer events, so the pointer is only queried after
+it actually moved; without XInput2 it is polled instead.  All events
+are marshalled onto the GTK main thread, since Enso core is not
+thread-safe.
 """
 
 import atexit
 import ctypes
 import logging
+import math
+import os
 import select
 import shutil
 import signal
@@ -31,11 +38,26 @@ from gi.repository import Gtk, GLib
 from Xlib import X
 from Xlib.error import ConnectionClosedError
 
+try:
+    from Xlib.ext import xinput
+except ImportError:
+    xinput = None
+
 from enso.platform.linux.x11 import utils
 
-# Timer tick interval, in milliseconds.
-TICK_INTERVAL_MS_FAST = 10
-TICK_INTERVAL_MS_SLOW = 50
+# Interval, in milliseconds, at which the pointer is polled while
+# mouse events are enabled and XInput2 is unavailable.
+MOUSE_POLL_INTERVAL_MS = 50
+
+# Pointer events arriving within this many milliseconds of each other
+# cost a single pointer query.
+POINTER_EVENT_COALESCE_MS = 10
+
+# How far, in milliseconds, the armed timeout may be from the next tick
+# the core wants and still be kept.  The delays the scheduler asks for
+# are rounded up to whole milliseconds, so a steady 10 ms tick comes out
+# as 9 or 10 ms; re-adding the GLib source for that would be wasted work.
+TIMER_SLACK_MS = 1
 
 # Event types, matching the win32 InputManager constants.
 EVENT_KEY_UP = 0
@@ -431,6 +453,141 @@ class _XKeyListener(threading.Thread):
             self.__autoRepeatDisabled = False
 
 
+class _XPointerListener(threading.Thread):
+    """Thread that, while enabled, subscribes to XInput2 raw motion and
+    button press events on the root window, which X delivers however
+    the pointer moves and whatever window is under it.  Activity is
+    posted to the main thread, coalesced; while disabled, the thread
+    is deselected from the events and sleeps.  It owns a private X
+    display connection."""
+
+    def __init__(self, parent, display, opcode):
+        threading.Thread.__init__(self, daemon=True)
+        self.__parent = parent
+        self.__display = display
+        self.__opcode = opcode
+        self.__terminate = False
+        self.__wanted = False
+        self.__selected = False
+        self.__wakeRead, self.__wakeWrite = os.pipe()
+        self.__isClosed = False
+        self.__lock = threading.Lock()
+        # None while no activity awaits the main thread, otherwise
+        # whether a button was pressed.
+        self.__pending = None
+
+    @classmethod
+    def create(cls, parent):
+        """Returns a new listener, or None if the X server (or
+        python-xlib) has no XInput 2."""
+        if xinput is None:
+            return None
+        display = None
+        try:
+            display = utils.open_display()
+            if not display.has_extension("XInputExtension"):
+                display.close()
+                return None
+            opcode = display.query_extension("XInputExtension").major_opcode
+            version = display.xinput_query_version()
+            if version.major_version < 2:
+                display.close()
+                return None
+        except Exception:
+            logging.info("XInput2 unavailable; polling the pointer:\n%s"
+                         % traceback.format_exc())
+            if display is not None:
+                display.close()
+            return None
+        return cls(parent, display, opcode)
+
+    # ------------------------------------------------------------------
+    # Requests from other threads
+    # ------------------------------------------------------------------
+
+    def setEnabled(self, isEnabled):
+        self.__wanted = isEnabled
+        self.__wake()
+
+    def stop(self):
+        self.__terminate = True
+        self.__wake()
+
+    def popActivity(self):
+        """Returns whether a button was pressed since the last call."""
+        with self.__lock:
+            pressed = bool(self.__pending)
+            self.__pending = None
+        return pressed
+
+    def __wake(self):
+        with self.__lock:
+            if self.__isClosed:
+                return
+            try:
+                os.write(self.__wakeWrite, b"\0")
+            except OSError:
+                pass
+
+    # ------------------------------------------------------------------
+    # Main loop
+    # ------------------------------------------------------------------
+
+    def run(self):
+        try:
+            while not self.__terminate:
+                self.__updateSelection()
+                # Drain first: requests above may have queued events
+                # internally while the socket stays empty.
+                while self.__display.pending_events():
+                    self.__handleEvent(self.__display.next_event())
+                ready, _, _ = select.select(
+                    [self.__display, self.__wakeRead], [], [])
+                if self.__wakeRead in ready:
+                    os.read(self.__wakeRead, 64)
+        except Exception:
+            logging.error("Pointer listener died; polling the pointer:\n%s"
+                          % traceback.format_exc())
+            GLib.idle_add(self.__parent._onPointerListenerFailed)
+        finally:
+            try:
+                self.__display.close()
+            except Exception:
+                pass
+            with self.__lock:
+                self.__isClosed = True
+                os.close(self.__wakeRead)
+                os.close(self.__wakeWrite)
+
+    def __updateSelection(self):
+        wanted = self.__wanted
+        if wanted == self.__selected:
+            return
+        mask = 0
+        if wanted:
+            mask = xinput.RawMotionMask | xinput.RawButtonPressMask
+        self.__display.screen().root.xinput_select_events(
+            [(xinput.AllMasterDevices, mask)])
+        self.__display.flush()
+        self.__selected = wanted
+
+    def __handleEvent(self, event):
+        if event.type != X.GenericEvent or event.extension != self.__opcode:
+            return
+        if event.evtype == xinput.RawButtonPress:
+            pressed = True
+        elif event.evtype == xinput.RawMotion:
+            pressed = False
+        else:
+            return
+        with self.__lock:
+            schedule = self.__pending is None
+            self.__pending = bool(self.__pending) or pressed
+        if schedule:
+            GLib.timeout_add(POINTER_EVENT_COALESCE_MS,
+                             self.__parent._dispatchPointerEvent)
+
+
 class InputManager(object):
     """Input event manager: owns the GTK main loop and the key listener.
     Enso's EventManager subclasses this and overrides the on* hooks."""
@@ -440,10 +597,19 @@ class InputManager(object):
         self.__qmKeycodes = [KEYCODE_CAPITAL, KEYCODE_RETURN, KEYCODE_ESCAPE]
         self.__isModal = False
         self.__keyListener = None
+        # The XInput2 pointer listener, or None to poll the pointer.
+        self.__pointerListener = None
         self.__lastMousePos = None
         self.__lastMouseButtons = 0
-        self.__tickIntervalMs = TICK_INTERVAL_MS_SLOW
+        # The delay until the next tick the core asked for, or None.
+        self.__tickDelayMs = None
+        # The armed GLib timeout, its interval, and when it fires next.
         self.__timeoutId = None
+        self.__timeoutMs = None
+        self.__timeoutDeadline = None
+        self.__lastTickTime = time.monotonic()
+        self.__isRunning = False
+        self.__inTimer = False
 
     # ------------------------------------------------------------------
     # Main loop
@@ -452,8 +618,13 @@ class InputManager(object):
     def run(self):
         logging.info("Entering InputManager.run()")
 
-        self.__timeoutId = GLib.timeout_add(self.__tickIntervalMs,
-                                            self.__onTimer)
+        self.__isRunning = True
+        self.__lastTickTime = time.monotonic()
+        self.__pointerListener = _XPointerListener.create(self)
+        if self.__pointerListener is not None:
+            self.__pointerListener.setEnabled(self.__mouseEventsEnabled)
+            self.__pointerListener.start()
+        self.__armTimer()
         GLib.unix_signal_add(GLib.PRIORITY_DEFAULT, signal.SIGINT,
                              self.__onSigint)
 
@@ -468,9 +639,12 @@ class InputManager(object):
         finally:
             self.__keyListener.stop()
             self.__keyListener.join(2.0)
-            if self.__timeoutId:
-                GLib.source_remove(self.__timeoutId)
-                self.__timeoutId = None
+            if self.__pointerListener is not None:
+                self.__pointerListener.stop()
+                self.__pointerListener.join(2.0)
+                self.__pointerListener = None
+            self.__isRunning = False
+            self.__armTimer()
 
         logging.info("Exiting InputManager.run()")
 
@@ -485,33 +659,89 @@ class InputManager(object):
     def __onTimer(self):
         # A tick handler exception must not kill the timeout source:
         # returning a falsy value would remove it permanently.
+        self.__inTimer = True
+        # If it is kept, GLib fires this timeout again one interval
+        # after this dispatch.
+        self.__timeoutDeadline = time.monotonic() + self.__timeoutMs / 1000.0
         try:
-            if self.__mouseEventsEnabled:
+            if self.__isPollingMouse():
                 self.__pollMouse()
-            self.onTick(self.__tickIntervalMs)
+            now = time.monotonic()
+            msPassed = int(round((now - self.__lastTickTime) * 1000))
+            self.__lastTickTime = now
+            self.onTick(msPassed)
         except Exception:
             logging.error("Exception in timer event handler:\n%s"
                           % traceback.format_exc())
-        return GLib.SOURCE_CONTINUE
+        finally:
+            self.__inTimer = False
+
+        # Keep this timeout running if the next tick is due after
+        # about the same interval, which is the steady state while
+        # "timer" responders are registered; otherwise re-arm (or
+        # disarm).
+        if self.__keepsTimeout(self.__getTimerInterval()):
+            return GLib.SOURCE_CONTINUE
+        self.__timeoutId = None
+        self.__timeoutMs = None
+        self.__armTimer()
+        return GLib.SOURCE_REMOVE
 
-    def setTickRate(self, fast):
-        """Switch between fast (10ms) and slow (50ms) tick rates.
-        Called by EventManager when active UI work begins/ends."""
-        desired = TICK_INTERVAL_MS_FAST if fast else TICK_INTERVAL_MS_SLOW
-        if desired == self.__tickIntervalMs:
-            return
-        self.__tickIntervalMs = desired
+    def setNextTickDelay(self, delayMs):
+        """Arms the timer to call onTick() once delayMs milliseconds
+        have passed, replacing any earlier request; None means that no
+        tick is needed.  Called by the EventManager's scheduler."""
+        self.__tickDelayMs = delayMs
+        if not self.__inTimer:
+            self.__armTimer()
+
+    def __getTimerInterval(self):
+        if not self.__isRunning:
+            return None
+        delayMs = self.__tickDelayMs
+        if self.__isPollingMouse():
+            if delayMs is None or delayMs > MOUSE_POLL_INTERVAL_MS:
+                delayMs = MOUSE_POLL_INTERVAL_MS
+        if delayMs is None:
+            return None
+        return max(0, int(math.ceil(delayMs)))
+
+    def __keepsTimeout(self, interval):
+        """Returns whether the armed timeout fires within TIMER_SLACK_MS
+        of the tick wanted interval milliseconds from now."""
+        if interval is None or self.__timeoutId is None:
+            return False
+        deadline = time.monotonic() + interval / 1000.0
+        return abs(deadline - self.__timeoutDeadline) * 1000 <= TIMER_SLACK_MS
+
+    def __armTimer(self):
+        interval = self.__getTimerInterval()
         if self.__timeoutId is not None:
+            # A tick that comes slightly early is harmless: nothing is
+            # due yet, and the timer is re-armed for the rest of the
+            # delay.
+            if self.__keepsTimeout(interval):
+                return
             GLib.source_remove(self.__timeoutId)
-            self.__timeoutId = GLib.timeout_add(desired, self.__onTimer)
+            self.__timeoutId = None
+        self.__timeoutMs = interval
+        if interval is not None:
+            self.__timeoutDeadline = time.monotonic() + interval / 1000.0
+            self.__timeoutId = GLib.timeout_add(interval, self.__onTimer)
 
+    def __isPollingMouse(self):
+        return self.__mouseEventsEnabled and self.__pointerListener is None
 
-    def __pollMouse(self):
+    def __pollMouse(self, pressed=False):
         # X11 has no lightweight global mouse hook comparable to
-        # win32's; poll the pointer on the same tick that already
+        # win32's.  With XInput2, the pointer listener calls this once
+        # the pointer moved or a button was pressed (pressed tells
+        # which, since a click may be over by the time the pointer is
+        # queried).  Without it, poll the pointer on the tick that
         # drives onTick(), which is cheap since query_pointer() is a
-        # single round-trip and only happens while something (e.g. a
-        # message window) actually asked to be notified of movement.
+        # single round-trip, and keep ticking at least every
+        # MOUSE_POLL_INTERVAL_MS only while something (e.g. a message
+        # window) actually asked to be notified of movement.
         pointer = utils.get_display().screen().root.query_pointer()
         pos = (pointer.root_x, pointer.root_y)
         buttonMask = pointer.mask & (X.Button1Mask | X.Button2Mask |
@@ -520,10 +750,29 @@ class InputManager(object):
         if self.__lastMousePos is not None and pos != self.__lastMousePos:
             self.onMouseMove(*pos)
         self.__lastMousePos = pos
-        if buttonMask and not self.__lastMouseButtons:
+        if (buttonMask or pressed) and not self.__lastMouseButtons:
             self.onSomeMouseButton()
         self.__lastMouseButtons = buttonMask
 
+    def _dispatchPointerEvent(self):
+        """Delivers pointer listener activity on the GTK main thread."""
+        try:
+            if self.__pointerListener is not None:
+                pressed = self.__pointerListener.popActivity()
+                if self.__mouseEventsEnabled:
+                    self.__pollMouse(pressed)
+        except Exception:
+            logging.error("Exception in mouse event handler:\n%s"
+                          % traceback.format_exc())
+        return GLib.SOURCE_REMOVE
+
+    def _onPointerListenerFailed(self):
+        """Falls back to polling the pointer."""
+        self.__pointerListener = None
+        if not self.__inTimer:
+            self.__armTimer()
+        return GLib.SOURCE_REMOVE
+
     def _dispatchKeyEvent(self, info):
         """Delivers a key listener event on the GTK main thread."""
         try:
@@ -559,6 +808,13 @@ class InputManager(object):
             # against stale state and firing a spurious dismissal.
             self.__lastMousePos = None
             self.__lastMouseButtons = 0
+        if self.__pointerListener is not None:
+            self.__pointerListener.setEnabled(isEnabled)
+            if isEnabled:
+                # No event tells where the pointer starts from.
+                self.__pollMouse()
+        if not self.__inTimer:
+            self.__armTimer()
 
     def getQuasimodeKeycode(self, quasimodeKeycode):
         return self.__qmKeycodes[quasimodeKeycode]
@@ -48,6 +48,26 @@
 
     Plugins are loaded in the order specified by enso.config.PLUGINS.
 
+    A plugin may also have a manifest in enso.config.PLUGIN_MANIFESTS,
+    declaring what it provides without importing it:
+
+      "commands"  -- a dictionary mapping the plugin's command
+                     expressions to their descriptions; if it is
+                     omitted, the dictionary assigned to COMMANDS at
+                     the top level of the plugin module is used.  It
+                     is read from the module's source without
+                     importing the module, so it must be a plain
+                     literal;
+      "events"    -- a list of event names the plugin responds to;
+      "enabledBy" -- the name of an enso.config setting; if it is
+                     false, the plugin isn't loaded at all.
+
+    Such a plugin isn't imported at startup.  Stand-ins for its
+    commands are registered instead, and it is imported and its load()
+    called the first time one of them is run or one of its events
+    occurs.  A command that takes an argument is suggested like an
+    ArbitraryPostfixFactory command until then.
+
     There is currently no mechanism to unload a plugin, because
     plugins are assumed to have the same lifespan as Enso itself.  If
     a plugin needs to perform any cleanup, it should register a
@@ -58,9 +78,16 @@
 # Imports
 # ----------------------------------------------------------------------------
 
+import ast
+import importlib.util
 import logging
+import re
 
 from . import config
+from .commands import CommandManager, CommandObject
+from .commands.factories import ArbitraryPostfixFactory
+from .commands.interfaces import CommandExpression
+from .utils import startupprofile
 
 
 # ----------------------------------------------------------------------------
@@ -87,16 +114,189 @@ def _init():
     """
 
     for moduleName in config.PLUGINS:
-        try:
-            # Import the module; most of this code was taken from the
-            # Python Library Reference documentation for __import__().
-            module = __import__( moduleName, {}, {}, [] )
-            components = moduleName.split( "." )
-            for component in components[1:]:
-                module = getattr( module, component )
-
-            module.load()
-        except:
-            logging.warn( "Error while loading plugin '%s'." % moduleName )
-            raise
-        logging.info( "Loaded plugin '%s'." % moduleName )
+        manifest = config.PLUGIN_MANIFESTS.get( moduleName )
+        with startupprofile.span( "plugin", moduleName ):
+            if manifest is None:
+                _loadPlugin( moduleName )
+            else:
+                _LazyPlugin( moduleName, manifest ).install()
+
+
+def _loadPlugin( moduleName ):
+    """
+    Imports the plugin with the given name and calls its load()
+    function.
+    """
+
+    try:
+        # Import the module; most of this code was taken from the
+        # Python Library Reference documentation for __import__().
+        module = __import__( moduleName, {}, {}, [] )
+        components = moduleName.split( "." )
+        for component in components[1:]:
+            module = getattr( module, component )
+
+        module.load()
+    except:
+        logging.warn( "Error while loading plugin '%s'." % moduleName )
+        raise
+    logging.info( "Loaded plugin '%s'." % moduleName )
+
+
+# Matches the start of a top-level assignment to COMMANDS.
+_COMMANDS_ASSIGNMENT = re.compile( r"^COMMANDS\s*=", re.MULTILINE )
+
+
+def _readCommands( moduleName ):
+    """
+    Returns the COMMANDS dictionary of the plugin with the given name,
+    read from its source without importing it, or an empty dictionary
+    if it has none.
+
+      >>> _readCommands( "enso.contrib.evaluate" )
+      {'evaluate': 'Evaluates the current selection as Python code.'}
+    """
+
+    spec = importlib.util.find_spec( moduleName )
+    if spec is None or not spec.has_location:
+        return {}
+    with open( spec.origin, "r", encoding = "utf-8" ) as source:
+        text = source.read()
+
+    # Parsing just the assignment, which ends at the first blank line
+    # after it, is much quicker than parsing the whole module.
+    match = _COMMANDS_ASSIGNMENT.search( text )
+    if match == None:
+        return {}
+    end = text.find( "\n\n", match.start() )
+    try:
+        tree = ast.parse( text[match.start():end if end >= 0 else None] )
+    except SyntaxError:
+        tree = ast.parse( text, spec.origin )
+
+    for node in tree.body:
+        if isinstance( node, ast.Assign ) \
+               and [ getattr( t, "id", None ) for t in node.targets ] \
+                   == [ "COMMANDS" ]:
+            return ast.literal_eval( node.value )
+    return {}
+
+
+# ----------------------------------------------------------------------------
+# Lazily loaded plugins
+# ----------------------------------------------------------------------------
+
+class _LazyPlugin:
+    """
+    Stands in for a plugin with a manifest until it is first used.
+    """
+
+    def __init__( self, moduleName, manifest ):
+        self.__moduleName = moduleName
+        self.__commands = manifest.get( "commands" )
+        self.__events = manifest.get( "events", [] )
+        self.__enabledBy = manifest.get( "enabledBy" )
+        self.__isLoaded = False
+
+    def install( self ):
+        """
+        Registers the stand-ins for the plugin's commands and events.
+        """
+
+        if self.__enabledBy and not getattr( config, self.__enabledBy, False ):
+            logging.info( "Not loading plugin '%s': %s is off."
+                          % ( self.__moduleName, self.__enabledBy ) )
+            return
+
+        if self.__commands is None:
+            self.__commands = _readCommands( self.__moduleName )
+
+        if not ( self.__commands or self.__events ):
+            # Nothing to wait for.
+            self.load()
+            return
+
+        cmdMan = CommandManager.get()
+        for cmdName, description in self.__commands.items():
+            if CommandExpression( cmdName ).hasArgument():
+                cmdObj = _LazyCommandFactory( self, cmdName, description )
+            else:
+                cmdObj = _LazyCommand( self, cmdName, description )
+            cmdMan.registerCommand( cmdName, cmdObj )
+
+        from .events import EventManager
+        eventManager = EventManager.get()
+        for eventName in self.__events:
+            eventManager.registerResponder( self.__makeResponder(),
+                                            eventName )
+
+        logging.info( "Deferred loading plugin '%s'." % self.__moduleName )
+
+    def __makeResponder( self ):
+        # The responder stays registered, doing nothing once the
+        # plugin is loaded: removing it while the event manager is
+        # iterating over its responders would skip the next one.  The
+        # plugin's own responders are appended to that same list, so
+        # they still see the event that triggered the load.
+        def onEvent( *args, **kwargs ):
+            self.load()
+        return onEvent
+
+    def load( self ):
+        """
+        Replaces the stand-ins with the real plugin.
+        """
+
+        if self.__isLoaded:
+            return
+        self.__isLoaded = True
+
+        cmdMan = CommandManager.get()
+        for cmdName in self.__commands:
+            cmdMan.unregisterCommand( cmdName )
+        _loadPlugin( self.__moduleName )
+
+
+class _LazyCommand( CommandObject ):
+    """
+    Stand-in for a command of a lazily loaded plugin; running it loads
+    the plugin and runs the real command.
+    """
+
+    def __init__( self, plugin, cmdName, description ):
+        CommandObject.__init__( self )
+        self.__plugin = plugin
+        self.__cmdName = cmdName
+        self.setName( cmdName )
+        self.setDescription( description )
+
+    def run( self ):
+        self.__plugin.load()
+        cmd = CommandManager.get().getCommand( self.__cmdName )
+        if cmd is None or isinstance( cmd, _LazyCommand ):
+            logging.error( "Plugin did not register command '%s'."
+                           % self.__cmdName )
+            return
+        cmd.run()
+
+
+class _LazyCommandFactory( ArbitraryPostfixFactory ):
+    """
+    Stand-in for a command with an argument of a lazily loaded plugin.
+    """
+
+    def __init__( self, plugin, cmdName, description ):
+        cmdExpr = CommandExpression( cmdName )
+        self.PREFIX = cmdExpr.getPrefix()
+        self.HELP_TEXT = cmdExpr.getArg()
+        self.NAME = cmdName
+        ArbitraryPostfixFactory.__init__( self )
+        self.__plugin = plugin
+        self.setDescription( description )
+
+    def getCommandObj( self, commandName ):
+        if not ( commandName.startswith( self.PREFIX ) or
+                 self.PREFIX.startswith( commandName ) ):
+            return None
+        return _LazyCommand( self.__plugin, commandName,
+                             self.getDescription() )
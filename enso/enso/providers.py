@@ -52,12 +52,14 @@
     Whenever an interface implementation is requested through this
     module's getInterface() function, each provider is consulted in
     the order listed in enso.config.PROVIDERS until an implementation
-    is found.  In this way, it's possible for providers to be
-    "layered" (in a variation of the Chain of Responsibility pattern)
-    so that Enso attempts to load the most functional and
-    feature-loaded implementation first, and if that fails, Enso's
-    functionality is able to "gracefully degrade" until a working
-    implementation of an interface is found.
+    is found.  A provider is only imported when it is first consulted,
+    so providers after the one that implements every interface Enso
+    asks for are never imported at all.  In this way, it's possible
+    for providers to be "layered" (in a variation of the Chain of
+    Responsibility pattern) so that Enso attempts to load the most
+    functional and feature-loaded implementation first, and if that
+    fails, Enso's functionality is able to "gracefully degrade" until
+    a working implementation of an interface is found.
 
     For instance, take the hypothetical example of an interface called
     "dictionary", which has a single function, lookupWord(), that
@@ -81,6 +83,7 @@
 import logging
 
 import enso.config
+from enso.utils import startupprofile
 
 
 # ----------------------------------------------------------------------------
@@ -90,22 +93,26 @@ import enso.config
 # Dictionary mapping interface names to their implementations.
 _interfaces = {}
 
-# List of all provider objects.
+# List of all provider objects imported so far.
 _providers = []
 
+# Names in enso.config.PROVIDERS that have not been imported yet, or
+# None before the first call to getInterface().
+_pendingProviders = None
+
 
 # ----------------------------------------------------------------------------
 # Private functions
 # ----------------------------------------------------------------------------
 
-def _initDefaultProviders():
+def _importProvider( moduleName ):
     """
-    Resolves all provider names in enso.config.PROVIDERS to actual
-    Python objects.
+    Resolves the given provider name to an actual Python object and
+    adds it to the provider list, unless it is unavailable.
     """
 
-    for moduleName in enso.config.PROVIDERS:
-        try:
+    try:
+        with startupprofile.span( "provider", moduleName ):
             # Import the module; most of this code was taken from the
             # Python Library Reference documentation for __import__().
             module = __import__( moduleName, {}, {}, [] )
@@ -113,10 +120,34 @@ def _initDefaultProviders():
             for component in components[1:]:
                 module = getattr( module, component )
 
-            _providers.append( module )
-            logging.info( "Added provider %s." % moduleName )
-        except ProviderUnavailableError:
-            logging.info( "Skipping provider %s." % moduleName )
+        _providers.append( module )
+        logging.info( "Added provider %s." % moduleName )
+    except ProviderUnavailableError:
+        logging.info( "Skipping provider %s." % moduleName )
+
+
+def _iterProviders():
+    """
+    Yields the providers in enso.config.PROVIDERS order, importing
+    each one only once all those before it have been consulted.
+    """
+
+    global _pendingProviders
+
+    if _pendingProviders is None:
+        _pendingProviders = list( enso.config.PROVIDERS )
+
+    index = 0
+    while True:
+        if index < len( _providers ):
+            yield _providers[index]
+            index += 1
+        elif _pendingProviders:
+            # Taken off the list before importing, in case the
+            # provider asks for an interface while it is imported.
+            _importProvider( _pendingProviders.pop( 0 ) )
+        else:
+            return
 
 
 # ----------------------------------------------------------------------------
@@ -130,16 +161,15 @@ def getInterface( name ):
     given interface, this function raises a ProviderNotFoundError.
     """
 
-    if not _providers:
-        _initDefaultProviders()
     if name not in _interfaces:
-        for provider in _providers:
-            interface = provider.provideInterface( name )
-            if interface:
-                logging.info( "Obtained interface '%s' from provider '%s'."
-                              % (name, provider.__name__) )
-                _interfaces[name] = interface
-                break
+        with startupprofile.span( "interface", name ):
+            for provider in _iterProviders():
+                interface = provider.provideInterface( name )
+                if interface:
+                    logging.info( "Obtained interface '%s' from provider "
+                                  "'%s'." % (name, provider.__name__) )
+                    _interfaces[name] = interface
+                    break
     if name in _interfaces:
         return _interfaces[name]
     else:
@@ -40,9 +40,13 @@
 # Imports
 # ----------------------------------------------------------------------------
 
+import copy
+
 from enso import config
 from enso import graphics
+from enso.graphics import textlayout
 from enso.graphics import xmltextlayout
+from enso.utils.lru import LruCache
 from enso.utils.xml_tools import escape_xml
 
 
@@ -117,6 +121,10 @@ def setColorTheme(color = None):
     DESCRIPTION_BACKGROUND_COLOR = DESIGNER_GREEN + "cc"
     MAIN_BACKGROUND_COLOR = BLACK + "d8"
 
+    # Layouts and line surfaces in the old colors won't be used again.
+    _layoutCache.clear()
+    textlayout.clearLineSurfaces()
+
 
 def _newLineStyleRegistry():
     """
@@ -160,6 +168,11 @@ XML_ALIASES.add( "ins", baseElement = "inline" )
 XML_ALIASES.add( "alt", baseElement = "inline" )
 XML_ALIASES.add( "help", baseElement = "inline" )
 
+# Maximum number of laid-out lines kept by layoutXmlLine().
+LAYOUT_CACHE_SIZE = 128
+
+_layoutCache = LruCache( LAYOUT_CACHE_SIZE )
+
 def _updateStyleSizes( styles, size ):
     """
     Updates all size-related style elements to those suggested
@@ -246,19 +259,44 @@ def layoutXmlLine( xml_data, styles, scale ):
     size allowed by scale (a list of font sizes).  If the text will
     not fit even at the smallest size of scale, then ellipsifies
     the text at that size.
+
+    Layouts are cached by the markup, the style theme and the scale,
+    so laying out an unchanged line again is cheap.
     """
-    
-    document = None
-    for size in reversed( scale ):
+
+    # Normalize the size-dependent styles so that the signature only
+    # reflects the theme (colors, fonts, desktop width).
+    _updateStyles( styles, scale, scale[-1] )
+    key = ( xml_data, styles.getSignature(), tuple( scale ) )
+
+    document = _layoutCache.get( key )
+    if document is None:
+        document = _layoutXmlLine( xml_data, styles, scale )
+        _layoutCache.put( key, document )
+
+    # The caller decorates the document with per-layout attributes
+    # (background, rag width, rounded corners), so hand out a copy;
+    # the laid-out blocks themselves are never modified.
+    return copy.copy( document )
+
+
+def _layoutXmlLine( xml_data, styles, scale ):
+    """
+    Uncached implementation of layoutXmlLine().
+
+    The markup is parsed only once.  The largest size is tried
+    first, since most lines fit at it; otherwise, the largest
+    fitting size is found with a binary search over the scale, on
+    the assumption that text which fits at some size also fits at
+    any smaller one.
+    """
+
+    markup = xmltextlayout.ParsedXmlMarkup( xml_data )
+
+    def _tryLayout( size ):
+        _updateStyles( styles, scale, size )
         try:
-            _updateStyles( styles, scale, size )
-            document = xmltextlayout.xmlMarkupToDocument(
-                xml_data,
-                styles,
-                XML_ALIASES,
-                )
-            usedSize = size
-            break
+            return markup.toDocument( styles, XML_ALIASES )
         except Exception:
             # NOTE: If the error is fundamental (not size-related),
             # then it will be raised again below
@@ -267,18 +305,33 @@ def layoutXmlLine( xml_data, styles, scale ):
             # "non-fundamental" and catch those instead of using
             # a blanket catch like this.
 
-            pass
+            return None
+
+    # The smallest size always ellipsifies, so it is only tried
+    # when no larger size fits.
+    document = None
+    low = 1
+    high = len( scale ) - 1
+    middle = high
+    while low <= high:
+        attempt = _tryLayout( scale[middle] )
+        if attempt == None:
+            high = middle - 1
+        else:
+            document = attempt
+            usedSize = scale[middle]
+            low = middle + 1
+        middle = ( low + high ) // 2
 
     if document == None:
         # no size above worked; use the smallest size
         _updateStyles( styles, scale, scale[0] )
-        document = xmltextlayout.xmlMarkupToDocument(
-            xml_data,
-            styles,
-            XML_ALIASES,
-            )
+        document = markup.toDocument( styles, XML_ALIASES )
         usedSize = scale[0]
+    else:
+        _updateStyles( styles, scale, usedSize )
     document.shrinkOffset = scale[-1] - usedSize
+    document.cacheKey = ( xml_data, styles.getSignature(), usedSize )
     return document
 
 
@@ -75,6 +75,14 @@ class TextWindow:
         xPos, yPos = position
         self.__window = TransparentWindow(xPos + left, yPos + top, width, height )
         self.__context = self.__window.makeCairoContext()
+
+        # The draw state (see _getDrawState()) of the document the
+        # window currently displays, or None if it is unknown.
+        self.__drawnState = None
+
+        # Whether the window has been cleared by hide() and nothing
+        # has been drawn since.
+        self.__isHidden = False
         
 
     def getHeight( self ):
@@ -85,14 +93,28 @@ class TextWindow:
         return self.__window.getHeight()
 
 
+    def isDrawn( self, document ):
+        """
+        Returns whether the window already displays exactly what
+        drawing the given document would display.
+        """
+
+        state = _getDrawState( document )
+        return state is not None and state == self.__drawnState
+
+
     def draw( self, document ):
         """
         Draws the text described by document.
 
         An updating call; at the end of this method, the displayed
-        window should reflect the drawn content.
+        window should reflect the drawn content.  If the window
+        already displays the document, nothing is redrawn.
         """
 
+        if self.isDrawn( document ):
+            return
+
         width = document.ragWidth + layout.L_MARGIN + layout.R_MARGIN
         height = self.__window.getMaxHeight()
         cr = self.__context
@@ -137,12 +159,18 @@ class TextWindow:
         self.__window.setSize( width, height )
         self.__window.update()
 
+        self.__drawnState = _getDrawState( document )
+        self.__isHidden = False
+
 
     def hide( self ):
         """
         Clears the window's surface (making it disappear).
         """
 
+        if self.__isHidden:
+            return
+
         # LONGTERM TODO: Clearing the surface, i.e., painting it
         # clear, seems like a potential performance bottleneck.
 
@@ -158,3 +186,25 @@ class TextWindow:
         self.__context.set_operator (cairo.OPERATOR_OVER)
 
         self.__window.update()
+
+        self.__drawnState = None
+        self.__isHidden = True
+
+
+def _getDrawState( document ):
+    """
+    Returns a hashable summary of everything that determines how the
+    given laid-out document is drawn in a TextWindow, or None if the
+    document's content can't be identified (i.e., it has no cache
+    key), in which case it must always be drawn.
+    """
+
+    if document.cacheKey is None:
+        return None
+
+    return ( document.cacheKey,
+             document.shrinkOffset,
+             document.ragWidth,
+             document.roundUpperRight,
+             document.roundLowerRight,
+             document.background )
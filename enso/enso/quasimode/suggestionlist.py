@@ -43,9 +43,19 @@
 
 from enso import commands
 from enso.commands.suggestions import AutoCompletion
+from enso.commands.suggestions import findNearestSuggestions
 from enso import config
 
 
+# ----------------------------------------------------------------------------
+# Constants
+# ----------------------------------------------------------------------------
+
+# The number of earlier suggestion results kept around, so that
+# backspacing over the user text does not require a full query.
+MAX_REFINEMENT_STATES = 32
+
+
 # ----------------------------------------------------------------------------
 # The SuggestionList Singleton
 # ----------------------------------------------------------------------------
@@ -108,6 +118,12 @@ class TheSuggestionList:
         # auto-completion attributes above need to be updated.
         self.__suggestionsDirty = False
 
+        # A stack of the CandidateResults retrieved for successively
+        # longer user texts, each one a prefix of the next; the
+        # results for new user text are refined from the deepest
+        # entry that is a prefix of it.
+        self.__resultsStack = []
+
 
     def getUserText( self ):
         return self.__userText
@@ -220,39 +236,19 @@ class TheSuggestionList:
         if len( userText ) < config.QUASIMODE_MIN_AUTOCOMPLETE_CHARS:
             return [ self.__autoCompletion ]
 
-        suggestions = self.__cmdManager.retrieveSuggestions( userText )
-
-        # BEGIN: Performance-improving code.
-        # Eliminate most of the suggestions before sorting them.
-        threshold = 0.0
-        restrictedSuggestions = suggestions[:]
-        oldRestrictedSuggestions = restrictedSuggestions
-
-        # LONGTERM TODO: You may be able to optimize the algorithm
-        # even further in the following way: assuming that thresh(x)
-        # gives you the number of suggestions whose nearness is
-        # greater than x, first see if thresh( 0.5 ) >
-        # QUASIMODE_MAX_SUGGESTIONS; if so, see if thresh( 0.75 ) is,
-        # but if not, see if thresh( 0.25 ) is, and so forth.
-        while (len( restrictedSuggestions ) > 
-               config.QUASIMODE_MAX_SUGGESTIONS):
-            threshold += 0.05
-            oldRestrictedSuggestions = restrictedSuggestions
-            restrictedSuggestions = [ \
-                s for s in oldRestrictedSuggestions \
-                if s._nearness > threshold \
-                ]
-
-        # Use the second-to-last restricted suggestions, as
-        # the last restricted suggestions may actually have
-        # fewer than we want.
-        suggestions = oldRestrictedSuggestions
-        # END: Performance-improving code.
-        
-        # Because the Suggestion object implements __cmp__ to sort
+        candidates = self.__retrieveCandidates( userText )
+
+        # Only the candidates that are shown are made into
+        # Suggestion objects.
+        suggestions = findNearestSuggestions(
+            userText,
+            candidates,
+            config.QUASIMODE_MAX_SUGGESTIONS
+            )
+
+        # Because the Suggestion object implements __lt__ to sort
         # by nearness, we can simply sort the suggestions in place.
         suggestions.sort()
-        suggestions = suggestions[:config.QUASIMODE_MAX_SUGGESTIONS]
         
         # Make the auto-completion the 0th suggestion, and not listed
         # more than once.
@@ -263,6 +259,36 @@ class TheSuggestionList:
         return [ auto ] + suggestions
 
 
+    def __retrieveCandidates( self, userText ):
+        """
+        Returns an unsorted list of the ( suggested text, help text )
+        candidates for userText.
+
+        Typing usually extends the previous user text, which can only
+        narrow down its matches, so the previous results are refined
+        instead of querying every command from scratch.  Backspacing
+        returns to the results kept for the shorter text.
+        """
+
+        stack = self.__resultsStack
+        while len( stack ) > 0 \
+                  and not userText.startswith( stack[-1].getUserText() ):
+            stack.pop()
+
+        previous = None
+        if len( stack ) > 0:
+            previous = stack[-1]
+            if previous.getUserText() == userText:
+                stack.pop()
+
+        results = self.__cmdManager.retrieveCandidates( userText, previous )
+        stack.append( results )
+        if len( stack ) > MAX_REFINEMENT_STATES:
+            del stack[0]
+
+        return results.getCandidates()
+
+
     def __markDirty( self ):
         """
         Sets an internal variable telling the class that the suggestion list
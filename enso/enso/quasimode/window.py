@@ -53,7 +53,8 @@
     Each line of text is drawn by a separate "window", meaning that
     there are actual separate transparent windows for each of them.
     This allows a performance tweak: only those windows that have text
-    in them are actually drawn.
+    in them are actually drawn.  Furthermore, a window whose line is
+    unchanged since it was last drawn isn't redrawn at all.
 """
 
 # ----------------------------------------------------------------------------
@@ -237,9 +238,12 @@ def _makeSuggestionIterator( lines, suggestionWindows ):
     Returns a generator that provides _SuggestionDrawer objects for
     each suggestion in the given suggestion lines, allowing each
     suggestion line to be drawn to a respective suggestion window at a
-    later time.
+    later time.  Lines that their windows already display are
+    skipped.
     """
 
     for i in range( len(lines) ):
+        if suggestionWindows[i].isDrawn( lines[i] ):
+            continue
         yield _SuggestionDrawer( lines[i],
                                  suggestionWindows[i] )
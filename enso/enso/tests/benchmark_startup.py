@@ -0,0 +1,205 @@
+#!/usr/bin/env python3
+
+# Standalone startup benchmark (no GUI needed).
+#
+# Boots Enso's event manager, plugins and command scripts headless,
+# against a stub provider that stands in for the platform's input,
+# selection and scripts folder, with a generated tree of command
+# files.  Each boot runs in a fresh interpreter with
+# enso.utils.startupprofile enabled: first with an empty code cache
+# ("cold"), then with the cache the first boot filled ("warm").  The
+# per-phase breakdown is printed, and the exit status is 1 if the warm
+# boot exceeds the budget, so CI can run it as is, e.g.
+# "benchmark_startup.py --budget 0.5 --commands 500".  With --eager,
+# plugins that have a manifest are imported at startup too, as they
+# were before lazy loading.
+
+import json
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import types
+
+from optparse import OptionParser, SUPPRESS_HELP
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__),
+                                                os.path.pardir,
+                                                os.path.pardir)))
+
+from enso import config
+
+# Plugins that don't need graphics; scriptotron loads the command files.
+PLUGINS = ["enso.contrib.scriptotron",
+           "enso.contrib.google",
+           "enso.contrib.evaluate"]
+BUDGET_SECONDS = 1.0
+COMMAND_FILES = 200
+COMMANDS_PER_FILE = 5
+
+COMMAND_TEMPLATE = '''
+import os
+
+def cmd_bench_%(file)d_%(index)d(ensoapi, arg=None):
+    """Benchmark command %(index)d of file %(file)d."""
+    return os.path.join("%(file)d", str(arg))
+
+cmd_bench_%(file)d_%(index)d.valid_args = ["one", "two", "three"]
+'''
+
+
+# ----------------------------------------------------------------------------
+# Stub provider
+# ----------------------------------------------------------------------------
+
+class StubInputManager:
+    """Runs no event loop: run() just fires the init event."""
+
+    def __init__(self):
+        pass
+
+    def run(self):
+        self.onInit()
+
+    def stop(self):
+        pass
+
+    def enableMouseEvents(self, isEnabled):
+        pass
+
+    def onInit(self):
+        pass
+
+
+_stubInput = types.ModuleType("stub_input")
+_stubInput.InputManager = StubInputManager
+
+_stubSelection = types.ModuleType("stub_selection")
+_stubSelection.get = lambda: {}
+_stubSelection.set = lambda seldict: True
+
+
+def provideInterface(name):
+    if name == "input":
+        return _stubInput
+    elif name == "selection":
+        return _stubSelection
+    elif name == "scripts_folder":
+        return lambda: os.path.join(config.ENSO_USER_DIR, "scripts")
+    return None
+
+
+# ----------------------------------------------------------------------------
+# Benchmark
+# ----------------------------------------------------------------------------
+
+def make_user_dir(userDir, fileCount):
+    for folder in ("scripts", "commands"):
+        os.makedirs(os.path.join(userDir, folder))
+    for i in range(fileCount):
+        with open(os.path.join(userDir, "commands", "bench%d.py" % i),
+                  "w") as commandFile:
+            for j in range(COMMANDS_PER_FILE):
+                commandFile.write(COMMAND_TEMPLATE % {"file": i, "index": j})
+
+
+def boot(userDir, reportPath, eager):
+    """Boots Enso headless in this process and writes the profile."""
+    from enso.utils import startupprofile
+
+    startupprofile.enable(reportPath)
+
+    config.ENSO_USER_DIR = userDir
+    config.PROVIDERS = [__name__]
+    config.PLUGINS = PLUGINS
+    config.TRACK_COMMAND_CHANGES = False
+    if eager:
+        config.PLUGIN_MANIFESTS = {}
+
+    with startupprofile.span("phase", "core"):
+        from enso import plugins
+        from enso.events import EventManager
+
+    eventManager = EventManager.get()
+    eventManager.createEventType("startQuasimode")
+    eventManager.createEventType("endQuasimode")
+    plugins.install(eventManager)
+    eventManager.registerResponder(startupprofile.finish, "init")
+    eventManager.run()
+
+
+def run_boot(userDir, reportPath, eager):
+    args = [sys.executable, os.path.abspath(__file__),
+            "--boot", userDir, "--report", reportPath]
+    if eager:
+        args.append("--eager")
+    subprocess.check_call(args, stdout=subprocess.DEVNULL)
+    with open(reportPath) as reportFile:
+        return json.load(reportFile)
+
+
+def print_report(label, report):
+    print("%s: %.1f ms total, %.1f ms importing"
+          % (label, report["totalMs"], report["importMs"]))
+    for span in report["spans"]:
+        if span["kind"] == "import":
+            continue
+        print("  %-10s %-32s %9.1f ms %9.1f ms imports"
+              % (span["kind"], span["name"], span["wallMs"],
+                 span["importMs"]))
+        for child in span.get("children", []):
+            if child["kind"] in ("plugin", "provider", "interface"):
+                print("    %-8s %-32s %9.1f ms %9.1f ms imports"
+                      % (child["kind"], child["name"], child["wallMs"],
+                         child["importMs"]))
+
+
+def main():
+    parser = OptionParser(usage="%prog [options]")
+    parser.add_option("--budget", type="float", default=BUDGET_SECONDS,
+                      help="maximum warm startup time in seconds")
+    parser.add_option("--commands", type="int", default=COMMAND_FILES,
+                      help="number of generated command files")
+    parser.add_option("--boot", metavar="USER_DIR", default=None,
+                      help=SUPPRESS_HELP)
+    parser.add_option("--report", metavar="FILE", default=None,
+                      help="also keep the warm boot's profile in FILE")
+    parser.add_option("--eager", action="store_true", default=False,
+                      help="import plugins that have a manifest at startup")
+    opts, args = parser.parse_args()
+
+    if opts.boot:
+        boot(opts.boot, opts.report, opts.eager)
+        return 0
+
+    tempDir = tempfile.mkdtemp(prefix="enso-startup-")
+    try:
+        userDir = os.path.join(tempDir, "user")
+        make_user_dir(userDir, opts.commands)
+        cold = run_boot(userDir, os.path.join(tempDir, "cold.json"),
+                        opts.eager)
+        warm = run_boot(userDir, os.path.join(tempDir, "warm.json"),
+                        opts.eager)
+        if opts.report:
+            shutil.copyfile(os.path.join(tempDir, "warm.json"), opts.report)
+            shutil.copyfile(os.path.join(tempDir, "warm.json.folded"),
+                            opts.report + ".folded")
+    finally:
+        shutil.rmtree(tempDir, ignore_errors=True)
+
+    print("%d command files, %d commands" % (opts.commands,
+                                             opts.commands * COMMANDS_PER_FILE))
+    print_report("cold", cold)
+    print_report("warm", warm)
+
+    if warm["totalMs"] > opts.budget * 1000:
+        print("FAIL: warm startup took %.1f ms, over the %.1f ms budget"
+              % (warm["totalMs"], opts.budget * 1000))
+        return 1
+    print("OK: warm startup within the %.1f ms budget" % (opts.budget * 1000))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -17,15 +17,16 @@ from enso.messages import displayMessage
 from enso.events import EventManager
 from enso.contrib import retreat
 
-try:
-    from enso import webui
-except ImportError:
-    # Log it: this disables the Settings menu entry entirely, and a bare
-    # swallow makes that look like the entry was never added rather than a
-    # missing dependency somewhere in webui's import chain.
-    logging.warning("Settings menu unavailable; enso.webui failed to import.",
-                    exc_info=True)
-    webui = None
+webui = None
+if config.ENABLE_WEB_UI:
+    try:
+        from enso import webui
+    except ImportError:
+        # Log it: this disables the Settings menu entry entirely, and a bare
+        # swallow makes that look like the entry was never added rather than a
+        # missing dependency somewhere in webui's import chain.
+        logging.warning("Settings menu unavailable; enso.webui failed to import.",
+                        exc_info=True)
 
 
 def quit_enso():
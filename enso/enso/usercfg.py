@@ -1,5 +1,6 @@
-import os, configparser
+import os, configparser, tempfile, threading, atexit, logging
 from ast import literal_eval
+from contextlib import contextmanager
 
 # the following files also can redefine variables in config.py
 # ~/.ensorc file which is not available from WebUI (more secure option)
@@ -14,31 +15,155 @@ CONFIG_SECTION = "General"
 LIST_CONFIG_KEYS = ("DISABLED_COMMANDS", "VOICE_COMMANDS", "VOICE_ONLY_COMMANDS",
                     "VOICE_CONFIRM_COMMANDS")
 
+# seconds to wait for further changes before enso.cfg is written
+SAVE_DELAY = 1.0
+
+# the contents of enso.cfg as last read or written
+_parser = None
+# (mtime, size) of enso.cfg when _parser was last in sync with it
+_fileStamp = None
+# serialized values stored since the last flush, by key
+_journal = {}
+_batchDepth = 0
+_timer = None
+_lock = threading.RLock()
+
 
 def storeValue(key, value):
     """
     stores values in ~/.enso/enso.cfg file
-    """
-    parser = configparser.ConfigParser()
-    parser.optionxform = str
-
-    if os.path.exists(CONFIG_VARS["CONFIG_FILE"]):
-        parser.read(CONFIG_VARS["CONFIG_FILE"], encoding="utf-8")
-    else:
-        parser.add_section(CONFIG_SECTION)
 
+    the value is applied at once, but the file is only written after
+    SAVE_DELAY seconds without further changes (or at exit), so a burst
+    of changes costs a single write
+    """
     if key in LIST_CONFIG_KEYS:
-        parser[CONFIG_SECTION][key] = ",".join(value)
+        serialized = ",".join(value)
     else:
-        parser[CONFIG_SECTION][key] = str(value)
+        serialized = str(value)
 
         try:
             CONFIG_VARS[key] = literal_eval(value)
         except:
             CONFIG_VARS[key] = value
 
-    with open(CONFIG_VARS["CONFIG_FILE"], 'w', encoding="utf-8") as stream:
-        parser.write(stream)
+    with _lock:
+        _journal[key] = serialized
+        if not _batchDepth:
+            _scheduleFlush()
+
+
+def storeValues(values):
+    """
+    stores several key/value pairs at once
+    """
+    with batch():
+        for key, value in values.items():
+            storeValue(key, value)
+
+
+@contextmanager
+def batch():
+    """
+    defers writing enso.cfg until the outermost batch ends, e.g.:
+
+        with usercfg.batch():
+            storeValue("FOO", 1)
+            storeValue("BAR", 2)
+    """
+    global _batchDepth
+    with _lock:
+        _batchDepth += 1
+    try:
+        yield
+    finally:
+        with _lock:
+            _batchDepth -= 1
+            if not _batchDepth and _journal:
+                _scheduleFlush()
+
+
+def _scheduleFlush():
+    global _timer
+    if _timer is not None:
+        _timer.cancel()
+    _timer = threading.Timer(SAVE_DELAY, flush)
+    _timer.daemon = True
+    _timer.start()
+
+
+def flush():
+    """
+    writes the stored values to enso.cfg now, if there are any
+    """
+    global _timer
+    with _lock:
+        if _timer is not None:
+            _timer.cancel()
+            _timer = None
+        if not _journal:
+            return
+
+        configFile = CONFIG_VARS["CONFIG_FILE"]
+        # pick up edits made to the file by hand since it was last read
+        if _getFileStamp(configFile) != _fileStamp:
+            _readFile(configFile)
+
+        for key, serialized in _journal.items():
+            _parser[CONFIG_SECTION][key] = serialized
+
+        try:
+            _writeFile(configFile)
+        except OSError as e:
+            # keep the journal, so that the next change retries
+            logging.error("Could not save %s: %s" % (configFile, e))
+            return
+        _journal.clear()
+
+
+def _getFileStamp(path):
+    try:
+        stat = os.stat(path)
+    except OSError:
+        return None
+    return stat.st_mtime_ns, stat.st_size
+
+
+def _readFile(configFile):
+    global _parser, _fileStamp
+    _parser = configparser.ConfigParser()
+    _parser.optionxform = str
+
+    if os.path.exists(configFile):
+        _parser.read(configFile, encoding="utf-8")
+    if not _parser.has_section(CONFIG_SECTION):
+        _parser.add_section(CONFIG_SECTION)
+    _fileStamp = _getFileStamp(configFile)
+
+
+def _writeFile(configFile):
+    """
+    replaces enso.cfg atomically: readers see the old file or the new one,
+    never a half-written one
+    """
+    global _fileStamp
+    directory = os.path.dirname(configFile) or "."
+    os.makedirs(directory, exist_ok=True)
+
+    fd, tmp = tempfile.mkstemp(dir=directory, prefix=".enso-", suffix=".tmp")
+    try:
+        with os.fdopen(fd, "w", encoding="utf-8") as stream:
+            _parser.write(stream)
+            stream.flush()
+            os.fsync(stream.fileno())
+        os.replace(tmp, configFile)
+    except BaseException:
+        try:
+            os.unlink(tmp)
+        except OSError:
+            pass
+        raise
+    _fileStamp = _getFileStamp(configFile)
 
 
 def init(vars):
@@ -50,17 +175,17 @@ def init(vars):
 
     configFile = CONFIG_VARS["CONFIG_FILE"]
 
-    if os.path.exists(configFile):
-        parser = configparser.ConfigParser()
-        parser.optionxform = str
-        parser.read(configFile, encoding="utf-8")
+    with _lock:
+        _readFile(configFile)
 
-        for key in parser[CONFIG_SECTION].keys():
+        for key in _parser[CONFIG_SECTION].keys():
             if key in LIST_CONFIG_KEYS:
-                if parser[CONFIG_SECTION][key]:
-                    CONFIG_VARS[key] = parser[CONFIG_SECTION][key].split(",")
+                if _parser[CONFIG_SECTION][key]:
+                    CONFIG_VARS[key] = _parser[CONFIG_SECTION][key].split(",")
             else:
                 try:
-                    CONFIG_VARS[key] = literal_eval(parser[CONFIG_SECTION][key])
+                    CONFIG_VARS[key] = literal_eval(_parser[CONFIG_SECTION][key])
                 except:
-                    CONFIG_VARS[key] = parser[CONFIG_SECTION][key]
+                    CONFIG_VARS[key] = _parser[CONFIG_SECTION][key]
+
+    atexit.register(flush)
@@ -0,0 +1,106 @@
+# Copyright (c) 2008, Humanized, Inc.
+# All rights reserved.
+# 
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are met:
+#
+#    1. Redistributions of source code must retain the above copyright
+#       notice, this list of conditions and the following disclaimer.
+#
+#    2. Redistributions in binary form must reproduce the above copyright
+#       notice, this list of conditions and the following disclaimer in the
+#       documentation and/or other materials provided with the distribution.
+#
+#    3. Neither the name of Enso nor the names of its contributors may
+#       be used to endorse or promote products derived from this
+#       software without specific prior written permission.
+# 
+# THIS SOFTWARE IS PROVIDED BY Humanized, Inc. ``AS IS'' AND ANY
+# EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE IMPLIED
+# WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE ARE
+# DISCLAIMED. IN NO EVENT SHALL Humanized, Inc. BE LIABLE FOR ANY
+# DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES
+# (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES;
+# LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND
+# ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT
+# (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE OF THIS
+# SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+# ----------------------------------------------------------------------------
+#
+#   enso.utils.lru
+#
+# ----------------------------------------------------------------------------
+
+"""
+    A bounded, least-recently-used cache.
+"""
+
+# ----------------------------------------------------------------------------
+# Imports
+# ----------------------------------------------------------------------------
+
+from collections import OrderedDict
+
+
+# ----------------------------------------------------------------------------
+# LRU Cache
+# ----------------------------------------------------------------------------
+
+class LruCache:
+    """
+    Maps keys to values, holding at most a fixed number of entries;
+    when the cache is full, the least recently used entry is evicted.
+
+      >>> cache = LruCache( 2 )
+      >>> cache.put( 'a', 1 )
+      >>> cache.put( 'b', 2 )
+      >>> cache.get( 'a' )
+      1
+      >>> cache.put( 'c', 3 )
+      >>> cache.get( 'b' ) is None
+      True
+      >>> len( cache )
+      2
+    """
+
+    def __init__( self, maxSize ):
+        """
+        Creates an empty cache holding at most maxSize entries.
+        """
+
+        self.__maxSize = maxSize
+        self.__entries = OrderedDict()
+
+    def get( self, key, default = None ):
+        """
+        Returns the value stored under the given key, or default if
+        there is none.
+        """
+
+        try:
+            value = self.__entries[key]
+        except KeyError:
+            return default
+        self.__entries.move_to_end( key )
+        return value
+
+    def put( self, key, value ):
+        """
+        Stores the value under the given key, evicting the least
+        recently used entry if the cache is full.
+        """
+
+        self.__entries[key] = value
+        self.__entries.move_to_end( key )
+        while len( self.__entries ) > self.__maxSize:
+            self.__entries.popitem( last = False )
+
+    def clear( self ):
+        """
+        Removes all entries from the cache.
+        """
+
+        self.__entries.clear()
+
+    def __len__( self ):
+        return len( self.__entries )
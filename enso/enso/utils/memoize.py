@@ -41,9 +41,11 @@
 # ----------------------------------------------------------------------------
 
 import inspect
+import weakref
 from inspect import Signature, Parameter
 
 from enso.utils.decorators import finalizeWrapper
+from enso.utils.lru import LruCache
 
 
 # ----------------------------------------------------------------------------
@@ -52,16 +54,60 @@ from enso.utils.decorators import finalizeWrapper
 
 _memoizedFunctions = []
 
+# Marks a cache miss in a bounded cache, where None is a valid value.
+_MISSING = object()
+
 class _MemoizedFunction:
     """
-    Encapsulates all information about a function that is memoized.
+    Encapsulates all information about a function that is memoized:
+    its cache (or, for per-instance memoizing, the caches of its live
+    instances) and its hit, miss and eviction counters.
     """
     
-    def __init__( self, function ):
+    def __init__( self, function, maxSize = None, perInstance = False ):
         self.function = function
-        self.cache = {}
+        self.maxSize = maxSize
+        self.perInstance = perInstance
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        if perInstance:
+            self.cache = None
+            self.instanceCaches = weakref.WeakSet()
+        else:
+            self.cache = self.newCache()
         _memoizedFunctions.append( self )
 
+    def newCache( self ):
+        if self.maxSize is None:
+            return {}
+        return LruCache( self.maxSize )
+
+    def getCaches( self ):
+        if self.perInstance:
+            return [ c.entries for c in list( self.instanceCaches ) ]
+        return [ self.cache ]
+
+    def getNumValues( self ):
+        return sum( [ len( cache ) for cache in self.getCaches() ] )
+
+    def clear( self ):
+        for cache in self.getCaches():
+            cache.clear()
+
+
+class _InstanceCache:
+    """
+    One instance's cache for a per-instance memoized method.  It is
+    stored in the instance's __dict__, so the cached results die with
+    the instance instead of pinning it.
+    """
+
+    __slots__ = ( "entries", "__weakref__" )
+
+    def __init__( self, entries ):
+        self.entries = entries
+
 
 def _generateArgWrapper( function, wrappedFunction ):
     """
@@ -175,7 +221,7 @@ def _generateArgWrapper( function, wrappedFunction ):
     return argWrapperGenerator( wrappedFunction )
 
 
-def memoized( function ):
+def memoized( function = None, maxSize = None, perInstance = False ):
     """
     'Memoizes' the function, causing its results to be cached based on
     the called arguments.  When subsequent calls to function are made
@@ -233,47 +279,165 @@ def memoized( function ):
     (assuming that it should only be instantiated once) can be reused
     rather than re-instantiated (effectively providing the services of
     a flyweight pool).
-    """
-
-    mfWrap = _MemoizedFunction( function )
 
-    # For efficiency purposes, let's make it as easy to look up
-    # mfWrap.cache as possible.
-    cache = mfWrap.cache
+    By default the cache grows without bound.  Passing maxSize keeps
+    at most that many results, evicting the least recently used one
+    when the cache is full:
+
+      >>> @memoized( maxSize = 2 )
+      ... def square( x ):
+      ...   return x * x
+      >>> [ square( x ) for x in ( 1, 2, 1, 3 ) ]
+      [1, 4, 1, 9]
+      >>> stats = _getMemoizedFunction( square )
+      >>> stats.hits, stats.misses, stats.evictions, stats.getNumValues()
+      (1, 3, 1, 2)
+
+    Passing perInstance=True memoizes a method separately for each
+    instance, keying on the arguments after self.  The results are
+    stored on the instance, so a memoized method doesn't keep its
+    instances alive; maxSize then applies to each instance's cache.
+
+      >>> class Thing:
+      ...   @memoized( perInstance = True )
+      ...   def describe( self, detail ):
+      ...     return "thing %s" % detail
+      >>> thing = Thing()
+      >>> thing.describe( 1 )
+      'thing 1'
+      >>> _getMemoizedFunction( Thing.describe ).getNumValues()
+      1
+      >>> del thing
+      >>> _getMemoizedFunction( Thing.describe ).getNumValues()
+      0
 
-    def memoizedFunctionWrapper( *args ):
-        # We're using a try-except clause here instead of testing
-        # whether the dictionary has a key because we believe that it
-        # is more efficient; it's preferable to speed up the most
-        # common scenario where a cached value already exists by
-        # simply assuming that it *does* exist.
+    Results that depend on global state (the screen's DPI, the color
+    theme) can be dropped with clearMemoized() when that state
+    changes.
+    """
 
-        try:
-            return cache[args]
-        except KeyError:
-            cache[args] = function( *args )
-            return cache[args]
+    if function is None:
+        return lambda function: memoized( function, maxSize, perInstance )
+
+    mfWrap = _MemoizedFunction( function, maxSize, perInstance )
+
+    if maxSize is None:
+        def lookup( cache, key, args ):
+            # We're using a try-except clause here instead of testing
+            # whether the dictionary has a key because we believe that
+            # it is more efficient; it's preferable to speed up the
+            # most common scenario where a cached value already exists
+            # by simply assuming that it *does* exist.
+
+            try:
+                value = cache[key]
+            except KeyError:
+                mfWrap.misses += 1
+                value = cache[key] = function( *args )
+                return value
+            mfWrap.hits += 1
+            return value
+    else:
+        def lookup( cache, key, args ):
+            value = cache.get( key, _MISSING )
+            if value is _MISSING:
+                mfWrap.misses += 1
+                value = function( *args )
+                if len( cache ) >= maxSize:
+                    mfWrap.evictions += 1
+                cache.put( key, value )
+            else:
+                mfWrap.hits += 1
+            return value
+
+    if perInstance:
+        attrName = "_memoized_%s_%x" % ( function.__name__, id( mfWrap ) )
+
+        def memoizedFunctionWrapper( *args ):
+            instanceDict = args[0].__dict__
+            try:
+                cache = instanceDict[attrName].entries
+            except KeyError:
+                instanceCache = _InstanceCache( mfWrap.newCache() )
+                instanceDict[attrName] = instanceCache
+                mfWrap.instanceCaches.add( instanceCache )
+                cache = instanceCache.entries
+            return lookup( cache, args[1:], args )
+    else:
+        # For efficiency purposes, let's make it as easy to look up
+        # mfWrap.cache as possible.
+        cache = mfWrap.cache
+
+        def memoizedFunctionWrapper( *args ):
+            return lookup( cache, args, args )
     
     finalWrapper = _generateArgWrapper( function, memoizedFunctionWrapper )
+    finalWrapper = finalizeWrapper( function,
+                                    finalWrapper,
+                                    "Memoized" )
+    finalWrapper._memoizedFunction = mfWrap
+    return finalWrapper
+
 
-    return finalizeWrapper( function,
-                            finalWrapper,
-                            "Memoized" )
+def _getMemoizedFunction( function ):
+    """
+    Returns the _MemoizedFunction behind a memoized function, method
+    or class method.
+    """
+
+    function = getattr( function, "__func__", function )
+    try:
+        return function._memoizedFunction
+    except AttributeError:
+        raise TypeError( "%r is not memoized." % function )
+
+
+def clearMemoized( *functions ):
+    """
+    Drops the cached results of the given memoized functions, or of
+    every memoized function if none are given; e.g. after a theme or
+    DPI change makes them stale.
+    """
+
+    if functions:
+        mfWraps = [ _getMemoizedFunction( f ) for f in functions ]
+    else:
+        mfWraps = _memoizedFunctions
+
+    for mfWrap in mfWraps:
+        mfWrap.clear()
 
 
 def getMemoizeStats():
     """
-    Returns a string describing the memoize usage dictionary.
+    Returns a string describing the memoize usage dictionary, and the
+    cache hits, misses and evictions of each memoized function.
     """
 
     STAT_STRING = \
         "Number of functions which used memoizing:  %(numFuncs)s\n" \
-        "Number of unique function values recorded: %(numValues)s"
+        "Number of unique function values recorded: %(numValues)s\n" \
+        "Cache hits: %(hits)s, misses: %(misses)s, evictions: %(evictions)s"
+
+    FUNC_STAT_STRING = \
+        "  %(name)s: %(numValues)s values, %(hits)s hits, " \
+        "%(misses)s misses, %(evictions)s evictions"
+
+    funcInfos = [ dict( name = "%s.%s" % ( i.function.__module__,
+                                           i.function.__qualname__ ),
+                        numValues = i.getNumValues(),
+                        hits = i.hits,
+                        misses = i.misses,
+                        evictions = i.evictions )
+                  for i in _memoizedFunctions ]
 
     info = STAT_STRING % dict(
         numFuncs = len( _memoizedFunctions ),
-        numValues = sum( [ len(list(i.cache.keys())) \
-                           for i in _memoizedFunctions ] ),
+        numValues = sum( [ i["numValues"] for i in funcInfos ] ),
+        hits = sum( [ i["hits"] for i in funcInfos ] ),
+        misses = sum( [ i["misses"] for i in funcInfos ] ),
+        evictions = sum( [ i["evictions"] for i in funcInfos ] ),
         )
 
-    return info
+    lines = [ info ] + [ FUNC_STAT_STRING % i for i in funcInfos ]
+    return "\n".join( lines )
@@ -0,0 +1,185 @@
+# Copyright (c) 2008, Humanized, Inc.
+# All rights reserved.
+# 
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are met:
+#
+#    1. Redistributions of source code must retain the above copyright
+#       notice, this list of conditions and the following disclaimer.
+#
+#    2. Redistributions in binary form must reproduce the above copyright
+#       notice, this list of conditions and the following disclaimer in the
+#       documentation and/or other materials provided with the distribution.
+#
+#    3. Neither the name of Enso nor the names of its contributors may
+#       be used to endorse or promote products derived from this
+#       software without specific prior written permission.
+# 
+# THIS SOFTWARE IS PROVIDED BY Humanized, Inc. ``AS IS'' AND ANY
+# EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE IMPLIED
+# WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE ARE
+# DISCLAIMED. IN NO EVENT SHALL Humanized, Inc. BE LIABLE FOR ANY
+# DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES
+# (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES;
+# LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND
+# ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT
+# (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE OF THIS
+# SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+
+# ----------------------------------------------------------------------------
+#
+#   enso.utils.responderstats
+#
+# ----------------------------------------------------------------------------
+
+"""
+    Latency statistics for event responders.
+
+    The event manager calls every responder inline, so one slow
+    "timer" responder delays every other responder and the next tick.
+    When the event manager's statistics are enabled, each responder
+    call is timed and counted here, per event type and responder, in
+    a histogram of latency buckets.  Functions scheduled with
+    callLater() or callEvery() run inline too, and are counted under
+    the "scheduled" event type.  Calls that take longer than the
+    budget are counted, and reported in the log the first time a
+    responder goes over and again whenever its worst time doubles.
+"""
+
+# ----------------------------------------------------------------------------
+# Imports
+# ----------------------------------------------------------------------------
+
+import logging
+
+
+# ----------------------------------------------------------------------------
+# Constants
+# ----------------------------------------------------------------------------
+
+# Upper bounds, in milliseconds, of the histogram buckets; a final
+# bucket holds the calls slower than the last bound.
+BUCKET_BOUNDS_MS = ( 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 25, 50, 100, 250, 1000 )
+
+
+# ----------------------------------------------------------------------------
+# Responder Statistics
+# ----------------------------------------------------------------------------
+
+def _getResponderName( func ):
+    """
+    Returns a readable name for a responder function or method.
+    """
+
+    name = getattr( func, "__qualname__", None ) \
+           or getattr( func, "__name__", None )
+    if name is None:
+        return repr( func )
+    module = getattr( func, "__module__", None )
+    if module:
+        return "%s.%s" % ( module, name )
+    return name
+
+
+class _ResponderEntry:
+    """
+    The counters of one responder for one event type.
+    """
+
+    __slots__ = ( "calls", "totalMs", "maxMs", "overBudget", "buckets",
+                  "loggedMs" )
+
+    def __init__( self ):
+        self.calls = 0
+        self.totalMs = 0.0
+        self.maxMs = 0.0
+        self.overBudget = 0
+        self.buckets = [0] * ( len( BUCKET_BOUNDS_MS ) + 1 )
+        self.loggedMs = 0.0
+
+
+class ResponderStats:
+    """
+    Collects call counts and latency histograms of event responders.
+    Responders are keyed by name, so the statistics don't keep removed
+    responders (or the objects of bound methods) alive.
+    """
+
+    def __init__( self, budgetMs ):
+        self.budgetMs = budgetMs
+        self.__entries = {}
+
+    def record( self, eventType, func, seconds ):
+        """
+        Records one call of the given responder for eventType.
+        """
+
+        key = ( eventType, _getResponderName( func ) )
+        entry = self.__entries.get( key )
+        if entry is None:
+            entry = _ResponderEntry()
+            self.__entries[key] = entry
+
+        ms = seconds * 1000
+        entry.calls += 1
+        entry.totalMs += ms
+
+        bucket = 0
+        for bound in BUCKET_BOUNDS_MS:
+            if ms <= bound:
+                break
+            bucket += 1
+        entry.buckets[bucket] += 1
+
+        if ms > self.budgetMs:
+            entry.overBudget += 1
+            if ms > entry.loggedMs * 2:
+                entry.loggedMs = ms
+                logging.warning( "Responder %s took %.1f ms for a '%s' event "
+                                 "(budget %.1f ms)."
+                                 % ( key[1], ms, eventType, self.budgetMs ) )
+        if ms > entry.maxMs:
+            entry.maxMs = ms
+
+    def reset( self ):
+        """
+        Discards everything recorded so far.
+        """
+
+        self.__entries = {}
+
+    def getStats( self ):
+        """
+        Returns the statistics as a list of dictionaries, one per
+        event type and responder, the most total time first.
+        """
+
+        stats = []
+        for ( eventType, name ), entry in list( self.__entries.items() ):
+            stats.append( {
+                "eventType" : eventType,
+                "responder" : name,
+                "calls" : entry.calls,
+                "totalMs" : round( entry.totalMs, 3 ),
+                "meanMs" : round( entry.totalMs / entry.calls, 3 ),
+                "maxMs" : round( entry.maxMs, 3 ),
+                "overBudget" : entry.overBudget,
+                "histogram" : list( entry.buckets ),
+                } )
+        stats.sort( key = lambda s: s["totalMs"], reverse = True )
+        return stats
+
+    def getReport( self, limit = None ):
+        """
+        Returns the statistics as a human-readable string.
+        """
+
+        lines = [ "Responder latency (budget %.1f ms):" % self.budgetMs ]
+        stats = self.getStats()
+        if limit is not None:
+            stats = stats[:limit]
+        for s in stats:
+            lines.append( "  %(eventType)s %(responder)s: %(calls)d calls, "
+                          "%(meanMs).2f ms mean, %(maxMs).2f ms max, "
+                          "%(overBudget)d over budget" % s )
+        return "\n".join( lines )
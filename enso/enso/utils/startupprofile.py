@@ -0,0 +1,312 @@
+# Copyright (c) 2008, Humanized, Inc.
+# All rights reserved.
+# 
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are met:
+#
+#    1. Redistributions of source code must retain the above copyright
+#       notice, this list of conditions and the following disclaimer.
+#
+#    2. Redistributions in binary form must reproduce the above copyright
+#       notice, this list of conditions and the following disclaimer in the
+#       documentation and/or other materials provided with the distribution.
+#
+#    3. Neither the name of Enso nor the names of its contributors may
+#       be used to endorse or promote products derived from this
+#       software without specific prior written permission.
+# 
+# THIS SOFTWARE IS PROVIDED BY Humanized, Inc. ``AS IS'' AND ANY
+# EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE IMPLIED
+# WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE ARE
+# DISCLAIMED. IN NO EVENT SHALL Humanized, Inc. BE LIABLE FOR ANY
+# DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES
+# (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES;
+# LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND
+# ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT
+# (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE OF THIS
+# SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+
+# ----------------------------------------------------------------------------
+#
+#   enso.utils.startupprofile
+#
+# ----------------------------------------------------------------------------
+
+"""
+    Records where Enso's startup time goes.
+
+    When enabled (see run_enso.py's --profile-startup option), the
+    launcher phases, providers, plugins and command files are timed as
+    nested spans.  Every first-time import made on the profiling thread
+    becomes a span of its own, so like "python -X importtime" the
+    report shows which modules each phase pulled in and what they cost.
+
+    finish() writes the report as JSON, plus a ".folded" file of
+    collapsed stacks that flamegraph.pl and speedscope read directly.
+
+    When the profiler is disabled, span() and addSpan() do nothing.
+"""
+
+# ----------------------------------------------------------------------------
+# Imports
+# ----------------------------------------------------------------------------
+
+import builtins
+import contextlib
+import importlib.util
+import json
+import logging
+import sys
+import threading
+import time
+
+
+# ----------------------------------------------------------------------------
+# Private module variables
+# ----------------------------------------------------------------------------
+
+# The active profile, or None if profiling is disabled.
+_profile = None
+
+
+# ----------------------------------------------------------------------------
+# Spans
+# ----------------------------------------------------------------------------
+
+class _Span:
+    """
+    A timed, named piece of startup work and the spans nested in it.
+    """
+
+    def __init__( self, kind, name, start ):
+        self.kind = kind
+        self.name = name
+        self.start = start
+        self.duration = None
+        self.details = {}
+        self.children = []
+
+    def getImportTime( self ):
+        """
+        Returns the time spent in first-time imports within this
+        span, counting each outermost import once.
+        """
+
+        total = 0.0
+        for child in self.children:
+            if child.kind == "import":
+                total += child.duration
+            else:
+                total += child.getImportTime()
+        return total
+
+    def toDict( self, origin ):
+        result = {
+            "kind" : self.kind,
+            "name" : self.name,
+            "startMs" : round( ( self.start - origin ) * 1000, 3 ),
+            "wallMs" : round( self.duration * 1000, 3 ),
+            "importMs" : round( self.getImportTime() * 1000, 3 ),
+            }
+        result.update( self.details )
+        if self.children:
+            result["children"] = [ child.toDict( origin )
+                                   for child in self.children ]
+        return result
+
+    def iterFolded( self, prefix ):
+        """
+        Yields ( stack, microseconds of self time ) pairs.
+        """
+
+        stack = "%s%s:%s" % ( prefix, self.kind, self.name )
+        selfTime = self.duration - sum( child.duration
+                                        for child in self.children )
+        yield stack, max( int( selfTime * 1000000 ), 0 )
+        for child in self.children:
+            for item in child.iterFolded( stack + ";" ):
+                yield item
+
+    def iterSpans( self ):
+        yield self
+        for child in self.children:
+            for span in child.iterSpans():
+                yield span
+
+
+class _StartupProfile:
+    """
+    The spans recorded so far, and the import hook that records
+    imports as spans.
+    """
+
+    def __init__( self, reportPath ):
+        self.reportPath = reportPath
+        self.thread = threading.current_thread()
+        self.root = _Span( "enso", "startup", time.perf_counter() )
+        self.stack = [ self.root ]
+        self.__realImport = builtins.__import__
+        builtins.__import__ = self.__import
+
+    def uninstall( self ):
+        if builtins.__import__ == self.__import:
+            builtins.__import__ = self.__realImport
+
+    def __import( self, name, globals=None, locals=None, fromlist=(),
+                  level=0 ):
+        if threading.current_thread() is not self.thread:
+            return self.__realImport( name, globals, locals, fromlist, level )
+
+        fullName = name
+        if level:
+            try:
+                fullName = importlib.util.resolve_name(
+                    "." * level + name, ( globals or {} ).get( "__package__" )
+                    )
+            except ( ImportError, ValueError ):
+                pass
+        if fullName in sys.modules and not fromlist:
+            return self.__realImport( name, globals, locals, fromlist, level )
+
+        # A "from package import name" may or may not load a
+        # submodule; keep the span only if something was loaded, and
+        # name it after the submodules if the package was loaded
+        # already.
+        isLoaded = fullName in sys.modules
+        if isLoaded:
+            submodules = [ "%s.%s" % ( fullName, item )
+                           for item in fromlist if isinstance( item, str ) ]
+            submodules = [ m for m in submodules if m not in sys.modules ]
+        moduleCount = len( sys.modules )
+        parent = self.stack[-1]
+        with self.span( "import", fullName ) as span:
+            result = self.__realImport( name, globals, locals, fromlist,
+                                        level )
+        if len( sys.modules ) == moduleCount:
+            parent.children.remove( span )
+        elif isLoaded:
+            span.name = ", ".join( m for m in submodules
+                                   if m in sys.modules ) or fullName
+        return result
+
+    @contextlib.contextmanager
+    def span( self, kind, name ):
+        span = _Span( kind, name, time.perf_counter() )
+        self.stack[-1].children.append( span )
+        self.stack.append( span )
+        try:
+            yield span
+        finally:
+            span.duration = time.perf_counter() - span.start
+            self.stack.pop()
+
+    def addSpan( self, kind, name, seconds, details ):
+        now = time.perf_counter()
+        span = _Span( kind, name, now - seconds )
+        span.duration = seconds
+        span.details.update( details )
+        self.stack[-1].children.append( span )
+
+    def getReport( self ):
+        origin = self.root.start
+        imports = sorted( ( span for span in self.root.iterSpans()
+                            if span.kind == "import" ),
+                          key=lambda span: span.duration,
+                          reverse=True )
+        return {
+            "python" : sys.version.split()[0],
+            "platform" : sys.platform,
+            "totalMs" : round( self.root.duration * 1000, 3 ),
+            "importMs" : round( self.root.getImportTime() * 1000, 3 ),
+            "spans" : [ child.toDict( origin )
+                        for child in self.root.children ],
+            "slowestImports" : [ { "name" : span.name,
+                                   "wallMs" : round( span.duration * 1000,
+                                                     3 ) }
+                                 for span in imports[:25] ],
+            }
+
+    def writeReport( self, report ):
+        with open( self.reportPath, "w", encoding="utf-8" ) as reportFile:
+            json.dump( report, reportFile, indent=2 )
+        with open( self.reportPath + ".folded", "w",
+                   encoding="utf-8" ) as foldedFile:
+            for stack, micros in self.root.iterFolded( "" ):
+                if micros:
+                    foldedFile.write( "%s %d\n" % ( stack, micros ) )
+
+
+# ----------------------------------------------------------------------------
+# Public functions
+# ----------------------------------------------------------------------------
+
+def enable( reportPath=None ):
+    """
+    Starts profiling on the calling thread.  The report is written to
+    reportPath (if given) by finish().
+    """
+
+    global _profile
+
+    if _profile is None:
+        _profile = _StartupProfile( reportPath )
+
+
+def isEnabled():
+    return _profile is not None
+
+
+def span( kind, name ):
+    """
+    Returns a context manager that times the enclosed block as a span
+    of the given kind ("phase", "plugin", "provider", ...) and name.
+    Spans opened on other threads than the profiling one are ignored.
+    """
+
+    profile = _profile
+    if profile is None or threading.current_thread() is not profile.thread:
+        return contextlib.nullcontext()
+    return profile.span( kind, name )
+
+
+def addSpan( kind, name, seconds, **details ):
+    """
+    Records work measured elsewhere (e.g. on a loader thread) that
+    just finished and took the given number of seconds.  Any keyword
+    arguments are added to the span's entry in the report.
+    """
+
+    profile = _profile
+    if profile is None or threading.current_thread() is not profile.thread:
+        return
+    profile.addSpan( kind, name, seconds, details )
+
+
+def finish():
+    """
+    Stops profiling, writes the report and returns it as a dictionary;
+    returns None if profiling wasn't enabled.
+    """
+
+    global _profile
+
+    profile = _profile
+    if profile is None:
+        return None
+    _profile = None
+    profile.uninstall()
+
+    profile.root.duration = time.perf_counter() - profile.root.start
+    report = profile.getReport()
+    logging.info( "Startup took %.1f ms, %.1f ms of it importing." % (
+        report["totalMs"], report["importMs"] ) )
+
+    if profile.reportPath:
+        try:
+            profile.writeReport( report )
+            logging.info( "Wrote startup profile to '%s'."
+                          % profile.reportPath )
+        except OSError as e:
+            logging.error( "Could not write startup profile '%s': %s"
+                           % ( profile.reportPath, e ) )
+    return report
@@ -1,5 +1,5 @@
 import threading, uuid, platform, logging, os, random, string, re, hmac
-import shutil, tempfile
+import shutil, tempfile, json, gzip
 import enso.messages
 
 import enso
@@ -7,7 +7,11 @@ from enso import config
 from enso.contrib import retreat
 from enso.quasimode import layout
 from enso.commands.manager import CommandManager
+from enso.commands import state as commandstate
+from enso.commands.state import CommandStateStore
 from enso.contrib.scriptotron.tracker import ScriptTracker
+from enso.events import EventManager
+from enso.utils import responderstats
 
 from flask import Flask, request, send_from_directory, abort, jsonify, redirect
 from functools import wraps
@@ -39,6 +43,13 @@ LEGACY_PAGES = {
     "index.html": "/settings",
 }
 
+# Largest page served by /api/enso/get/commands/page.
+MAX_COMMANDS_PAGE = 1000
+
+# Appended to the catalog's entity tag for its gzipped body, since each
+# content coding of a resource needs an entity tag of its own.
+GZIP_ETAG_SUFFIX = "-gz"
+
 # Command category names become filenames. Allow word characters, spaces,
 # dots, and dashes -- but the pattern as a whole rejects "." and ".." and
 # anything containing a path separator.
@@ -259,42 +270,150 @@ def post_enso_set_ensorc():
     return ""
 
 
-@app.route('/api/enso/get/commands')
-@requires_auth
-def get_enso_get_commands():
-    cmdman = CommandManager.get()
-    commands = cmdman.getCommands()
-    output = []
+def _describe_command(name, command):
+    """The part of a command's catalog entry that does not depend on the
+    command state lists."""
+    category = "other"
+    if hasattr(command, "func") and hasattr(command.func, "category"):
+        category = command.func.category
 
-    for name, command in commands.items():
-        desc = command.getDescription()
-        helpText = command.getHelp()
+    file = ""
+    if hasattr(command, "func") and hasattr(command.func, "cmdFile"):
+        file = command.func.cmdFile
 
-        category = "other"
-        if hasattr(command, "func") and hasattr(command.func, "category"):
-            category = command.func.category
+    return {"name": name, "description": command.getDescription(),
+            "help": command.getHelp(), "category": category, "file": file}
 
-        file = ""
-        if hasattr(command, "func") and hasattr(command.func, "cmdFile"):
-            file = command.func.cmdFile
 
-        cmdJSON = {"name": name, "description": desc, "help": helpText,
-                   "category": category, "file": file}
+class _CommandCatalog:
+    """The JSON served by /api/enso/get/commands.
 
-        if name in config.DISABLED_COMMANDS:
-            cmdJSON["disabled"] = "true"
+    Rebuilt only when a command is (un)registered or the command state
+    changes; even then, commands whose object did not change keep their
+    entry, so getDescription()/getHelp() run only for new commands.
+    """
 
-        if name in config.VOICE_COMMANDS:
-            cmdJSON["voice"] = "true"
+    def __init__(self):
+        self.__lock = threading.Lock()
+        # Distinguishes this process's versions from an earlier Enso's.
+        self.__epoch = uuid.uuid4().hex[:8]
+        self.__version = None
+        self.__etag = None
+        self.__described = {}
+        self.__commands = []
+        self.__body = None
+        self.__gzipped = None
+
+    def get(self):
+        """Returns (etag, commands, body), body being the JSON bytes."""
+        # The generation and the commands come from the same snapshot,
+        # so the etag always describes the body it is sent with.
+        snapshot = CommandManager.get().getSnapshot()
+        version = (snapshot.generation, CommandStateStore.get().getVersion())
+        with self.__lock:
+            if version != self.__version:
+                self.__rebuild(snapshot.commands)
+                self.__version = version
+                self.__etag = "%s-%d-%d" % ((self.__epoch,) + version)
+            return self.__etag, self.__commands, self.__body
+
+    def get_gzipped(self):
+        """Returns (etag, gzip-compressed body)."""
+        etag, commands, body = self.get()
+        with self.__lock:
+            if self.__gzipped is None or self.__gzipped[0] != etag:
+                self.__gzipped = (etag, gzip.compress(body, 6))
+            return self.__gzipped
+
+    def __rebuild(self, commands):
+        cmdState = CommandStateStore.get()
+        flags = (("disabled", cmdState.getNames(commandstate.DISABLED)),
+                 ("voice", cmdState.getNames(commandstate.VOICE)),
+                 ("voiceOnly", cmdState.getNames(commandstate.VOICE_ONLY)),
+                 ("voiceConfirm", cmdState.getNames(commandstate.VOICE_CONFIRM)))
+
+        previous = self.__described
+        described = {}
+        output = []
+        for name, command in commands.items():
+            entry = previous.get(name)
+            if entry is None or entry[0] is not command:
+                entry = (command, _describe_command(name, command))
+            described[name] = entry
+
+            cmdJSON = dict(entry[1])
+            for flag, names in flags:
+                if name in names:
+                    cmdJSON[flag] = "true"
+            output.append(cmdJSON)
+
+        self.__described = described
+        self.__commands = output
+        self.__body = json.dumps(output).encode("utf-8")
+
+
+_command_catalog = _CommandCatalog()
+
+
+def _catalog_response(etag, make_body, can_gzip=False):
+    """Answers a catalog request: 304 if the client has this version,
+    in either coding, otherwise the body, gzipped if the client accepts
+    it."""
+    gzipped = can_gzip and bool(request.accept_encodings["gzip"])
+    if request.if_none_match.contains(etag) or \
+            request.if_none_match.contains(etag + GZIP_ETAG_SUFFIX):
+        r = app.response_class(status=304)
+    elif gzipped:
+        etag, body = _command_catalog.get_gzipped()
+        r = app.response_class(body, mimetype="application/json")
+        r.headers["Content-Encoding"] = "gzip"
+    else:
+        r = app.response_class(make_body(), mimetype="application/json")
+    r.set_etag(etag + GZIP_ETAG_SUFFIX if gzipped else etag)
+    # Revalidate every time; unchanged catalogs cost a 304.
+    r.headers["Cache-Control"] = "no-cache"
+    if can_gzip:
+        r.headers["Vary"] = "Accept-Encoding"
+    return r
 
-        if name in config.VOICE_ONLY_COMMANDS:
-            cmdJSON["voiceOnly"] = "true"
 
-        if name in config.VOICE_CONFIRM_COMMANDS:
-            cmdJSON["voiceConfirm"] = "true"
+@app.route('/api/enso/get/commands')
+@requires_auth
+def get_enso_get_commands():
+    etag, commands, body = _command_catalog.get()
+    return _catalog_response(etag, lambda: body, can_gzip=True)
 
-        output = output + [cmdJSON]
-    return jsonify(output)
+
+@app.route('/api/enso/get/commands/page')
+@requires_auth
+def get_enso_get_commands_page():
+    """A filtered slice of the catalog: ?offset=&limit= select the page,
+    ?q= keeps commands whose name or description contains the text, and
+    ?category= keeps one category."""
+    etag, commands, body = _command_catalog.get()
+
+    try:
+        offset = max(0, int(request.args.get("offset", 0)))
+        limit = int(request.args.get("limit", 100))
+    except ValueError:
+        abort(400)
+    limit = min(max(limit, 0), MAX_COMMANDS_PAGE)
+
+    def make_body():
+        matches = commands
+        text = request.args.get("q", "").lower()
+        if text:
+            matches = [c for c in matches
+                       if text in c["name"].lower()
+                       or text in (c["description"] or "").lower()]
+        category = request.args.get("category")
+        if category:
+            matches = [c for c in matches if c["category"] == category]
+        return json.dumps({"version": etag, "total": len(matches),
+                           "offset": offset, "limit": limit,
+                           "commands": matches[offset:offset + limit]})
+
+    return _catalog_response(etag, make_body)
 
 
 def _voicecmd_available():
@@ -307,6 +426,31 @@ def _voicecmd_available():
         return False
 
 
+@app.route('/api/enso/get/event_stats')
+@requires_auth
+def get_enso_get_event_stats():
+    stats = EventManager.get().getStats()
+    return jsonify({"enabled": stats is not None,
+                    "budgetMs": config.EVENT_RESPONDER_BUDGET_MS,
+                    "bucketBoundsMs": list(responderstats.BUCKET_BOUNDS_MS),
+                    "responders": stats.getStats() if stats else []})
+
+
+@app.route('/api/enso/event_stats/<action>', methods=["POST"])
+@requires_auth
+def post_enso_event_stats(action):
+    eventManager = EventManager.get()
+    if action in ("start", "stop"):
+        eventManager.setStatsEnabled(action == "start")
+    elif action == "reset":
+        stats = eventManager.getStats()
+        if stats:
+            stats.reset()
+    else:
+        abort(404)
+    return ""
+
+
 @app.route('/api/enso/voice/available')
 @requires_auth
 def get_enso_voice_available():
@@ -451,80 +595,56 @@ def get_enso_commands_read_category(value):
 @app.route('/api/enso/commands/disable/<command>', methods=["POST"])
 @requires_auth
 def post_enso_commands_disable(command):
-    if command not in config.DISABLED_COMMANDS:
-        config.DISABLED_COMMANDS += [command]
-        config.COMMAND_STATE_CHANGED = True
-        config.storeValue("DISABLED_COMMANDS", config.DISABLED_COMMANDS)
+    CommandStateStore.get().add(commandstate.DISABLED, command)
     return ""
 
 
 @app.route('/api/enso/commands/enable/<command>', methods=["POST"])
 @requires_auth
 def post_enso_commands_enable(command):
-    if command in config.DISABLED_COMMANDS:
-        config.DISABLED_COMMANDS.remove(command)
-        config.COMMAND_STATE_CHANGED = True
-        config.storeValue("DISABLED_COMMANDS", config.DISABLED_COMMANDS)
+    CommandStateStore.get().remove(commandstate.DISABLED, command)
     return ""
 
 
 @app.route('/api/enso/commands/voice/disable/<command>', methods=["POST"])
 @requires_auth
 def post_enso_commands_voice_disable(command):
-    if command in config.VOICE_COMMANDS:
-        config.VOICE_COMMANDS.remove(command)
-        config.VOICE_COMMANDS_CHANGED = True
-        config.storeValue("VOICE_COMMANDS", config.VOICE_COMMANDS)
+    CommandStateStore.get().remove(commandstate.VOICE, command)
     return ""
 
 
 @app.route('/api/enso/commands/voice/enable/<command>', methods=["POST"])
 @requires_auth
 def post_enso_commands_voice_enable(command):
-    if command not in config.VOICE_COMMANDS:
-        config.VOICE_COMMANDS += [command]
-        config.VOICE_COMMANDS_CHANGED = True
-        config.storeValue("VOICE_COMMANDS", config.VOICE_COMMANDS)
+    CommandStateStore.get().add(commandstate.VOICE, command)
     return ""
 
 
 @app.route('/api/enso/commands/voice_only/disable/<command>', methods=["POST"])
 @requires_auth
 def post_enso_commands_voice_only_disable(command):
-    if command in config.VOICE_ONLY_COMMANDS:
-        config.VOICE_ONLY_COMMANDS.remove(command)
-        config.storeValue("VOICE_ONLY_COMMANDS", config.VOICE_ONLY_COMMANDS)
+    CommandStateStore.get().remove(commandstate.VOICE_ONLY, command)
     return ""
 
 
 @app.route('/api/enso/commands/voice_only/enable/<command>', methods=["POST"])
 @requires_auth
 def post_enso_commands_voice_only_enable(command):
-    if command not in config.VOICE_ONLY_COMMANDS:
-        config.VOICE_ONLY_COMMANDS += [command]
-        config.storeValue("VOICE_ONLY_COMMANDS", config.VOICE_ONLY_COMMANDS)
+    CommandStateStore.get().add(commandstate.VOICE_ONLY, command)
     return ""
 
 
 @app.route('/api/enso/commands/voice_confirm/disable/<command>', methods=["POST"])
 @requires_auth
 def post_enso_commands_voice_confirm_disable(command):
-    if command in config.VOICE_CONFIRM_COMMANDS:
-        config.VOICE_CONFIRM_COMMANDS.remove(command)
-        # Unlike voice_only (a quasimode-display concern), this one is baked
-        # into the grammar as Verb.confirm, so the engine must be rebuilt.
-        config.VOICE_COMMANDS_CHANGED = True
-        config.storeValue("VOICE_CONFIRM_COMMANDS", config.VOICE_CONFIRM_COMMANDS)
+    CommandStateStore.get().remove(commandstate.VOICE_CONFIRM, command)
     return ""
 
 
 @app.route('/api/enso/commands/voice_confirm/enable/<command>', methods=["POST"])
 @requires_auth
 def post_enso_commands_voice_confirm_enable(command):
-    if command not in config.VOICE_CONFIRM_COMMANDS:
-        config.VOICE_CONFIRM_COMMANDS += [command]
-        config.VOICE_COMMANDS_CHANGED = True
-        config.storeValue("VOICE_CONFIRM_COMMANDS", config.VOICE_CONFIRM_COMMANDS)
+    CommandStateStore.get().add(commandstate.VOICE_CONFIRM, command)
     return ""
 
 
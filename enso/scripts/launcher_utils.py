@@ -39,9 +39,30 @@ def create_option_parser(version="1.0"):
                       default=False, help="Debug mode")
     parser.add_option("-t", "--no-tray", action="store_false", dest="show_tray_icon",
                       default=True, help="Hide tray icon")
+    parser.add_option("--profile-startup", action="store", dest="profile_startup",
+                      metavar="FILE", default=None,
+                      help="write a startup time profile to FILE (JSON) and "
+                           "FILE.folded (collapsed stacks for flame graphs)")
     return parser
 
 
+def start_startup_profile(argv):
+    """Enables enso.utils.startupprofile if --profile-startup is among
+    the arguments. Runs before the options are parsed, so the imports
+    made on the way there are profiled too; the report is written once
+    Enso has finished initializing."""
+    for i, arg in enumerate(argv):
+        if arg == "--profile-startup" and i + 1 < len(argv):
+            path = argv[i + 1]
+        elif arg.startswith("--profile-startup="):
+            path = arg.split("=", 1)[1]
+        else:
+            continue
+        from enso.utils import startupprofile
+        startupprofile.enable(os.path.abspath(path))
+        return
+
+
 def bootstrap_sys_path():
     """Adds Enso's own dir and the system/user 'lib' package dirs to
     sys.path, so packages under lib/ are importable."""
@@ -18,11 +18,13 @@ sys.path.insert(0, os.path.dirname(scripts_dir))
 
 import launcher_utils as lu
 
+lu.start_startup_profile(sys.argv[1:])
 lu.preflight()
 
 import enso
 from enso import config
 from enso.user import import_package_by_path
+from enso.utils import startupprofile
 
 lu.platform_bootstrap()
 lu.bootstrap_sys_path()
@@ -42,12 +44,15 @@ def main(argv = None):
 
     lu.configure_logging(opts)
 
-    lu.configure_init_files()
+    with startupprofile.span("launcher", "configure_init_files"):
+        lu.configure_init_files()
 
-    lu.start_platform_extras(opts)
+    with startupprofile.span("launcher", "start_platform_extras"):
+        lu.start_platform_extras(opts)
 
-    user_lib_index = os.path.join(config.ENSO_USER_DIR, "lib")
-    import_package_by_path(user_lib_index)
+    with startupprofile.span("launcher", "user_lib"):
+        user_lib_index = os.path.join(config.ENSO_USER_DIR, "lib")
+        import_package_by_path(user_lib_index)
 
     # Retreat is an enso.config.PLUGINS entry now; it starts on the init event
     # and stops via its own atexit handler.